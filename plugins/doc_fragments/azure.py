@@ -79,6 +79,77 @@ options:
         type: bool
         default: False
         version_added: '2.3.0'
+    use_persistent_token_cache:
+        description:
+            - Keeps the access tokens acquired for a service principal, certificate or Active Directory user in a persistent
+              cache shared by all tasks and inventory runs on the same host, so they are not requested from the identity
+              endpoint again until they expire.
+            - The cache is encrypted with the platform keyring (DPAPI, Keychain or libsecret). See I(allow_unencrypted_token_cache)
+              for hosts without one.
+            - Tokens from C(cli) and C(msi) authentication are cached by Azure CLI and the managed identity endpoint and are not affected.
+            - Set via credential file profile or the C(AZURE_USE_PERSISTENT_TOKEN_CACHE) environment variable.
+        type: bool
+        default: False
+        version_added: '2.7.0'
+    allow_unencrypted_token_cache:
+        description:
+            - When I(use_persistent_token_cache=true) and no platform keyring is available, store the token cache as a plain file
+              readable only by the current user instead of failing.
+            - Set via credential file profile or the C(AZURE_ALLOW_UNENCRYPTED_TOKEN_CACHE) environment variable.
+        type: bool
+        default: False
+        version_added: '2.7.0'
+    http_pool_maxsize:
+        description:
+            - Maximum number of HTTP connections kept open per host. All the clients of a task, or of an inventory run,
+              share one pool per credential and endpoint, so raise this when requests are sent in parallel.
+            - Can also be set via the C(AZURE_HTTP_POOL_MAXSIZE) environment variable.
+        type: int
+        default: 10
+        version_added: '2.7.0'
+    http_keep_alive:
+        description:
+            - Keep HTTP connections open between requests so they are reused without a new TLS handshake.
+            - Set to C(false) to ask the service to close every connection, eg. behind proxies that drop idle connections.
+            - Can also be set via the C(AZURE_HTTP_KEEP_ALIVE) environment variable.
+        type: bool
+        default: True
+        version_added: '2.7.0'
+    rate_limit_governor:
+        description:
+            - Pace requests on the C(x-ms-ratelimit-remaining-subscription-*) headers returned by Azure Resource Manager.
+              Requests are delayed progressively once fewer than 100 reads, writes or deletes remain, and after a throttled
+              (429) response further requests of the same kind wait for its C(Retry-After) delay.
+            - Can also be set via the C(AZURE_RATE_LIMIT_GOVERNOR) environment variable.
+        type: bool
+        default: False
+        version_added: '2.7.0'
+    rate_limit_state_file:
+        description:
+            - File in which I(rate_limit_governor) keeps the remaining request budget, so that all tasks running on the
+              same controller against the same subscription share it. By default each task only knows its own budget.
+            - The file is locked with C(fcntl), so this only works on POSIX controllers. It is ignored on other platforms,
+              where each task keeps its own budget.
+            - Can also be set via the C(AZURE_RATE_LIMIT_STATE_FILE) environment variable.
+        type: path
+        version_added: '2.7.0'
+    perf_instrumentation:
+        description:
+            - Record every request sent to Azure (method, URL with the resource names replaced by placeholders, status,
+              latency, retries, bytes sent and received, long running operation polls) and return a summary under the
+              C(_azure_perf) key of the module result.
+            - Only applies to modules, use I(perf_log_path) with the inventory plugin.
+            - Can also be set via the C(AZURE_PERF_INSTRUMENTATION) environment variable.
+        type: bool
+        default: False
+        version_added: '2.7.0'
+    perf_log_path:
+        description:
+            - Append the request summary described in I(perf_instrumentation) to this file, as one JSON line per task
+              or inventory run.
+            - Can also be set via the C(AZURE_PERF_LOG_PATH) environment variable.
+        type: path
+        version_added: '2.7.0'
     auth_source:
         description:
             - Controls the source of the credentials to use for authentication.
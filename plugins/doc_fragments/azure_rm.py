@@ -26,6 +26,53 @@ options:
         description: A list of resource group names to search for virtual machine scale sets (VMSSs). '\*' will
             include all resource groups in the subscription.
         default: []
+    include_arc_resource_groups:
+        description:
+        - A list of resource group names to search for Azure Arc-enabled servers. '\*' will include all resource groups
+            in the subscription.
+        - Their C(powerstate) host variable is C(running) while their agent is connected.
+        type: list
+        elements: str
+        default: []
+        version_added: '2.7.0'
+    include_containergroup_resource_groups:
+        description:
+        - A list of resource group names to search for Azure Container Instances container groups. '\*' will include
+            all resource groups in the subscription.
+        - Their C(powerstate) host variable is the state of the container group, their C(containers) host variable lists
+            the name and image of their containers.
+        type: list
+        elements: str
+        default: []
+        version_added: '2.7.0'
+    include_aks_resource_groups:
+        description:
+        - A list of resource group names to search for AKS clusters, whose nodes are added like VMSS instances. '\*'
+            will include all resource groups in the subscription.
+        - The C(aks_cluster) host variable of the nodes has the id and name of their cluster and the name of their node pool.
+        type: list
+        elements: str
+        default: []
+        version_added: '2.7.0'
+    subscriptions:
+        description:
+        - A list of subscription IDs to search for virtual machines and VMSSs, in addition to the subscriptions of
+            C(management_groups). '\*' includes every subscription the credentials can access.
+        - When both C(subscriptions) and C(management_groups) are empty, only the subscription of the credentials is searched.
+        - All the subscriptions share one authentication and one connection pool, and their requests are sent in the
+            same batches. The C(subscription_id) host variable tells which subscription a host belongs to.
+        type: list
+        elements: str
+        default: []
+        version_added: '2.7.0'
+    management_groups:
+        description:
+        - A list of management group names whose subscriptions, including those of nested management groups, are
+            searched for virtual machines and VMSSs. See C(subscriptions).
+        type: list
+        elements: str
+        default: []
+        version_added: '2.7.0'
     fail_on_template_errors:
         description: When false, template failures during group and filter processing are silently ignored (eg,
             if a filter or group expression refers to an undefined host variable)
@@ -57,11 +104,116 @@ options:
             C(batch_fetch) uses a much slower serial fetch, resulting in many more round-trips. Generally only
             useful for troubleshooting.
         default: true
+    batch_size:
+        description:
+        - Maximum number of requests sent in one C(/batch) request, up to 500.
+        - The number is halved after a C(/batch) request had throttled (429) requests, and grows back to C(batch_size) by
+            tenths after C(/batch) requests that had none.
+        type: int
+        default: 100
+        version_added: '2.7.0'
+    batch_retries:
+        description:
+        - Number of times the requests of a C(/batch) request that were throttled or failed with a transient error
+            (408, 429, 500, 502, 503, 504) are sent again before the inventory fails.
+        type: int
+        default: 10
+        version_added: '2.7.0'
+    batch_backoff_factor:
+        description:
+        - Seconds to wait before sending failed requests of a C(/batch) request again, doubled at every retry
+            (C(batch_backoff_factor * 2 ** retry)). A longer C(Retry-After) returned by Azure is honored.
+        type: float
+        default: 0.8
+        version_added: '2.7.0'
+    fetch_backend:
+        description:
+        - Where to fetch the virtual machines, their network interfaces and public IP addresses from.
+        - C(arm) sends one Azure Resource Manager request per VM, NIC and public IP address (batched with C(batch_fetch)).
+        - C(resource_graph) fetches them with a few paged Azure Resource Graph queries, whatever the number of VMs.
+            VMs whose NICs or public IP addresses are not in the Resource Graph results yet, eg. just created ones, and
+            the instance view of VMs without a power state are still fetched from Azure Resource Manager.
+            When the Resource Graph query fails, eg. because the identity lacks access to it, the plugin warns and falls
+            back to C(arm).
+        - VMSS instances are always fetched from Azure Resource Manager.
+        type: str
+        choices: [arm, resource_graph]
+        default: arm
+        version_added: '2.7.0'
+    network_prefetch:
+        description:
+        - List the network interfaces and public IP addresses of the subscriptions, or of the resource groups of
+            C(include_vm_resource_groups), in a few paged requests, instead of fetching the ones of every VM one by one.
+        - Best when most of the listed NICs and public IP addresses belong to the VMs in the inventory. NICs and public
+            IP addresses outside of the listed resource groups are still fetched one by one.
+        - Only applies to C(fetch_backend=arm). The NICs of VMSS instances are always fetched one by one.
+        type: bool
+        default: False
+        version_added: '2.7.0'
+    bulk_power_state:
+        description:
+        - Fetch the instance view, which gives the C(powerstate) host variable, of all the VMs with the VM list requests
+            instead of one request per VM, with C(statusOnly=true) for the VMs of a subscription and C($expand=instanceView)
+            for the instances of scale sets.
+        - The VMs listed by resource group, see C(include_vm_resource_groups), still need one request per VM, that list
+            only accepts C($expand=instanceView) with a C($filter).
+        - When a list rejects these parameters, a warning is shown and the VMs are listed again without them.
+        - Only applies to C(fetch_backend=arm), the Resource Graph backend always gets the power state in bulk.
+        type: bool
+        default: False
+        version_added: '2.7.0'
+    snapshot_path:
+        description:
+        - Keep the VMs, NICs and public IP addresses fetched from Azure in this file, and on the next runs only fetch the
+            ones changed since the previous run, according to the C(resourcechanges) table of Azure Resource Graph.
+        - Power states are not resource changes, they are updated with one Resource Graph query. VMSS instances are
+            always listed again.
+        - All the VMs are fetched when the file is missing, is older than C(snapshot_max_age), was written with other
+            subscriptions or resource groups, or when Resource Graph can't be queried.
+        - Unlike the inventory cache, the inventory reflects the changes made in Azure since the previous run.
+        type: path
+        version_added: '2.7.0'
+    snapshot_max_age:
+        description:
+        - Number of seconds after which the snapshot of C(snapshot_path) is discarded and all the VMs are fetched again.
+        type: int
+        default: 86400
+        version_added: '2.7.0'
+    request_concurrency:
+        description:
+        - Number of requests sent in parallel, C(/batch) requests when C(batch_fetch) is enabled, eg. to fetch large
+            subscriptions faster or when the batch API is unavailable or throttled. C(1) sends the requests one after another.
+        - Hosts are added to the inventory in the same order whatever the number of requests in parallel.
+        - Consider raising C(http_pool_maxsize) to the same value so that every request has its own connection.
+        type: int
+        default: 1
+        version_added: '2.7.0'
     default_host_filters:
         description: A default set of filters that is applied in addition to the conditions in
             C(exclude_host_filters) to exclude powered-off and not-fully-provisioned hosts. Set this to a different
             value or empty list if you need to include hosts in these states.
         default: ['powerstate != "running"', 'provisioning_state != "succeeded"']
+    precompile_filters:
+        description:
+        - Evaluates the conditions of C(exclude_host_filters), C(default_host_filters) and C(include_host_filters) for all
+            the hosts with a single template, compiled once, instead of compiling a template per condition and host.
+        - When that template fails, eg. because a condition fails for a host, the hosts are evaluated one by one as when
+            this is disabled. Generally only useful for troubleshooting.
+        type: bool
+        default: true
+        version_added: '2.7.0'
+    filter_pushdown:
+        description:
+        - Evaluates the conditions of C(exclude_host_filters), C(default_host_filters) and C(include_host_filters) that
+            only refer to host variables of the VM model, eg. C(tags), C(location), C(resource_group), C(name) or
+            C(provisioning_state), as soon as the VMs are listed, so that no instance view, NIC or public IP is requested
+            for the VMs they exclude. C(powerstate) is evaluated too when the list includes it, see C(bulk_power_state),
+            except with C(snapshot_path).
+        - The include filters are only evaluated early when all of them can be.
+        - The excluded VMs are not stored in the inventory cache or the snapshot, changing the filters invalidates them.
+        type: bool
+        default: false
+        version_added: '2.7.0'
     use_contrib_script_compatible_sanitization:
         description:
         - By default this plugin is using a general group name sanitization to create safe and usable group names for use in Ansible.
@@ -11,12 +11,19 @@ DOCUMENTATION = r'''
       - azure.azcollection.azure
       - azure.azcollection.azure_rm
       - constructed
+      - inventory_cache
     description:
         - Query VM details from Azure Resource Manager
+        - Azure Arc-enabled servers, container groups and the nodes of AKS clusters can be added too, with the same host
+          variables as the VMs; see C(include_arc_resource_groups), C(include_containergroup_resource_groups) and
+          C(include_aks_resource_groups).
         - Requires a YAML configuration file whose name ends with 'azure_rm.(yml|yaml)'
         - By default, sets C(ansible_host) to the first public IP address found (preferring the primary NIC). If no
           public IPs are found, the first private IP (also preferring the primary NIC). The default may be overridden
           via C(hostvar_expressions); see examples.
+        - When C(cache) is enabled, the VMs, instance views, network interfaces and public IP addresses fetched from
+          Azure are stored in the configured cache plugin and reused until C(cache_timeout) expires, so that filters,
+          groups and hostvar expressions are evaluated again on every run without querying Azure.
 '''
 
 EXAMPLES = '''
@@ -34,7 +41,9 @@ EXAMPLES = '''
 # resource_type: the VM's resource type, eg: 'Microsoft.Compute/virtualMachine', 'Microsoft.Compute/virtualMachineScaleSets/virtualMachines'
 # vmid: the VM's internal SMBIOS ID, eg: '36bca69d-c365-4584-8c06-a62f4a1dc5d2'
 # vmss: if the VM is a member of a scaleset (vmss), a dictionary including the id and name of the parent scaleset
+# aks_cluster: if the VM is a node of an AKS cluster, a dictionary including the id and name of the cluster and the name of its node pool
 # availability_zone: availability zone in which VM is deployed, eg '1','2','3'
+# subscription_id: the ID of the subscription the VM belongs to, useful with the subscriptions and management_groups options
 # creation_time: datetime object of when the VM was created, eg '2023-07-21T09:30:30.4710164+00:00'
 #
 # The following host variables are sometimes availble:
@@ -59,6 +68,23 @@ include_vm_resource_groups:
 include_vmss_resource_groups:
     - '*'
 
+# fetches VMs from these subscriptions and from every subscription under the 'production' management group, instead of
+# only the subscription of the credentials
+subscriptions:
+    - 00000000-0000-0000-0000-000000000001
+    - 00000000-0000-0000-0000-000000000002
+management_groups:
+    - production
+
+# also fetches the Azure Arc-enabled servers, the container groups and the AKS nodes of all resource groups (defaults to
+# none of them). Their host variables are the same as those of the VMs, eg. powerstate and private_ipv4_addresses.
+include_arc_resource_groups:
+    - '*'
+include_containergroup_resource_groups:
+    - '*'
+include_aks_resource_groups:
+    - '*'
+
 # places a host in the named group if the associated condition evaluates to true
 conditional_groups:
     # since this will be true for every host, every host sourced from this inventory plugin config will be in the
@@ -106,6 +132,17 @@ exclude_host_filters:
     # excludes hosts that are powered off
     - powerstate != 'running'
 
+# evaluates the filters that only refer to the VM model, here the location and tags ones, as soon as the VMs are listed,
+# so that the instance views, NICs and public IPs of the VMs they exclude are not requested
+filter_pushdown: true
+
+# stores the fetched VMs in a cache plugin and reuses them for an hour instead of querying Azure on every run
+# (use 'ansible-inventory --flush-cache' to force a refresh)
+cache: true
+cache_plugin: ansible.builtin.jsonfile
+cache_connection: /tmp/azure_rm_inventory_cache
+cache_timeout: 3600
+
 # includes a host to the inventory when any of these expressions is true, can refer to any vars defined on the host
 include_host_filters:
     # includes hosts that in the eastus region and power on
@@ -131,15 +168,24 @@ try:
 except ImportError:
     from Queue import Queue, Empty
 
-from collections import namedtuple
-from ansible.plugins.inventory import BaseInventoryPlugin, Constructable
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from ansible.plugins.inventory import BaseInventoryPlugin, Constructable, Cacheable
 from ansible.module_utils.six import iteritems
-from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import AzureRMAuth
+from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import AzureRMAuth, create_http_session
+from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common_rest import ARMRateLimitPolicy, AzureRMHookPolicyChain, AzureRMPerfPolicy
 from ansible.errors import AnsibleParserError, AnsibleError
 from ansible.module_utils.parsing.convert_bool import boolean
 from ansible.module_utils._text import to_native, to_bytes, to_text
+try:
+    from ansible.template import trust_as_template
+except ImportError:
+    # ansible-core < 2.19 templates any string
+    def trust_as_template(value):
+        return value
 from itertools import chain
 from os import environ
+from jinja2 import Environment, meta
 
 try:
     from azure.core._pipeline_client import PipelineClient
@@ -149,6 +195,7 @@ try:
     from azure.core.pipeline import PipelineResponse
     from azure.mgmt.core.polling.arm_polling import ARMPolling
     from azure.core.polling import LROPoller
+    from azure.core.pipeline.transport import RequestsTransport
 except ImportError:
     Configuration = object
     parse_resource_id = object
@@ -158,7 +205,7 @@ except ImportError:
 
 
 class AzureRMRestConfiguration(Configuration):
-    def __init__(self, credentials, subscription_id, base_url=None):
+    def __init__(self, credentials, subscription_id, base_url=None, custom_hook_policy=None):
 
         if credentials is None:
             raise ValueError("Parameter 'credentials' must not be None.")
@@ -174,16 +221,22 @@ class AzureRMRestConfiguration(Configuration):
         self.authentication_policy = BearerTokenCredentialPolicy(credentials, credential_scopes)
         self.credentials = credentials
         self.subscription_id = subscription_id
+        self.custom_hook_policy = custom_hook_policy
 
 
 UrlAction = namedtuple('UrlAction', ['url', 'api_version', 'handler', 'handler_args'])
 
 
-# FUTURE: add Cacheable support once we have a sane serialization format
-class InventoryModule(BaseInventoryPlugin, Constructable):
+class InventoryModule(BaseInventoryPlugin, Constructable, Cacheable):
 
     NAME = 'azure.azcollection.azure_rm'
 
+    # the host variables of a VM that only depend on the VM model returned by the VM lists, see filter_pushdown
+    _pushdown_variables = frozenset(['id', 'name', 'location', 'tags', 'resource_group', 'subscription_id', 'resource_type', 'vmid',
+                                     'computer_name', 'availability_zone', 'provisioning_state', 'os_profile', 'vmss', 'aks_cluster',
+                                     'virtual_machine_size', 'plan', 'default_inventory_hostname', 'creation_time', 'license_type',
+                                     'image', 'os_disk', 'data_disks'])
+
     def __init__(self):
         super(InventoryModule, self).__init__()
 
@@ -191,8 +244,16 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
         self._filters = None
 
         # FUTURE: use API profiles with defaults
-        self._compute_api_version = '2021-11-01'
-        self._network_api_version = '2015-06-15'
+        self._compute_api_version = '2024-03-01'
+        self._network_api_version = '2023-09-01'
+        self._resource_graph_api_version = '2021-03-01'
+        self._subscription_api_version = '2020-01-01'
+        self._management_group_api_version = '2020-05-01'
+        self._arc_api_version = '2022-12-27'
+        self._container_instance_api_version = '2023-05-01'
+        self._aks_api_version = '2023-08-01'
+        # seconds before the previous run the changes are asked for with snapshot_path
+        self._snapshot_overlap = 600
 
         self._default_header_parameters = {'Content-Type': 'application/json; charset=utf-8'}
 
@@ -201,6 +262,22 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
         self.azure_auth = None
 
         self._batch_fetch = False
+        self._request_concurrency = 1
+        self._batch_size = 100
+        # adapted to throttling by _process_queue_batch
+        self._current_batch_size = 100
+        self._batch_retries = 10
+        self._batch_backoff_factor = 0.8
+
+        self._network_prefetch = False
+        self._precompile_filters = True
+        self._pushdown_filters = None
+        self._bulk_power_state = False
+        # NIC and public IP models listed in bulk, by lowercase resource id
+        self._nic_models = {}
+        self._pip_models = {}
+        # hosts whose NICs are looked up in the prefetched models once the queue is processed
+        self._prefetch_hosts = []
 
     def verify_file(self, path):
         '''
@@ -223,6 +300,12 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
             self._sanitize_group_name = self._legacy_script_compatible_group_sanitization
 
         self._batch_fetch = self.get_option('batch_fetch')
+        self._request_concurrency = self.get_option('request_concurrency')
+        self._batch_size = self._current_batch_size = self.get_option('batch_size')
+        self._batch_retries = self.get_option('batch_retries')
+        self._batch_backoff_factor = self.get_option('batch_backoff_factor')
+        self._network_prefetch = self.get_option('network_prefetch')
+        self._bulk_power_state = self.get_option('bulk_power_state')
 
         self._legacy_hostnames = self.get_option('plain_host_names')
 
@@ -230,11 +313,44 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
 
         self._include_filters = self.get_option('include_host_filters')
 
+        self._precompile_filters = self.get_option('precompile_filters')
+        self._pushdown_filters = None
+        if self.get_option('filter_pushdown'):
+            # the power state of the VMs in a snapshot is refreshed, but a change of power state is not a change of the VM
+            pushdown_power_state = not self.get_option('snapshot_path')
+            self._pushdown_filters = {False: self._get_pushdown_filters(False), True: self._get_pushdown_filters(pushdown_power_state)}
+
+        cache_key = self.get_cache_key(path)
+        # cache is False when the inventory is being refreshed (eg, --flush-cache), the cache option tells whether to use it at all
+        user_cache_setting = self.get_option('cache')
+        attempt_to_read_cache = user_cache_setting and cache
+        cache_needs_update = user_cache_setting and not cache
+
         try:
-            self._credential_setup()
-            self._get_hosts()
+            if attempt_to_read_cache:
+                try:
+                    cache_data = self._cache[cache_key]
+                    # the hosts excluded by filters pushed down when the cache was populated are missing
+                    if cache_data.get('filter_pushdown') != self._get_pushdown_fingerprint():
+                        raise KeyError(cache_key)
+                    self._load_hosts(cache_data)
+                except KeyError:
+                    # the cache expired or has never been populated
+                    cache_needs_update = True
+            if not attempt_to_read_cache or cache_needs_update:
+                self._credential_setup()
+                self._get_hosts()
+            if cache_needs_update:
+                self._cache[cache_key] = self._dump_hosts()
+            self._populate()
         except Exception:
             raise
+        finally:
+            if getattr(self, '_perf_policy', None):
+                try:
+                    self._perf_policy.write(self._perf_log_path, module='azure.azcollection.azure_rm')
+                except (IOError, OSError) as exc:
+                    self.display.warning("Failed to write request statistics to {0}: {1}".format(self._perf_log_path, exc))
 
     def _credential_setup(self):
         auth_source = environ.get('ANSIBLE_AZURE_AUTH_SOURCE', None) or self.get_option('auth_source')
@@ -251,7 +367,9 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
             cert_validation_mode=self.get_option('cert_validation_mode'),
             api_profile=self.get_option('api_profile'),
             track1_cred=True,
-            adfs_authority_url=self.get_option('adfs_authority_url')
+            adfs_authority_url=self.get_option('adfs_authority_url'),
+            use_persistent_token_cache=self.get_option('use_persistent_token_cache'),
+            allow_unencrypted_token_cache=self.get_option('allow_unencrypted_token_cache')
         )
 
         if self.templar.is_template(auth_options["tenant"]):
@@ -268,50 +386,366 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
 
         self.azure_auth = AzureRMAuth(**auth_options)
 
+        hook_policies = []
+        if boolean(environ.get('AZURE_RATE_LIMIT_GOVERNOR') or self.get_option('rate_limit_governor')):
+            hook_policies.append(ARMRateLimitPolicy(state_file=environ.get('AZURE_RATE_LIMIT_STATE_FILE') or self.get_option('rate_limit_state_file')))
+        self._perf_log_path = environ.get('AZURE_PERF_LOG_PATH') or self.get_option('perf_log_path')
+        self._perf_policy = AzureRMPerfPolicy() if self._perf_log_path else None
+        if self._perf_policy:
+            hook_policies.append(self._perf_policy)
+
         self._clientconfig = AzureRMRestConfiguration(self.azure_auth.azure_credential_track2, self.azure_auth.subscription_id,
-                                                      self.azure_auth._cloud_environment.endpoints.resource_manager)
+                                                      self.azure_auth._cloud_environment.endpoints.resource_manager,
+                                                      custom_hook_policy=AzureRMHookPolicyChain(hook_policies) if hook_policies else None)
+
+        pool_maxsize = environ.get('AZURE_HTTP_POOL_MAXSIZE') or self.get_option('http_pool_maxsize')
+        keep_alive = environ.get('AZURE_HTTP_KEEP_ALIVE') or self.get_option('http_keep_alive')
+        self._http_session = create_http_session(pool_maxsize=int(pool_maxsize), keep_alive=boolean(keep_alive))
+        transport = RequestsTransport(session=self._http_session, session_owner=False,
+                                      connection_verify=self.azure_auth._cert_validation_mode != 'ignore')
 
-        self.new_client = PipelineClient(self.azure_auth._cloud_environment.endpoints.resource_manager, config=self._clientconfig)
+        self.new_client = PipelineClient(self.azure_auth._cloud_environment.endpoints.resource_manager, config=self._clientconfig,
+                                         transport=transport)
 
     def _enqueue_get(self, url, api_version, handler, handler_args=None):
         if not handler_args:
             handler_args = {}
         self._request_queue.put_nowait(UrlAction(url=url, api_version=api_version, handler=handler, handler_args=handler_args))
 
-    def _enqueue_vm_list(self, rg='*'):
+    def _enqueue_vm_list(self, rg='*', subscription_id=None):
         if not rg or rg == '*':
             url = '/subscriptions/{subscriptionId}/providers/Microsoft.Compute/virtualMachines'
         else:
             url = '/subscriptions/{subscriptionId}/resourceGroups/{rg}/providers/Microsoft.Compute/virtualMachines'
 
-        url = url.format(subscriptionId=self._clientconfig.subscription_id, rg=rg)
-        self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vm_page_response)
+        url = url.format(subscriptionId=subscription_id or self._clientconfig.subscription_id, rg=rg)
+        if self._bulk_power_state and (not rg or rg == '*'):
+            # statusOnly=true returns the instance views with the VMs of the subscription, the resource group list only
+            # accepts $expand=instanceView with a $filter
+            self._enqueue_get(url=url + '?statusOnly=true', api_version=self._compute_api_version, handler=self._on_vm_page_response,
+                              handler_args=dict(fallback_url=url))
+        else:
+            self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vm_page_response)
 
-    def _enqueue_vmss_list(self, rg=None):
+    def _enqueue_vmss_list(self, rg=None, subscription_id=None):
         if not rg or rg == '*':
             url = '/subscriptions/{subscriptionId}/providers/Microsoft.Compute/virtualMachineScaleSets'
         else:
             url = '/subscriptions/{subscriptionId}/resourceGroups/{rg}/providers/Microsoft.Compute/virtualMachineScaleSets'
 
-        url = url.format(subscriptionId=self._clientconfig.subscription_id, rg=rg)
+        url = url.format(subscriptionId=subscription_id or self._clientconfig.subscription_id, rg=rg)
         self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vmss_page_response)
 
+    def _enqueue_resource_list(self, resource_type, api_version, handler, rg='*', subscription_id=None):
+        if not rg or rg == '*':
+            url = '/subscriptions/{subscriptionId}/providers/{resourceType}'
+        else:
+            url = '/subscriptions/{subscriptionId}/resourceGroups/{rg}/providers/{resourceType}'
+
+        url = url.format(subscriptionId=subscription_id or self._clientconfig.subscription_id, rg=rg, resourceType=resource_type)
+        self._enqueue_get(url=url, api_version=api_version, handler=handler, handler_args=dict(api_version=api_version))
+
+    def _enqueue_network_lists(self, rg='*', subscription_id=None):
+        if not rg or rg == '*':
+            url = '/subscriptions/{subscriptionId}/providers/Microsoft.Network/{resourceType}'
+        else:
+            url = '/subscriptions/{subscriptionId}/resourceGroups/{rg}/providers/Microsoft.Network/{resourceType}'
+
+        for resource_type, models in (('networkInterfaces', self._nic_models), ('publicIPAddresses', self._pip_models)):
+            self._enqueue_get(url=url.format(subscriptionId=subscription_id or self._clientconfig.subscription_id, rg=rg, resourceType=resource_type),
+                              api_version=self._network_api_version, handler=self._on_network_page_response, handler_args=dict(models=models))
+
     def _get_hosts(self):
         if os.environ.get('ANSIBLE_AZURE_VM_RESOURCE_GROUPS'):
-            for vm_rg in os.environ['ANSIBLE_AZURE_VM_RESOURCE_GROUPS'].split(","):
-                self._enqueue_vm_list(vm_rg)
+            vm_rgs = os.environ['ANSIBLE_AZURE_VM_RESOURCE_GROUPS'].split(",")
         else:
-            for vm_rg in self.get_option('include_vm_resource_groups'):
-                self._enqueue_vm_list(vm_rg)
+            vm_rgs = self.get_option('include_vm_resource_groups')
+
+        subscriptions = self._get_subscriptions()
+
+        started = time.time()
+        snapshot_path = self.get_option('snapshot_path')
+        # the snapshot of a run with other resource groups or subscriptions can't be refreshed
+        fingerprint = dict(subscriptions=sorted(s.lower() for s in subscriptions), vm_resource_groups=sorted(rg.lower() for rg in vm_rgs),
+                           vmss_resource_groups=sorted(rg.lower() for rg in self.get_option('include_vmss_resource_groups')))
+        if self._pushdown_filters:
+            fingerprint['filter_pushdown'] = self._get_pushdown_fingerprint()
+
+        fetched = False
+        if snapshot_path:
+            fetched = self._refresh_snapshot(snapshot_path, fingerprint, vm_rgs, subscriptions)
+        if not fetched and self.get_option('fetch_backend') == 'resource_graph':
+            try:
+                self._get_hosts_from_resource_graph(vm_rgs, subscriptions)
+                fetched = True
+            except AnsibleError as e:
+                self.display.warning("Falling back to fetching the VMs from Azure Resource Manager: {0}".format(to_native(e)))
+                self._hosts = []
+        # the requests of all the subscriptions go to the same queue, so they share the batches
+        for subscription_id in subscriptions:
+            if not fetched:
+                for vm_rg in vm_rgs:
+                    self._enqueue_vm_list(vm_rg, subscription_id)
+                    if self._network_prefetch:
+                        self._enqueue_network_lists(vm_rg, subscription_id)
+
+            for vmss_rg in self.get_option('include_vmss_resource_groups'):
+                self._enqueue_vmss_list(vmss_rg, subscription_id)
+
+            for arc_rg in self.get_option('include_arc_resource_groups'):
+                self._enqueue_resource_list('Microsoft.HybridCompute/machines', self._arc_api_version, self._on_arc_page_response,
+                                            arc_rg, subscription_id)
+
+            for container_group_rg in self.get_option('include_containergroup_resource_groups'):
+                self._enqueue_resource_list('Microsoft.ContainerInstance/containerGroups', self._container_instance_api_version,
+                                            self._on_container_group_page_response, container_group_rg, subscription_id)
+
+            for aks_rg in self.get_option('include_aks_resource_groups'):
+                self._enqueue_resource_list('Microsoft.ContainerService/managedClusters', self._aks_api_version, self._on_aks_page_response,
+                                            aks_rg, subscription_id)
+
+        self._process_queue()
+
+        if self._prefetch_hosts:
+            for host in self._prefetch_hosts:
+                nics = self._resolve_nics(host._vm_model, self._nic_models, self._pip_models)
+                if nics is None:
+                    # not listed, eg. NICs in another resource group than their VM, fetch them one by one
+                    host._enqueue_nics()
+                else:
+                    host._add_nics(nics)
+            self._prefetch_hosts = []
+            self._process_queue()
+
+        # drop the VMs of the snapshot deleted since
+        self._hosts = [h for h in self._hosts if h is not None]
+
+        if snapshot_path:
+            self._save_snapshot(snapshot_path, fingerprint, started)
+
+    def _refresh_snapshot(self, path, fingerprint, vm_rgs, subscriptions):
+        '''
+        Load the VMs of the snapshot left by the previous run and patch it with the changes Resource Graph reported
+        since: changed or new VMs are fetched again, as well as the NICs and public IPs of the VMs whose NICs or public
+        IPs changed, and the power states are updated in bulk. VMSS instances (AKS nodes included), Arc machines and
+        container groups are always listed again.
+        Returns False, to fetch all the VMs, when there is no usable snapshot or the changes are not available.
+        '''
+        try:
+            with open(path) as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except (IOError, OSError, ValueError):
+            return False
+        if snapshot.get('fingerprint') != fingerprint or time.time() - snapshot.get('timestamp', 0) > self.get_option('snapshot_max_age'):
+            return False
+
+        # changes show up in Resource Graph a few minutes after they are made, so look a bit further back than the last run
+        since = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(snapshot['timestamp'] - self._snapshot_overlap))
+        try:
+            changes = self._query_resource_graph(subscriptions, "resourcechanges "
+                                                 "| where todatetime(properties.changeAttributes.timestamp) > datetime({0}) "
+                                                 "and tostring(properties.targetResourceType) in~ ('microsoft.compute/virtualmachines', "
+                                                 "'microsoft.network/networkinterfaces', 'microsoft.network/publicipaddresses') "
+                                                 "| project targetResourceId = tostring(properties.targetResourceId)".format(since))
+            power_states = self._query_resource_graph(subscriptions, "Resources | where type =~ 'microsoft.compute/virtualmachines' "
+                                                      "| project id, powerState = tostring(properties.extended.instanceView.powerState.code)")
+        except AnsibleError as e:
+            self.display.warning("Fetching all the VMs, the changes since the last run are not available: {0}".format(to_native(e)))
+            return False
+
+        changed_ids = dict((c['targetResourceId'].lower(), c['targetResourceId']) for c in changes if c.get('targetResourceId'))
+        power_states = dict((p['id'].lower(), p['powerState']) for p in power_states if p.get('powerState'))
 
-        for vmss_rg in self.get_option('include_vmss_resource_groups'):
-            self._enqueue_vmss_list(vmss_rg)
+        self._hosts = []
+        for h in snapshot['hosts']:
+            # VMSS instances, Arc machines and container groups are listed again
+            if 'vm' not in h or h['vmss']:
+                continue
+            vm_id = h['vm']['id'].lower()
+            if vm_id in changed_ids:
+                continue
+            host = AzureHost(h['vm'], self, legacy_name=self._legacy_hostnames, cache_data=h)
+            network_ids = [nic['nic']['id'].lower() for nic in h['nics']] + [pip['id'].lower() for nic in h['nics'] for pip in nic['public_ips']]
+            if any(network_id in changed_ids for network_id in network_ids):
+                host.nics = []
+                host._enqueue_nics()
+            if vm_id in power_states:
+                host._on_instanceview_response(dict(statuses=[dict(code=power_states[vm_id])]))
+            else:
+                self._enqueue_get(url="{0}/instanceView".format(h['vm']['id']), api_version=self._compute_api_version,
+                                  handler=host._on_instanceview_response)
+            self._hosts.append(host)
+
+        # fetch the changed and new VMs again, in their order in the snapshot, a None placeholder is left for deleted ones
+        snapshot_ids = [h['vm']['id'].lower() for h in snapshot['hosts'] if 'vm' in h and not h['vmss']]
+        vm_rgs = [rg.lower() for rg in vm_rgs]
+        for vm_id in sorted((i for i in changed_ids if '/providers/microsoft.compute/virtualmachines/' in i),
+                            key=lambda i: snapshot_ids.index(i) if i in snapshot_ids else len(snapshot_ids)):
+            if '*' not in vm_rgs and parse_resource_id(vm_id).get('resource_group') not in vm_rgs:
+                continue
+            url = changed_ids[vm_id]
+            if self._bulk_power_state:
+                url += '?$expand=instanceView'
+            self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vm_response,
+                              handler_args=dict(index=len(self._hosts)))
+            self._hosts.append(None)
+        return True
+
+    def _save_snapshot(self, path, fingerprint, timestamp):
+        snapshot = dict(timestamp=timestamp, fingerprint=fingerprint, hosts=self._dump_hosts()['hosts'])
+        try:
+            with open(path + '.tmp', 'w') as snapshot_file:
+                json.dump(snapshot, snapshot_file)
+            os.rename(path + '.tmp', path)
+        except (IOError, OSError) as e:
+            self.display.warning("Failed to write the inventory snapshot {0}: {1}".format(path, to_native(e)))
 
+    def _process_queue(self):
         if self._batch_fetch:
             self._process_queue_batch()
+        elif self._request_concurrency > 1:
+            self._process_queue_concurrent(self._request_concurrency)
         else:
             self._process_queue_serial()
 
+    def _get_subscriptions(self):
+        '''
+        Return the IDs of the subscriptions listed in the subscriptions option and of those under the management
+        groups listed in the management_groups option, or the subscription of the credentials when both are empty.
+        '''
+        subscriptions = []
+        for subscription_id in self.get_option('subscriptions'):
+            if subscription_id == '*':
+                subscriptions.extend(s['subscriptionId'] for s in self._list_all('/subscriptions', self._subscription_api_version)
+                                     if s.get('state') not in ('Disabled', 'Deleted'))
+            else:
+                subscriptions.append(subscription_id)
+
+        for management_group in self.get_option('management_groups'):
+            url = '/providers/Microsoft.Management/managementGroups/{0}/descendants'.format(management_group)
+            # descendants include the subscriptions of nested management groups
+            subscriptions.extend(d['name'] for d in self._list_all(url, self._management_group_api_version)
+                                 if d['type'].lower() == 'microsoft.management/managementgroups/subscriptions')
+
+        unique_subscriptions = []
+        for subscription_id in subscriptions:
+            if subscription_id.lower() not in [s.lower() for s in unique_subscriptions]:
+                unique_subscriptions.append(subscription_id)
+
+        return unique_subscriptions or [self._clientconfig.subscription_id]
+
+    def _list_all(self, url, api_version):
+        '''
+        Return the items of all the pages of a list operation.
+        '''
+        items = []
+        while url:
+            response = self.send_request(url, api_version)
+            if 'error' in response:
+                raise AnsibleError("Failed to list {0}: {1}".format(url, response['error'].get('message')))
+            items.extend(response.get('value', []))
+            url = response.get('nextLink')
+        return items
+
+    def _get_hosts_from_resource_graph(self, vm_rgs, subscriptions):
+        '''
+        Build the hosts from a few paged Resource Graph queries instead of one request per VM, NIC and public IP.
+        The VMs whose NICs or public IPs are not in the results yet, eg. just created ones, are queued to be fetched
+        from Azure Resource Manager, as well as the instance view of the VMs without a power state.
+        '''
+        rg_filter = ''
+        if '*' not in vm_rgs:
+            rg_filter = "| where resourceGroup in~ ({0}) ".format(', '.join("'{0}'".format(rg.replace("'", "\\'")) for rg in vm_rgs))
+        vms = self._query_resource_graph(subscriptions, "Resources | where type =~ 'microsoft.compute/virtualmachines' " + rg_filter +
+                                         "| project id, name, type, location, tags, zones, properties")
+        nics = self._query_resource_graph(subscriptions, "Resources | where type =~ 'microsoft.network/networkinterfaces' "
+                                          "and isnotempty(properties.virtualMachine.id) | project id, name, type, location, tags, properties")
+        pips = self._query_resource_graph(subscriptions, "Resources | where type =~ 'microsoft.network/publicipaddresses' "
+                                          "and isnotempty(properties.ipConfiguration.id) | project id, name, type, location, tags, properties")
+        nics = dict((nic['id'].lower(), nic) for nic in nics)
+        pips = dict((pip['id'].lower(), pip) for pip in pips)
+
+        hosts = []
+        for vm in vms:
+            # Resource Graph returns null for the columns a resource doesn't have, ARM leaves them out
+            vm = dict((k, v) for k, v in iteritems(vm) if v is not None)
+            power_state = vm['properties'].pop('extended', {}).get('instanceView', {}).get('powerState')
+
+            host = AzureHost(vm, self, legacy_name=self._legacy_hostnames, fetch=False)
+            if power_state:
+                host._on_instanceview_response(dict(statuses=[power_state]))
+            hosts.append(host)
+
+        for host in self._pushdown_filter_hosts(hosts):
+            host_nics = self._resolve_nics(host._vm_model, nics, pips)
+            if host_nics is not None:
+                host._add_nics(host_nics)
+            host._enqueue_requests(fetch_nics=host_nics is None)
+            self._hosts.append(host)
+
+    @staticmethod
+    def _resolve_nics(vm_model, nics, pips):
+        '''
+        Look up the NICs of a VM and their public IPs in dictionaries of models keyed by lowercase resource id.
+        Returns them in the form AzureHost restores from the inventory cache, or None when one of them is missing.
+        '''
+        nic_refs = vm_model['properties']['networkProfile']['networkInterfaces']
+        host_nics = []
+        for nic_ref in nic_refs:
+            nic = nics.get(nic_ref['id'].lower())
+            if nic is None:
+                return None
+            pip_ids = [ipc['properties']['publicIPAddress']['id'].lower() for ipc in nic.get('properties', {}).get('ipConfigurations', [])
+                       if ipc['properties'].get('publicIPAddress')]
+            if any(pip_id not in pips for pip_id in pip_ids):
+                return None
+            # single-nic instances don't set primary, so figure it out...
+            host_nics.append(dict(nic=nic, is_primary=nic_ref.get('properties', {}).get('primary', len(nic_refs) == 1),
+                                  public_ips=[pips[pip_id] for pip_id in pip_ids]))
+        return host_nics
+
+    def _query_resource_graph(self, subscriptions, query):
+        '''
+        Run a Resource Graph query on the subscriptions and return all the rows, following $skipToken.
+        '''
+        rows = []
+        query_parameters = {'api-version': self._resource_graph_api_version}
+        # a query is limited to 1000 subscriptions
+        for index in range(0, len(subscriptions), 1000):
+            options = {'resultFormat': 'objectArray', '$top': 1000}
+            while True:
+                header_parameters = {'x-ms-client-request-id': str(uuid.uuid4()), 'Content-Type': 'application/json; charset=utf-8'}
+                body = dict(subscriptions=subscriptions[index:index + 1000], query=query, options=options)
+                request = self.new_client.post('/providers/Microsoft.ResourceGraph/resources', query_parameters, header_parameters, body)
+                response = self.new_client.send_request(request)
+                if response.status_code != 200:
+                    raise AnsibleError("Resource Graph query failed with status {0}: {1}".format(response.status_code, to_native(response.text())))
+                result = json.loads(response.body())
+                rows.extend(result.get('data', []))
+                if not result.get('$skipToken'):
+                    break
+                options = dict(options)
+                options['$skipToken'] = result['$skipToken']
+        return rows
+
+    def _dump_hosts(self):
+        '''
+        Return the raw models of the fetched hosts in a JSON-serializable form for the inventory cache.
+        '''
+        return dict(hosts=[h.cache_data() for h in self._hosts], filter_pushdown=self._get_pushdown_fingerprint())
+
+    def _load_hosts(self, cache_data):
+        self._hosts = []
+        for h in cache_data['hosts']:
+            if 'arc_machine' in h:
+                self._hosts.append(AzureArcHost(h['arc_machine'], self, legacy_name=self._legacy_hostnames))
+            elif 'container_group' in h:
+                self._hosts.append(AzureContainerGroupHost(h['container_group'], self, legacy_name=self._legacy_hostnames, fetch_instance_view=False))
+            else:
+                self._hosts.append(AzureHost(h['vm'], self, vmss=h['vmss'], legacy_name=self._legacy_hostnames, cache_data=h,
+                                             aks_cluster=h.get('aks_cluster')))
+
+    def _populate(self):
         constructable_config_strict = boolean(self.get_option('fail_on_template_errors'))
         if self.get_option('hostvar_expressions') is not None:
             constructable_config_compose = self.get_option('hostvar_expressions')
@@ -322,12 +756,21 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
 
         constructable_hostnames = self.get_option('hostnames')
 
-        for h in self._hosts:
+        excluded = included = None
+        if self._precompile_filters:
+            hosts_hostvars = [h.hostvars for h in self._hosts]
+            excluded = self._filter_hosts(self._filters, hosts_hostvars)
+            included = self._filter_hosts(self._include_filters, hosts_hostvars)
+
+        for index, h in enumerate(self._hosts):
+            # the hosts already filtered out don't need a hostname
+            if (excluded and excluded[index]) or (included and not included[index]):
+                continue
             # FUTURE: track hostnames to warn if a hostname is repeated (can happen for legacy and for composed inventory_hostname)
             inventory_hostname = self._get_hostname(h, hostnames=constructable_hostnames, strict=constructable_config_strict)
-            if self._filter_exclude_host(inventory_hostname, h.hostvars):
+            if excluded is None and self._filter_exclude_host(inventory_hostname, h.hostvars):
                 continue
-            if not self._filter_include_host(inventory_hostname, h.hostvars):
+            if included is None and not self._filter_include_host(inventory_hostname, h.hostvars):
                 continue
             self.inventory.add_host(inventory_hostname)
             # FUTURE: configurable default IP list? can already do this via hostvar_expressions
@@ -348,7 +791,7 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
 
         for condition in filter:
             # FUTURE: should warn/fail if conditional doesn't return True or False
-            conditional = "{{% if {0} %}} True {{% else %}} False {{% endif %}}".format(condition)
+            conditional = trust_as_template("{{% if {0} %}} True {{% else %}} False {{% endif %}}".format(condition))
             try:
                 if boolean(self.templar.template(conditional)):
                     return True
@@ -359,6 +802,96 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
 
         return False
 
+    def _filter_hosts(self, filter, hosts_hostvars):
+        '''
+        Evaluate filter for many hosts at once, with a single template compiled once instead of a template per
+        condition and host. Returns whether a condition is true for each of hosts_hostvars, or None when the template
+        fails (eg. a condition fails for a host, or refers to a variable it doesn't define) so that the hosts are
+        evaluated one by one, with the error handling of _filter_host.
+        '''
+        if not filter or not hosts_hostvars:
+            return [False] * len(hosts_hostvars)
+
+        # the conditions are chained like _filter_host evaluates them, the first true one wins
+        conditions = "{{% if {0} %}}T{{% else %}}F{{% endif %}}".format(' %}T{% elif '.join(to_text(condition) for condition in filter))
+        variables = self._get_template_variables(conditions)
+        if variables is None:
+            return None
+        # only bind the host variables the conditions refer to, each binding costs a lookup per host
+        names = []
+        for hostvars in hosts_hostvars:
+            names.extend(name for name in hostvars if name in variables and name not in names)
+        template = "{{% for __azure_host in __azure_hosts %}}{{% with {0} %}}{1}{{% endwith %}}{{% endfor %}}".format(
+            ', '.join("{0}=__azure_host['{0}']".format(name) for name in names) or "__azure_host=__azure_host", conditions)
+
+        self.templar.available_variables = dict(__azure_hosts=hosts_hostvars)
+        try:
+            result = to_text(self.templar.template(trust_as_template(template)))
+        except Exception as e:
+            self.display.vvvv("Evaluating the host filters one host at a time: {0}".format(to_native(e)))
+            return None
+        if len(result) != len(hosts_hostvars) or result.strip('TF'):
+            return None
+        return [flag == 'T' for flag in result]
+
+    def _get_pushdown_filters(self, power_state):
+        '''
+        Return the conditions of the exclude filters and the include filters that can be evaluated from the VM lists
+        (with their power state, when power_state is true) before any other request, see filter_pushdown. The include
+        filters are only pushed down when all of them can be.
+        '''
+        variables = set(self._pushdown_variables)
+        if power_state:
+            variables.add('powerstate')
+
+        def pushdown(condition):
+            condition_variables = self._get_template_variables("{{% if {0} %}}{{% endif %}}".format(condition))
+            return condition_variables is not None and condition_variables <= variables
+
+        include_filters = self._include_filters if all(pushdown(condition) for condition in self._include_filters) else None
+        return [condition for condition in self._filters if pushdown(condition)], include_filters
+
+    @staticmethod
+    def _get_template_variables(template):
+        '''
+        Return the names of the variables template refers to, or None when it is not valid Jinja.
+        '''
+        try:
+            # they only depend on the Jinja syntax, not on the filters and tests of Ansible
+            return meta.find_undeclared_variables(Environment().parse(template))
+        except Exception:
+            return None
+
+    def _get_pushdown_fingerprint(self):
+        '''
+        Return the filters pushed down to the VM lists, whose excluded VMs are missing from the cache and the snapshot.
+        '''
+        if not self._pushdown_filters:
+            return None
+        # lists, to compare equal once loaded from JSON
+        return [[list(exclude_filters), include_filters and list(include_filters)]
+                for exclude_filters, include_filters in (self._pushdown_filters[False], self._pushdown_filters[True])]
+
+    def _pushdown_filter_hosts(self, hosts):
+        '''
+        Return the hosts not filtered out by the filters pushed down to the VM lists, whose instance view, NICs and
+        public IPs are then requested. A host is kept when a filter can't be evaluated yet.
+        '''
+        if not self._pushdown_filters or not hosts:
+            return hosts
+
+        filtered_out = set()
+        for power_state, (exclude_filters, include_filters) in iteritems(self._pushdown_filters):
+            group = [h for h in hosts if (h._instanceview is not None) == power_state]
+            if not group:
+                continue
+            hosts_hostvars = [h._build_hostvars() for h in group]
+            excluded = self._filter_hosts(exclude_filters, hosts_hostvars) or [False] * len(group)
+            included = self._filter_hosts(include_filters, hosts_hostvars) if include_filters is not None else None
+            included = included or [True] * len(group)
+            filtered_out.update(id(h) for h, e, i in zip(group, excluded, included) if e or not i)
+        return [h for h in hosts if id(h) not in filtered_out]
+
     def _filter_include_host(self, inventory_hostname, hostvars):
         return self._filter_host(self._include_filters, inventory_hostname, hostvars)
 
@@ -399,60 +932,209 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
         except Empty:
             pass
 
-    def _on_vm_page_response(self, response, vmss=None):
+    def _process_queue_concurrent(self, max_workers):
+        '''
+        Send the queued requests from a pool of threads. The handlers are only called from this thread, in the order
+        the requests were queued, so they need no locking and the hosts come out in the same order as with
+        _process_queue_serial.
+        '''
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        try:
+            while True:
+                try:
+                    while True:
+                        item = self._request_queue.get_nowait()
+                        pending.append((item, executor.submit(self.send_request, item.url, item.api_version)))
+                except Empty:
+                    pass
+
+                if not pending:
+                    break
+
+                item, future = pending.popleft()
+                item.handler(future.result(), **item.handler_args)
+        finally:
+            for item, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _on_vm_page_response(self, response, vmss=None, aks_cluster=None, fallback_url=None):
+        if 'value' not in response:
+            # an error response, eg. a list rejecting the parameters that return the instance views
+            error = response.get('error') or {}
+            message = to_native(error.get('message') or error.get('code') or response)
+            if fallback_url:
+                # the hosts listed without their instance view fetch it with one request each
+                self.display.warning("Failed to list the VMs with their power state, listing them without it: {0}".format(message))
+                self._enqueue_get(url=fallback_url, api_version=self._compute_api_version, handler=self._on_vm_page_response,
+                                  handler_args=dict(vmss=vmss, aks_cluster=aks_cluster))
+            else:
+                self.display.warning("Failed to list the VMs: {0}".format(message))
+            return
+
+        next_link = response.get('nextLink')
+
+        if next_link:
+            self._enqueue_get(url=next_link, api_version=self._compute_api_version, handler=self._on_vm_page_response,
+                              handler_args=dict(vmss=vmss, aks_cluster=aks_cluster))
+
+        # the NICs of VMSS instances are not in the networkInterfaces list
+        prefetch = self._network_prefetch and not vmss
+        hosts = [AzureHost(h, self, vmss=vmss, legacy_name=self._legacy_hostnames, aks_cluster=aks_cluster, fetch=False) for h in response['value']]
+        for host in self._pushdown_filter_hosts(hosts):
+            host._enqueue_requests(fetch_nics=not prefetch)
+            self._hosts.append(host)
+            if prefetch:
+                self._prefetch_hosts.append(host)
+
+    def _on_vm_response(self, vm_model, index):
+        # a VM deleted since it changed returns an error
+        if 'id' in vm_model:
+            host = AzureHost(vm_model, self, legacy_name=self._legacy_hostnames, fetch=False)
+            if self._pushdown_filter_hosts([host]):
+                host._enqueue_requests()
+                self._hosts[index] = host
+
+    def _on_network_page_response(self, response, models):
         next_link = response.get('nextLink')
 
         if next_link:
-            self._enqueue_get(url=next_link, api_version=self._compute_api_version, handler=self._on_vm_page_response)
+            self._enqueue_get(url=next_link, api_version=self._network_api_version, handler=self._on_network_page_response,
+                              handler_args=dict(models=models))
 
-        if 'value' in response:
-            for h in response['value']:
-                # FUTURE: add direct VM filtering by tag here (performance optimization)?
-                self._hosts.append(AzureHost(h, self, vmss=vmss, legacy_name=self._legacy_hostnames))
+        for model in response.get('value', []):
+            models[model['id'].lower()] = model
 
-    def _on_vmss_page_response(self, response):
+    def _on_vmss_page_response(self, response, aks_cluster=None):
         next_link = response.get('nextLink')
 
         if next_link:
-            self._enqueue_get(url=next_link, api_version=self._compute_api_version, handler=self._on_vmss_page_response)
+            self._enqueue_get(url=next_link, api_version=self._compute_api_version, handler=self._on_vmss_page_response,
+                              handler_args=dict(aks_cluster=aks_cluster))
 
         # FUTURE: add direct VMSS filtering by tag here (performance optimization)?
         for vmss in response['value']:
             url = '{0}/virtualMachines'.format(vmss['id'])
+            handler_args = dict(vmss=vmss)
+            if self._bulk_power_state:
+                # unlike the VM lists, the scale set instance list accepts $expand=instanceView without a $filter
+                handler_args['fallback_url'] = url
+                url += '?$expand=instanceView'
+            if aks_cluster:
+                # AKS tags the VMSS of each node pool with the name of the pool
+                handler_args['aks_cluster'] = dict(aks_cluster, node_pool=(vmss.get('tags') or {}).get('aks-managed-poolName'))
             # VMSS instances look close enough to regular VMs that we can share the handler impl...
-            self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vm_page_response, handler_args=dict(vmss=vmss))
+            self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vm_page_response, handler_args=handler_args)
+
+    def _on_aks_page_response(self, response, api_version):
+        next_link = response.get('nextLink')
+
+        if next_link:
+            self._enqueue_get(url=next_link, api_version=api_version, handler=self._on_aks_page_response, handler_args=dict(api_version=api_version))
+
+        for cluster in response.get('value', []):
+            node_resource_group = cluster.get('properties', {}).get('nodeResourceGroup')
+            if not node_resource_group:
+                continue
+            # the node pools are the VMSSs of the node resource group of the cluster
+            url = '/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Compute/virtualMachineScaleSets'.format(
+                parse_resource_id(cluster['id'])['subscription'], node_resource_group)
+            self._enqueue_get(url=url, api_version=self._compute_api_version, handler=self._on_vmss_page_response,
+                              handler_args=dict(aks_cluster=dict(id=cluster['id'], name=cluster['name'])))
+
+    def _on_arc_page_response(self, response, api_version):
+        next_link = response.get('nextLink')
+
+        if next_link:
+            self._enqueue_get(url=next_link, api_version=api_version, handler=self._on_arc_page_response, handler_args=dict(api_version=api_version))
+
+        for machine in response.get('value', []):
+            self._hosts.append(AzureArcHost(machine, self, legacy_name=self._legacy_hostnames))
+
+    def _on_container_group_page_response(self, response, api_version):
+        next_link = response.get('nextLink')
+
+        if next_link:
+            self._enqueue_get(url=next_link, api_version=api_version, handler=self._on_container_group_page_response,
+                              handler_args=dict(api_version=api_version))
+
+        for container_group in response.get('value', []):
+            self._hosts.append(AzureContainerGroupHost(container_group, self, legacy_name=self._legacy_hostnames))
 
     # use the undocumented /batch endpoint to bulk-send up to 500 requests in a single round-trip
     #
     def _process_queue_batch(self):
-        while True:
-            batch_requests = []
-            batch_item_index = 0
-            batch_response_handlers = dict()
-            try:
-                while batch_item_index < 100:
-                    item = self._request_queue.get_nowait()
-
-                    name = str(uuid.uuid4())
-                    query_parameters = {'api-version': item.api_version}
-                    header_parameters = {'x-ms-client-request-id': str(uuid.uuid4()), 'Content-Type': 'application/json; charset=utf-8'}
-                    body = {}
-                    req = self.new_client.get(item.url, query_parameters, header_parameters, body)
-                    batch_requests.append(dict(httpMethod="GET", url=req.url, name=name))
-                    batch_response_handlers[name] = item
-                    batch_item_index += 1
-            except Empty:
-                pass
-
-            if not batch_requests:
-                break
-
-            self.retry_batch(batch_requests, batch_response_handlers)
-
-    def retry_batch(self, batch_requests, batch_response_handlers, backoff_factor=0.8, retry_limit=10):
+        '''
+        Send the queued requests in /batch requests, up to request_concurrency of them at a time. Like
+        _process_queue_concurrent, the handlers are called from this thread in the order the requests were queued.
+        The batch size is halved after a batch was throttled and grows back to batch_size after batches that weren't.
+        '''
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=self._request_concurrency)
+        try:
+            while True:
+                while len(pending) < self._request_concurrency:
+                    batch_requests = []
+                    batch_response_handlers = dict()
+                    try:
+                        while len(batch_requests) < self._current_batch_size:
+                            item = self._request_queue.get_nowait()
+
+                            name = str(uuid.uuid4())
+                            query_parameters = {'api-version': item.api_version}
+                            header_parameters = {'x-ms-client-request-id': str(uuid.uuid4()), 'Content-Type': 'application/json; charset=utf-8'}
+                            body = {}
+                            req = self.new_client.get(item.url, query_parameters, header_parameters, body)
+                            batch_requests.append(dict(httpMethod="GET", url=req.url, name=name))
+                            batch_response_handlers[name] = item
+                    except Empty:
+                        pass
+
+                    if not batch_requests:
+                        break
+                    pending.append((batch_requests, batch_response_handlers, executor.submit(self.retry_batch, list(batch_requests))))
+
+                if not pending:
+                    break
+
+                batch_requests, batch_response_handlers, future = pending.popleft()
+                responses, errors, throttled = future.result()
+                if throttled:
+                    self._current_batch_size = max(1, self._current_batch_size // 2)
+                else:
+                    self._current_batch_size = min(self._batch_size, self._current_batch_size + max(1, self._batch_size // 10))
+                for r in batch_requests:
+                    # FUTURE: error-tolerant operation mode (eg, permissions)
+                    # FUTURE: store/handle errors from individual handlers
+                    result = batch_response_handlers[r['name']]
+                    if r['name'] in responses:
+                        result.handler(responses[r['name']], **result.handler_args)
+                    elif r['name'] in errors and result.handler == self._on_vm_page_response:
+                        # the VM lists report their errors, as they do with the error bodies _process_queue_serial passes
+                        result.handler(errors[r['name']], **result.handler_args)
+        finally:
+            for batch_requests, batch_response_handlers, future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def retry_batch(self, batch_requests, backoff_factor=None, retry_limit=None):
+        '''
+        Send batch_requests, then again the ones that were throttled or failed with a transient error, until they all
+        succeed or retry_limit retries are reached.
+        Returns the content of the successful responses and of the failed ones by request name, and whether a request
+        was throttled.
+        '''
+        if backoff_factor is None:
+            backoff_factor = self._batch_backoff_factor
+        if retry_limit is None:
+            retry_limit = self._batch_retries
         retry_count = 1
         _SAFE_CODES = set(range(506)) - set([408, 429, 500, 502, 503, 504])
         _RETRY_CODES = set(range(999)) - _SAFE_CODES
+        responses = dict()
+        errors = dict()
+        throttled = False
         while True:
             batch_resp = self._send_batch(batch_requests)
             key_name = None
@@ -462,32 +1144,31 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
                 key_name = 'value'
             else:
                 raise AnsibleError("didn't find expected key responses/value in batch response")
-            batch_processed = []
-            batch_retry = False
-            for idx, r in enumerate(batch_resp[key_name]):
+            retry_names = set()
+            retry_after = 0
+            for r in batch_resp[key_name]:
                 status_code = r.get('httpStatusCode')
-                returned_name = r['name']
-                result = batch_response_handlers[returned_name]
                 if status_code == 200:
-                    # FUTURE: error-tolerant operation mode (eg, permissions)
-                    # FUTURE: store/handle errors from individual handlers
-                    result.handler(r['content'], **result.handler_args)
-                    batch_processed.append(returned_name)
+                    responses[r['name']] = r['content']
                 elif status_code in _RETRY_CODES:
                     # 429: Too many requests Error, Backoff and Retry
-                    batch_retry = True
-            if batch_retry:
-                time.sleep(backoff_factor * (2 ** (retry_count)))
-                retry_count += 1
-                if len(batch_processed) > 0:
-                    # Remove already processed requests
-                    for idx, r in enumerate(batch_requests):
-                        if r.get('name') in batch_processed:
-                            processed = batch_requests.pop(idx)
-                if retry_count > retry_limit:
-                    raise AnsibleError("Reached maximum retries in batch request")
-            else:
-                break
+                    retry_names.add(r['name'])
+                    throttled = throttled or status_code == 429
+                    headers = dict((k.lower(), v) for k, v in iteritems(r.get('headers') or {}))
+                    try:
+                        retry_after = max(retry_after, float(headers.get('retry-after', 0)))
+                    except ValueError:
+                        pass
+                else:
+                    errors[r['name']] = r.get('content') or dict(error=dict(code=str(status_code)))
+            if not retry_names:
+                return responses, errors, throttled
+            if retry_count > retry_limit:
+                raise AnsibleError("Reached maximum retries in batch request")
+            time.sleep(max(retry_after, backoff_factor * (2 ** (retry_count))))
+            retry_count += 1
+            # only send the requests to retry again
+            batch_requests = [r for r in batch_requests if r['name'] in retry_names]
 
     def _send_batch(self, batched_requests):
         url = '/batch'
@@ -552,10 +1233,11 @@ class InventoryModule(BaseInventoryPlugin, Constructable):
 class AzureHost(object):
     _powerstate_regex = re.compile('^PowerState/(?P<powerstate>.+)$')
 
-    def __init__(self, vm_model, inventory_client, vmss=None, legacy_name=False):
+    def __init__(self, vm_model, inventory_client, vmss=None, legacy_name=False, cache_data=None, fetch_nics=True, aks_cluster=None, fetch=True):
         self._inventory_client = inventory_client
         self._vm_model = vm_model
         self._vmss = vmss
+        self._aks_cluster = aks_cluster
 
         self._instanceview = None
 
@@ -570,23 +1252,55 @@ class AzureHost(object):
 
         self._hostvars = {}
 
-        inventory_client._enqueue_get(url="{0}/instanceView".format(vm_model['id']),
-                                      api_version=self._inventory_client._compute_api_version,
-                                      handler=self._on_instanceview_response)
-
-        nic_refs = vm_model['properties']['networkProfile']['networkInterfaces']
+        if cache_data is not None:
+            # restored from the inventory cache, the instance view and NICs have already been fetched
+            if cache_data.get('instance_view') is not None:
+                self._on_instanceview_response(cache_data['instance_view'])
+            self._add_nics(cache_data.get('nics', []))
+            return
+
+        # listed with statusOnly=true or $expand=instanceView (bulk_power_state)
+        instanceview = vm_model['properties'].pop('instanceView', None)
+        if instanceview is not None:
+            self._on_instanceview_response(instanceview)
+
+        # without fetch, the caller enqueues the requests once it knows it keeps the host (filter_pushdown)
+        if fetch:
+            self._enqueue_requests(fetch_nics)
+
+    def _enqueue_requests(self, fetch_nics=True):
+        if self._instanceview is None:
+            self._inventory_client._enqueue_get(url="{0}/instanceView".format(self._vm_model['id']),
+                                                api_version=self._inventory_client._compute_api_version,
+                                                handler=self._on_instanceview_response)
+
+        if fetch_nics:
+            self._enqueue_nics()
+
+    def _enqueue_nics(self):
+        nic_refs = self._vm_model['properties']['networkProfile']['networkInterfaces']
         for nic in nic_refs:
             # single-nic instances don't set primary, so figure it out...
             is_primary = nic.get('properties', {}).get('primary', len(nic_refs) == 1)
-            inventory_client._enqueue_get(url=nic['id'], api_version=self._inventory_client._network_api_version,
-                                          handler=self._on_nic_response,
-                                          handler_args=dict(is_primary=is_primary))
+            self._inventory_client._enqueue_get(url=nic['id'], api_version=self._inventory_client._network_api_version,
+                                                handler=self._on_nic_response,
+                                                handler_args=dict(is_primary=is_primary))
+
+    def _add_nics(self, nics):
+        '''
+        Add NICs whose models and public IP models have already been fetched, in the form returned by cache_data.
+        '''
+        for nic in nics:
+            self.nics.append(AzureNic(nic_model=nic['nic'], inventory_client=self._inventory_client, is_primary=nic['is_primary'],
+                                      pip_models=nic['public_ips']))
 
     @property
     def hostvars(self):
-        if self._hostvars != {}:
-            return self._hostvars
+        if self._hostvars == {}:
+            self._hostvars = self._build_hostvars()
+        return self._hostvars
 
+    def _build_hostvars(self):
         system = "unknown"
         if 'osProfile' in self._vm_model['properties']:
             if 'linuxConfiguration' in self._vm_model['properties']['osProfile']:
@@ -631,9 +1345,11 @@ class AzureHost(object):
                 id=self._vmss['id'],
                 name=self._vmss['name'],
             ) if self._vmss else {},
+            aks_cluster=self._aks_cluster or {},
             virtual_machine_size=self._vm_model['properties']['hardwareProfile']['vmSize'] if self._vm_model['properties'].get('hardwareProfile') else None,
             plan=self._vm_model['properties']['plan']['name'] if self._vm_model['properties'].get('plan') else None,
             resource_group=parse_resource_id(self._vm_model['id']).get('resource_group').lower(),
+            subscription_id=parse_resource_id(self._vm_model['id']).get('subscription'),
             default_inventory_hostname=self.default_inventory_hostname,
             creation_time=self._vm_model['properties']['timeCreated'],
             license_type=self._vm_model['properties'].get('licenseType', 'Unknown')
@@ -708,8 +1424,17 @@ class AzureHost(object):
                 ) for dataDisk in storageProfile.get('dataDisks', [])
             ]
 
-        self._hostvars = new_hostvars
-        return self._hostvars
+        return new_hostvars
+
+    def cache_data(self):
+        return dict(
+            vm=self._vm_model,
+            vmss=self._vmss,
+            aks_cluster=self._aks_cluster,
+            instance_view=self._instanceview,
+            nics=[dict(nic=nic._nic_model, is_primary=nic.is_primary, public_ips=[pip._pip_model for pip in nic.public_ips.values()])
+                  for nic in self.nics]
+        )
 
     def _on_instanceview_response(self, vm_instanceview_model):
         self._instanceview = vm_instanceview_model
@@ -721,15 +1446,161 @@ class AzureHost(object):
         self.nics.append(nic)
 
 
+class AzureResourceHost(object):
+    '''
+    Base class of the hosts that are not VMs, their hostvars have the same keys as those of AzureHost so that the same
+    filters, groups and hostvar expressions apply to every host.
+    '''
+
+    def __init__(self, model, inventory_client, legacy_name=False):
+        self._inventory_client = inventory_client
+        self._model = model
+
+        if legacy_name:
+            self.default_inventory_hostname = model['name']
+        else:
+            self.default_inventory_hostname = '{0}_{1}'.format(model['name'], hashlib.sha1(to_bytes(model['id'])).hexdigest()[0:4])
+
+        self._hostvars = {}
+
+    @property
+    def hostvars(self):
+        if self._hostvars != {}:
+            return self._hostvars
+
+        self._hostvars = dict(
+            network_interface=[],
+            mac_address=[],
+            network_interface_id=[],
+            security_group_id=[],
+            security_group=[],
+            public_ip_address=[],
+            public_ipv4_address=[],
+            public_dns_hostnames=[],
+            private_ipv4_addresses=[],
+            subnet=[],
+            id=self._model['id'],
+            location=self._model['location'],
+            name=self._model['name'],
+            computer_name=None,
+            availability_zone=self._model.get('zones'),
+            powerstate='unknown',
+            provisioning_state=self._model.get('properties', {}).get('provisioningState', 'unknown').lower(),
+            tags=self._model.get('tags') or {},
+            resource_type=self._model.get('type', "unknown"),
+            vmid=None,
+            os_profile=dict(
+                system='unknown',
+            ),
+            vmss={},
+            aks_cluster={},
+            virtual_machine_size=None,
+            plan=None,
+            resource_group=parse_resource_id(self._model['id']).get('resource_group').lower(),
+            subscription_id=parse_resource_id(self._model['id']).get('subscription'),
+            default_inventory_hostname=self.default_inventory_hostname,
+            creation_time=None,
+            license_type='Unknown',
+            image={},
+            os_disk={},
+            data_disks=[]
+        )
+        self._update_hostvars(self._hostvars, self._model.get('properties', {}))
+        return self._hostvars
+
+    def _update_hostvars(self, hostvars, properties):
+        pass
+
+
+class AzureArcHost(AzureResourceHost):
+    '''
+    An Azure Arc-enabled server, its powerstate is running while its agent is connected and the status of the agent
+    (disconnected, expired...) otherwise.
+    '''
+
+    def _update_hostvars(self, hostvars, properties):
+        status = properties.get('status', 'unknown').lower()
+        hostvars.update(
+            computer_name=properties.get('osProfile', {}).get('computerName'),
+            powerstate='running' if status == 'connected' else status,
+            vmid=properties.get('vmId'),
+            os_profile=dict(
+                system=properties.get('osType', 'unknown').lower(),
+            ),
+            image=dict(
+                offer=properties.get('osName'),
+                version=properties.get('osVersion'),
+                sku=properties.get('osSku')
+            ),
+            creation_time=self._model.get('systemData', {}).get('createdAt')
+        )
+        for nic in properties.get('networkProfile', {}).get('networkInterfaces', []):
+            for ip_address in nic.get('ipAddresses', []):
+                if ip_address.get('subnet'):
+                    hostvars['subnet'].append(ip_address['subnet'])
+                if ip_address.get('address') and ip_address.get('ipAddressVersion', 'IPv4') == 'IPv4':
+                    hostvars['private_ipv4_addresses'].append(ip_address['address'])
+
+    def cache_data(self):
+        return dict(arc_machine=self._model)
+
+
+class AzureContainerGroupHost(AzureResourceHost):
+    '''
+    An Azure Container Instances container group, its powerstate is the state of the group (running, stopped...).
+    '''
+
+    def __init__(self, model, inventory_client, legacy_name=False, fetch_instance_view=True):
+        super(AzureContainerGroupHost, self).__init__(model, inventory_client, legacy_name=legacy_name)
+
+        # the list doesn't always include the instance view, a GET does
+        if fetch_instance_view and 'instanceView' not in model.get('properties', {}):
+            inventory_client._enqueue_get(url=model['id'], api_version=inventory_client._container_instance_api_version,
+                                          handler=self._on_container_group_response)
+
+    def _update_hostvars(self, hostvars, properties):
+        hostvars.update(
+            powerstate=properties.get('instanceView', {}).get('state', 'unknown').lower(),
+            os_profile=dict(
+                system=properties.get('osType', 'unknown').lower(),
+            ),
+            subnet=[dict(id=subnet['id']) for subnet in properties.get('subnetIds', [])],
+            containers=[dict(name=container['name'], image=container.get('properties', {}).get('image'))
+                        for container in properties.get('containers', [])],
+            creation_time=self._model.get('systemData', {}).get('createdAt')
+        )
+        ip_address = properties.get('ipAddress', {})
+        if ip_address.get('ip'):
+            if ip_address.get('type', 'Public').lower() == 'public':
+                hostvars['public_ipv4_address'].append(ip_address['ip'])
+                hostvars['public_ip_address'].append(dict(id=None, name=None, ipv4_address=ip_address['ip']))
+                if ip_address.get('fqdn'):
+                    hostvars['public_dns_hostnames'].append(ip_address['fqdn'])
+            else:
+                hostvars['private_ipv4_addresses'].append(ip_address['ip'])
+
+    def cache_data(self):
+        return dict(container_group=self._model)
+
+    def _on_container_group_response(self, container_group_model):
+        # a container group deleted since it was listed returns an error
+        if 'id' in container_group_model:
+            self._model = container_group_model
+
+
 class AzureNic(object):
-    def __init__(self, nic_model, inventory_client, is_primary=False):
+    def __init__(self, nic_model, inventory_client, is_primary=False, pip_models=None):
         self._nic_model = nic_model
         self.is_primary = is_primary
         self._inventory_client = inventory_client
 
         self.public_ips = {}
 
-        if nic_model.get('properties', {}).get('ipConfigurations'):
+        if pip_models is not None:
+            # restored from the inventory cache
+            for pip_model in pip_models:
+                self._on_pip_response(pip_model)
+        elif nic_model.get('properties', {}).get('ipConfigurations'):
             for ipc in nic_model['properties']['ipConfigurations']:
                 pip = ipc['properties'].get('publicIPAddress')
                 if pip:
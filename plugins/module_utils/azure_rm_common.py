@@ -9,12 +9,16 @@ __metaclass__ = type
 
 import os
 import re
+import random
 import types
 import copy
 import inspect
+import sys
+import threading
 import traceback
 import json
 
+from concurrent.futures import ThreadPoolExecutor
 from os.path import expanduser
 
 from ansible.module_utils.basic import \
@@ -24,7 +28,9 @@ try:
     from ansible.module_utils.ansible_release import __version__ as ANSIBLE_VERSION
 except Exception:
     ANSIBLE_VERSION = 'unknown'
-from ansible.module_utils.six.moves import configparser
+from ansible.module_utils.six.moves import configparser, queue
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common_rest import ARMRateLimitPolicy, AzureRMHookPolicyChain, AzureRMPerfPolicy
 import ansible.module_utils.six.moves.urllib.parse as urlparse
 
 AZURE_COMMON_ARGS = dict(
@@ -50,6 +56,14 @@ AZURE_COMMON_ARGS = dict(
     x509_certificate_path=dict(type='path', no_log=True),
     thumbprint=dict(type='str', no_log=True),
     disable_instance_discovery=dict(type='bool', default=False),
+    use_persistent_token_cache=dict(type='bool', default=False),
+    allow_unencrypted_token_cache=dict(type='bool', default=False),
+    http_pool_maxsize=dict(type='int', default=10, fallback=(env_fallback, ['AZURE_HTTP_POOL_MAXSIZE'])),
+    http_keep_alive=dict(type='bool', default=True, fallback=(env_fallback, ['AZURE_HTTP_KEEP_ALIVE'])),
+    rate_limit_governor=dict(type='bool', default=False, fallback=(env_fallback, ['AZURE_RATE_LIMIT_GOVERNOR'])),
+    rate_limit_state_file=dict(type='path', fallback=(env_fallback, ['AZURE_RATE_LIMIT_STATE_FILE'])),
+    perf_instrumentation=dict(type='bool', default=False, fallback=(env_fallback, ['AZURE_PERF_INSTRUMENTATION'])),
+    perf_log_path=dict(type='path', fallback=(env_fallback, ['AZURE_PERF_LOG_PATH'])),
 )
 
 AZURE_CREDENTIAL_ENV_MAPPING = dict(
@@ -65,7 +79,9 @@ AZURE_CREDENTIAL_ENV_MAPPING = dict(
     adfs_authority_url='AZURE_ADFS_AUTHORITY_URL',
     x509_certificate_path='AZURE_X509_CERTIFICATE_PATH',
     thumbprint='AZURE_THUMBPRINT',
-    disable_instance_discovery='AZURE_DISABLE_INSTANCE_DISCOVERY'
+    disable_instance_discovery='AZURE_DISABLE_INSTANCE_DISCOVERY',
+    use_persistent_token_cache='AZURE_USE_PERSISTENT_TOKEN_CACHE',
+    allow_unencrypted_token_cache='AZURE_ALLOW_UNENCRYPTED_TOKEN_CACHE'
 )
 
 
@@ -214,6 +230,7 @@ CIDR_PATTERN = re.compile(r"(([0-9]|[1-9][0-9]|1[0-9]{2}|2[0-4][0-9]|25[0-5])\.)
                           r"[0-9]{2}|2[0-4][0-9]|25[0-5])(/([0-9]|[1-2][0-9]|3[0-2]))")
 
 AZURE_SUCCESS_STATE = "Succeeded"
+AZURE_TOKEN_CACHE_NAME = 'azure.azcollection'
 AZURE_FAILED_STATE = "Failed"
 
 HAS_AZURE = True
@@ -241,61 +258,214 @@ try:
     from enum import Enum
     from azure.mgmt.core.tools import parse_resource_id, resource_id, is_valid_resource_id
     from azure.cli.core import cloud as azure_cloud
-    from azure.mgmt.network import NetworkManagementClient
-    from azure.mgmt.resource.resources import ResourceManagementClient
-    from azure.mgmt.managementgroups import ManagementGroupsAPI as ManagementGroupsClient
-    from azure.mgmt.resource.subscriptions import SubscriptionClient
-    from azure.mgmt.storage import StorageManagementClient
-    from azure.mgmt.compute import ComputeManagementClient
-    from azure.mgmt.dns import DnsManagementClient
-    from azure.mgmt.privatedns import PrivateDnsManagementClient
-    import azure.mgmt.privatedns.models as PrivateDnsModels
-    from azure.mgmt.monitor import MonitorManagementClient
-    from azure.mgmt.web import WebSiteManagementClient
-    from azure.mgmt.containerservice import ContainerServiceClient
-    from azure.mgmt.marketplaceordering import MarketplaceOrderingAgreements
-    from azure.mgmt.trafficmanager import TrafficManagerManagementClient
-    from azure.storage.blob import BlobServiceClient
-    from azure.mgmt.authorization import AuthorizationManagementClient
-    from azure.mgmt.sql import SqlManagementClient
-    from azure.mgmt.servicebus import ServiceBusManagementClient
-    from azure.mgmt.rdbms.postgresql import PostgreSQLManagementClient
-    from azure.mgmt.rdbms.postgresql_flexibleservers import PostgreSQLManagementClient as PostgreSQLFlexibleManagementClient
-    from azure.mgmt.rdbms.mysql import MySQLManagementClient
-    from azure.mgmt.rdbms.mariadb import MariaDBManagementClient
-    from azure.mgmt.containerregistry import ContainerRegistryManagementClient
-    from azure.mgmt.containerinstance import ContainerInstanceManagementClient
-    from azure.mgmt.loganalytics import LogAnalyticsManagementClient
-    import azure.mgmt.loganalytics.models as LogAnalyticsModels
-    from azure.mgmt.automation import AutomationClient
-    import azure.mgmt.automation.models as AutomationModel
-    from azure.mgmt.iothub import IotHubClient
-    from azure.mgmt.iothub import models as IoTHubModels
-    from azure.mgmt.resource.locks import ManagementLockClient
-    from azure.mgmt.recoveryservicesbackup import RecoveryServicesBackupClient
-    try:
-        #  Older versions of the library exposed the modules at the root of the package
-        import azure.mgmt.recoveryservicesbackup.models as RecoveryServicesBackupModels
-    except ImportError:
-        import azure.mgmt.recoveryservicesbackup.activestamp.models as RecoveryServicesBackupModels
-    from azure.mgmt.search import SearchManagementClient
-    from azure.mgmt.notificationhubs import NotificationHubsManagementClient
-    from azure.mgmt.eventhub import EventHubManagementClient
-    from azure.mgmt.datafactory import DataFactoryManagementClient
-    import azure.mgmt.datafactory.models as DataFactoryModel
     from azure.identity._credentials import client_secret, user_password, certificate, managed_identity
-    from azure.identity import AzureCliCredential
-    from msgraph import GraphServiceClient
+    from azure.identity import AzureCliCredential, TokenCachePersistenceOptions
+    from azure.core.pipeline.transport import RequestsTransport
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
 
 except ImportError as exc:
     Authentication = object
     HAS_AZURE_EXC = traceback.format_exc()
     HAS_AZURE = False
 
+# Management SDKs are imported the first time a client or models property asks for them (see import_azure_sdk),
+# so a module only pays the import cost of the packages it actually talks to.
+# Each entry is (candidate module paths tried in order, attribute to take from the module or None for the module itself).
+AZURE_SDK_IMPORTS = dict(
+    NetworkManagementClient=(['azure.mgmt.network'], 'NetworkManagementClient'),
+    ResourceManagementClient=(['azure.mgmt.resource.resources'], 'ResourceManagementClient'),
+    ManagementGroupsClient=(['azure.mgmt.managementgroups'], 'ManagementGroupsAPI'),
+    SubscriptionClient=(['azure.mgmt.resource.subscriptions'], 'SubscriptionClient'),
+    StorageManagementClient=(['azure.mgmt.storage'], 'StorageManagementClient'),
+    ComputeManagementClient=(['azure.mgmt.compute'], 'ComputeManagementClient'),
+    DnsManagementClient=(['azure.mgmt.dns'], 'DnsManagementClient'),
+    PrivateDnsManagementClient=(['azure.mgmt.privatedns'], 'PrivateDnsManagementClient'),
+    PrivateDnsModels=(['azure.mgmt.privatedns.models'], None),
+    MonitorManagementClient=(['azure.mgmt.monitor'], 'MonitorManagementClient'),
+    WebSiteManagementClient=(['azure.mgmt.web'], 'WebSiteManagementClient'),
+    ContainerServiceClient=(['azure.mgmt.containerservice'], 'ContainerServiceClient'),
+    MarketplaceOrderingAgreements=(['azure.mgmt.marketplaceordering'], 'MarketplaceOrderingAgreements'),
+    TrafficManagerManagementClient=(['azure.mgmt.trafficmanager'], 'TrafficManagerManagementClient'),
+    BlobServiceClient=(['azure.storage.blob'], 'BlobServiceClient'),
+    AuthorizationManagementClient=(['azure.mgmt.authorization'], 'AuthorizationManagementClient'),
+    SqlManagementClient=(['azure.mgmt.sql'], 'SqlManagementClient'),
+    ServiceBusManagementClient=(['azure.mgmt.servicebus'], 'ServiceBusManagementClient'),
+    PostgreSQLManagementClient=(['azure.mgmt.rdbms.postgresql'], 'PostgreSQLManagementClient'),
+    PostgreSQLFlexibleManagementClient=(['azure.mgmt.rdbms.postgresql_flexibleservers'], 'PostgreSQLManagementClient'),
+    MySQLManagementClient=(['azure.mgmt.rdbms.mysql'], 'MySQLManagementClient'),
+    MariaDBManagementClient=(['azure.mgmt.rdbms.mariadb'], 'MariaDBManagementClient'),
+    ContainerRegistryManagementClient=(['azure.mgmt.containerregistry'], 'ContainerRegistryManagementClient'),
+    ContainerInstanceManagementClient=(['azure.mgmt.containerinstance'], 'ContainerInstanceManagementClient'),
+    LogAnalyticsManagementClient=(['azure.mgmt.loganalytics'], 'LogAnalyticsManagementClient'),
+    LogAnalyticsModels=(['azure.mgmt.loganalytics.models'], None),
+    AutomationClient=(['azure.mgmt.automation'], 'AutomationClient'),
+    AutomationModel=(['azure.mgmt.automation.models'], None),
+    IotHubClient=(['azure.mgmt.iothub'], 'IotHubClient'),
+    IoTHubModels=(['azure.mgmt.iothub.models'], None),
+    ManagementLockClient=(['azure.mgmt.resource.locks'], 'ManagementLockClient'),
+    RecoveryServicesBackupClient=(['azure.mgmt.recoveryservicesbackup'], 'RecoveryServicesBackupClient'),
+    #  Older versions of the library exposed the models at the root of the package
+    RecoveryServicesBackupModels=(['azure.mgmt.recoveryservicesbackup.models',
+                                   'azure.mgmt.recoveryservicesbackup.activestamp.models'], None),
+    SearchManagementClient=(['azure.mgmt.search'], 'SearchManagementClient'),
+    NotificationHubsManagementClient=(['azure.mgmt.notificationhubs'], 'NotificationHubsManagementClient'),
+    EventHubManagementClient=(['azure.mgmt.eventhub'], 'EventHubManagementClient'),
+    DataFactoryManagementClient=(['azure.mgmt.datafactory'], 'DataFactoryManagementClient'),
+    DataFactoryModel=(['azure.mgmt.datafactory.models'], None),
+    GraphServiceClient=(['msgraph'], 'GraphServiceClient'),
+)
+
+_AZURE_SDK_CACHE = dict()
+
+# Process-wide registries used by get_mgmt_svc_client. Inspecting a client class and checking its package
+# version is done once per class, clients built with identical arguments are reused, and clients that share a
+# credential and endpoint send their requests through one requests session, and so one connection pool.
+_CLIENT_ARGSPEC_CACHE = dict()
+_MGMT_CLIENT_CACHE = dict()
+_SHARED_SESSIONS = dict()
+_PROJECTION_TREES = dict()
+_PROJECTION_PLANS = dict()
+_PROJECTION_SERIALIZERS = dict()
+
+
+def import_azure_sdk(name):
+    '''
+    Import an Azure SDK class or module listed in AZURE_SDK_IMPORTS on first use.
+
+    :param name: key of the SDK object in AZURE_SDK_IMPORTS
+    :return: the imported class or module
+    :raises ImportError: if none of the candidate modules provides the object
+    '''
+    if name not in _AZURE_SDK_CACHE:
+        module_paths, attribute = AZURE_SDK_IMPORTS[name]
+        error = None
+        for module_path in module_paths:
+            try:
+                sdk_module = importlib.import_module(module_path)
+            except ImportError as exc:
+                error = exc
+                continue
+            if attribute is None:
+                _AZURE_SDK_CACHE[name] = sdk_module
+            elif hasattr(sdk_module, attribute):
+                _AZURE_SDK_CACHE[name] = getattr(sdk_module, attribute)
+            else:
+                error = ImportError("cannot import name '{0}' from '{1}'".format(attribute, module_path))
+                continue
+            break
+        else:
+            raise error
+    return _AZURE_SDK_CACHE[name]
+
+
+def _projection_tree(fields):
+    # turn ['a', 'b.c', 'b.d'] into (('a', ()), ('b', (('c', ()), ('d', ())))), an empty tuple selecting the whole field
+    key = tuple(fields)
+    if key not in _PROJECTION_TREES:
+        tree = dict()
+        for path in sorted(fields, key=lambda field: field.count('.')):
+            node = tree
+            parts = path.split('.')
+            for index, part in enumerate(parts):
+                if node.get(part, False) is None:
+                    # a parent field is already selected as a whole
+                    break
+                if index == len(parts) - 1:
+                    node[part] = None
+                else:
+                    node = node.setdefault(part, dict())
+
+        def freeze(node):
+            return tuple(sorted((name, freeze(child) if child else ()) for name, child in node.items()))
+        _PROJECTION_TREES[key] = freeze(tree)
+    return _PROJECTION_TREES[key]
+
+
+def _projection_serializer(model_class):
+    # the serializer and key transformer Model.as_dict() uses for this class: recent SDK packages vendor their
+    # serialization module next to the models, which import it as _serialization, older ones use msrest
+    if model_class not in _PROJECTION_SERIALIZERS:
+        serialization = getattr(sys.modules[model_class.__module__], '_serialization', None)
+        if serialization is None:
+            serialization = importlib.import_module('msrest.serialization')
+        _PROJECTION_SERIALIZERS[model_class] = (serialization.Serializer(model_class._infer_class_models()),
+                                                serialization.attribute_transformer)
+    return _PROJECTION_SERIALIZERS[model_class]
+
+
+def _projection_plan(model_class, tree):
+    # attributes of model_class selected by tree, with their serialization type
+    key = (model_class, tree)
+    if key not in _PROJECTION_PLANS:
+        attribute_map = model_class._attribute_map
+        _PROJECTION_PLANS[key] = [(name, attribute_map[name]['type'], subtree) for name, subtree in tree if name in attribute_map]
+    return _PROJECTION_PLANS[key]
+
+
+def _project(value, tree, serializer, key_transformer):
+    if isinstance(value, list):
+        return [_project(item, tree, serializer, key_transformer) for item in value]
+    if isinstance(value, dict):
+        return dict((name, _project(item, tree, serializer, key_transformer)) for name, item in value.items())
+    if not hasattr(value, '_attribute_map'):
+        return value
+    result = dict()
+    for name, data_type, subtree in _projection_plan(type(value), tree):
+        attribute = getattr(value, name, None)
+        if attribute is None:
+            continue
+        if subtree:
+            result[name] = _project(attribute, subtree, serializer, key_transformer)
+        else:
+            result[name] = serializer.serialize_data(attribute, data_type, key_transformer=key_transformer, keep_readonly=True)
+    return result
+
+
+def project_model(obj, fields):
+    '''
+    Serialize the given fields of an SDK model the way obj.as_dict() does, without walking the rest of the model.
+
+    Fields are attribute names, with dots to select the attributes of nested models, eg. 'hardware_profile.vm_size'.
+    Selecting a field of a list of models selects it in every item. The attributes selected for each model class are
+    looked up once and cached.
+
+    :param obj: SDK model
+    :param fields: list of fields to serialize
+    :return: dict holding the selected fields that are set
+    '''
+    serializer, key_transformer = _projection_serializer(type(obj))
+    return _project(obj, _projection_tree(fields), serializer, key_transformer)
+
+
+def _project_dict(value, tree):
+    if isinstance(value, list):
+        return [_project_dict(item, tree) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return dict((name, _project_dict(value[name], subtree) if subtree else value[name]) for name, subtree in tree if name in value)
+
+
+def project_dict(obj, fields):
+    '''
+    Keep the given fields of a JSON object, such as a resource returned by the REST API.
+
+    Fields are keys, with dots to select the keys of nested objects, eg. 'properties.provisioningState'.
+    Selecting a key of a list of objects selects it in every item.
+
+    :param obj: dict
+    :param fields: list of fields to keep
+    :return: dict holding the selected fields that are present
+    '''
+    return _project_dict(obj, _projection_tree(fields))
+
+
 from base64 import b64encode, b64decode
 from hashlib import sha256
 from hmac import HMAC
-from time import time
+from time import time, sleep
+from email.utils import parsedate_tz, mktime_tz
 
 try:
     from urllib import (urlencode, quote_plus)
@@ -334,6 +504,70 @@ def normalize_location_name(name):
     return name.replace(' ', '').lower()
 
 
+def get_cloud_from_metadata_endpoint(arm_endpoint):
+    '''
+    Build the Cloud described by the metadata endpoint of an Azure Resource Manager endpoint, eg. an Azure Stack Hub.
+
+    :param arm_endpoint: URL of the Azure Resource Manager endpoint
+    :return: azure.cli.core.cloud.Cloud
+    '''
+    response = requests.get(arm_endpoint.rstrip('/') + '/metadata/endpoints?api-version=2019-05-01', timeout=60)
+    response.raise_for_status()
+    metadata = response.json()
+    # api-version 2019-05-01 lists clouds, older endpoints describe themselves only
+    clouds = metadata if isinstance(metadata, list) else [metadata]
+    for cloud in clouds:
+        cloud.setdefault('resourceManager', arm_endpoint)
+        cloud.setdefault('name', arm_endpoint)
+        cloud.setdefault('suffixes', dict())
+    cloud = next((cloud for cloud in clouds if cloud['resourceManager'].rstrip('/') == arm_endpoint.rstrip('/')), clouds[0])
+    return azure_cloud._arm_to_cli_mapper(cloud)
+
+
+def create_http_session(pool_maxsize=10, keep_alive=True):
+    '''
+    Create a requests session set up like the ones azure-core creates for itself, with room for pool_maxsize
+    pooled connections per host. Retries are left to the Azure pipeline.
+
+    :param pool_maxsize: maximum number of connections kept open per host
+    :param keep_alive: when False, ask the server to close every connection after its response
+    :return: requests.Session
+    '''
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_maxsize=pool_maxsize, max_retries=Retry(total=False, redirect=False, raise_on_status=False))
+    for protocol in ('http://', 'https://'):
+        session.mount(protocol, adapter)
+    if not keep_alive:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def get_retry_after(response):
+    '''
+    Return the delay in seconds asked for by the Retry-After headers of an HTTP response, or None.
+
+    :param response: an HTTP response, or an exception carrying one in its response attribute or headers
+    :return: number of seconds or None
+    '''
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(response, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    for header, scale in (('retry-after-ms', 0.001), ('x-ms-retry-after-ms', 0.001), ('Retry-After', 1)):
+        value = headers.get(header) or headers.get(header.lower())
+        if not value:
+            continue
+        try:
+            return max(float(value) * scale, 0)
+        except ValueError:
+            # Retry-After may also be an HTTP date
+            parsed = parsedate_tz(value)
+            if parsed:
+                return max(mktime_tz(parsed) - time(), 0)
+    return None
+
+
 # FUTURE: either get this from the requirements file (if we can be sure it's always available at runtime)
 # or generate the requirements files from this so we only have one source of truth to maintain...
 AZURE_PKG_VERSIONS = {
@@ -383,6 +617,79 @@ AZURE_PKG_VERSIONS = {
 AZURE_MIN_RELEASE = '2.0.0'
 
 
+class AzureRMPollerTimeout(Exception):
+    pass
+
+
+class AzureRMPollerGroup(object):
+    '''
+    Waits on several Azure long running operation pollers at the same time.
+
+    Every poller already polls its operation in a background thread, sleeping for the delay the service
+    asks for in Retry-After, so the group only has to block until they signal completion. The whole
+    group takes as long as its slowest operation instead of the sum of all of them.
+    '''
+
+    def __init__(self, pollers, timeout=None, fail_fast=False):
+        '''
+        :param pollers: list of Azure poller objects
+        :param timeout: maximum number of seconds to wait for all operations, None waits forever
+        :param fail_fast: raise the first operation error as soon as it happens instead of after all operations finished
+        '''
+        self.pollers = list(pollers)
+        self.timeout = timeout
+        self.fail_fast = fail_fast
+
+    def as_completed(self):
+        '''
+        Yield (index, result) tuples in the order the operations finish.
+
+        :raises AzureRMPollerTimeout: when the operations did not all finish within timeout seconds
+        :raises Exception: the error of the first failed operation
+        '''
+        completed = queue.Queue()
+
+        def _wait(index, poller):
+            try:
+                poller.wait()
+                completed.put((index, poller.result(), None))
+            except Exception as exc:
+                completed.put((index, None, exc))
+
+        for index, poller in enumerate(self.pollers):
+            waiter = threading.Thread(target=_wait, args=(index, poller))
+            waiter.daemon = True
+            waiter.start()
+
+        deadline = time() + self.timeout if self.timeout is not None else None
+        error = None
+        for dummy in range(len(self.pollers)):
+            try:
+                index, result, exc = completed.get(timeout=max(deadline - time(), 0) if deadline is not None else None)
+            except queue.Empty:
+                raise AzureRMPollerTimeout("Timed out after {0} seconds waiting for {1} long running operations".format(self.timeout, len(self.pollers)))
+            if exc is not None:
+                if self.fail_fast:
+                    raise exc
+                error = error or exc
+                continue
+            yield index, result
+
+        if error is not None:
+            raise error
+
+    def results(self):
+        '''
+        Wait for all operations and return their results in the order of the pollers.
+
+        :return: list of objects resulting from the original requests
+        '''
+        results = [None] * len(self.pollers)
+        for index, result in self.as_completed():
+            results[index] = result
+        return results
+
+
 class AzureRMModuleBase(object):
     def __init__(self, derived_arg_spec, bypass_checks=False, no_log=False,
                  check_invalid_arguments=None, mutually_exclusive=None, required_together=None,
@@ -457,6 +764,11 @@ class AzureRMModuleBase(object):
         self._datafactory_client = None
         self._notification_hub_client = None
         self._event_hub_client = None
+        self._rate_limit_policy = None
+        self._perf_policy = None
+        self._custom_hook_policy = None
+        if self.module.params.get('perf_instrumentation') or self.module.params.get('perf_log_path'):
+            self._perf_policy = AzureRMPerfPolicy()
 
         self.check_mode = self.module.check_mode
         self.api_profile = self.module.params.get('api_profile')
@@ -472,7 +784,7 @@ class AzureRMModuleBase(object):
 
         if not skip_exec:
             res = self.exec_module(**self.module.params)
-            self.module.exit_json(**res)
+            self.module.exit_json(**self.add_perf_summary(res))
 
     def check_client_version(self, client_type):
         # Ensure Azure modules are at least 2.0.0rc5.
@@ -493,6 +805,20 @@ class AzureRMModuleBase(object):
                 self.module.warn("Installed azure-mgmt-{0} client version is {1}. The expected version is {2}. Try "
                                  "`pip install ansible[azure]`".format(client_name, client_version, expected_version))
 
+    def get_azure_sdk(self, name):
+        '''
+        Import an Azure SDK class or module on first use. Fails the module the same way a missing
+        HAS_AZURE dependency does when the package is not installed.
+
+        :param name: key of the SDK object in AZURE_SDK_IMPORTS
+        :return: the imported class or module
+        '''
+        try:
+            return import_azure_sdk(name)
+        except ImportError:
+            self.fail(msg=missing_required_lib('ansible[azure] (azure >= {0})'.format(AZURE_MIN_RELEASE)),
+                      exception=traceback.format_exc())
+
     def exec_module(self, **kwargs):
         self.fail("Error: {0} failed to implement exec_module method.".format(self.__class__.__name__))
 
@@ -504,7 +830,26 @@ class AzureRMModuleBase(object):
         :param kwargs: Any key=value pairs
         :return: None
         '''
-        self.module.fail_json(msg=msg, **kwargs)
+        self.module.fail_json(msg=msg, **self.add_perf_summary(kwargs))
+
+    def add_perf_summary(self, result):
+        '''
+        Add the request statistics recorded when perf_instrumentation or perf_log_path is set to a module result.
+
+        :param result: dict passed to exit_json or fail_json
+        :return: result, with an _azure_perf key when perf_instrumentation is set
+        '''
+        perf_policy = getattr(self, '_perf_policy', None)
+        if not perf_policy:
+            return result
+        if self.module.params.get('perf_log_path'):
+            try:
+                perf_policy.write(self.module.params['perf_log_path'], module=self.module._name)
+            except (IOError, OSError) as exc:
+                self.module.warn("Failed to write request statistics to {0}: {1}".format(self.module.params['perf_log_path'], exc))
+        if self.module.params.get('perf_instrumentation'):
+            result = dict(result, _azure_perf=perf_policy.summary())
+        return result
 
     def deprecate(self, msg, version=None, collection_name='azure.azcollection'):
         self.module.deprecate(msg, version, collection_name=collection_name)
@@ -610,15 +955,18 @@ class AzureRMModuleBase(object):
         resource_dict['subscription_id'] = resource_dict.get('subscription_id', self.subscription_id)
         return resource_dict
 
-    def serialize_obj(self, obj, class_name, enum_modules=None):
+    def serialize_obj(self, obj, class_name, enum_modules=None, fields=None):
         '''
         Return a JSON representation of an Azure object.
 
         :param obj: Azure object
         :param class_name: Name of the object's class
         :param enum_modules: List of module names to build enum dependencies from.
+        :param fields: Only serialize these fields, see project_model
         :return: serialized result
         '''
+        if fields:
+            return project_model(obj, fields)
         return obj.as_dict()
 
     def get_poller_result(self, poller, wait=5):
@@ -638,30 +986,107 @@ class AzureRMModuleBase(object):
             self.log(str(exc))
             raise
 
-    def get_multiple_pollers_results(self, pollers, wait=0.05):
+    def get_multiple_pollers_results(self, pollers, wait=0.05, timeout=None, fail_fast=False):
         '''
         Consistent method of waiting on and retrieving results from multiple Azure's long poller
 
         :param pollers list of Azure poller object
-        :param wait Period of time to wait for the long running operation to complete.
+        :param wait Kept for backward compatibility, the pollers are waited on concurrently.
+        :param timeout Maximum number of seconds to wait for all operations, None waits forever.
+        :param fail_fast Raise the first operation error immediately instead of after all operations finished.
         :return list of object resulting from the original request
         '''
-
-        def _continue_polling():
-            return not all(poller.done() for poller in pollers)
-
+        self.log("Waiting for {0} long running operations".format(len(pollers)))
         try:
-            while _continue_polling():
-                for poller in pollers:
-                    if poller.done():
-                        continue
-                    self.log("Waiting for {0} sec".format(wait))
-                    poller.wait(timeout=wait)
-            return [poller.result() for poller in pollers]
+            return AzureRMPollerGroup(pollers, timeout=timeout, fail_fast=fail_fast).results()
         except Exception as exc:
             self.log(str(exc))
             raise
 
+    def run_concurrently(self, function, items, max_workers=None, error_msg="Error processing {0} - {1}"):
+        '''
+        Call function on each of items from a pool of threads, for the lookups info modules make per listed resource.
+
+        Calls must not fail the module themselves, fail_json is not meant to be called from several threads. Once all
+        of them finished, the module fails from the main thread with the first item, in the order of items, whose call
+        raised an exception.
+
+        :param function: callable taking one item
+        :param items: iterable of items
+        :param max_workers: maximum number of concurrent calls, defaults to the http_pool_maxsize option so that
+                            every call has a pooled connection
+        :param error_msg: message the module fails with, formatted with the item and the exception its call raised,
+                          eg. "Error getting virtual machine {0.name} - {1}"
+        :return: list of the results of function, in the order of items
+        '''
+        items = list(items)
+        max_workers = min(max_workers or self.module.params.get('http_pool_maxsize') or 10, len(items))
+        if max_workers <= 1:
+            results = []
+            for item in items:
+                try:
+                    results.append(function(item))
+                except Exception as exc:
+                    self.fail(error_msg.format(item, str(exc)))
+            return results
+
+        self.log("Running {0} calls on {1} threads".format(len(items), max_workers))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(function, item) for item in items]
+        for item, future in zip(items, futures):
+            if future.exception() is not None:
+                self.fail(error_msg.format(item, str(future.exception())))
+        return [future.result() for future in futures]
+
+    def wait_until(self, condition, timeout=None, initial_delay=1, max_delay=30, fast_attempts=3, backoff=2, jitter=0.2):
+        '''
+        Call condition until it returns a truthy value, for operations that have no poller such as waiting for a
+        deleted resource to disappear.
+
+        The first fast_attempts checks are initial_delay seconds apart, then the delay is multiplied by backoff up
+        to max_delay. Every delay is randomized by +/- jitter so that parallel tasks do not poll in lockstep. When
+        condition raises an error whose response carries a Retry-After header (throttling, service busy), the
+        check is retried after the delay the service asked for.
+
+        :param condition: callable without arguments
+        :param timeout: maximum number of seconds to wait, None waits until condition is met
+        :param initial_delay: seconds between the first checks
+        :param max_delay: ceiling of the delay between two checks
+        :param fast_attempts: number of checks made initial_delay apart before backing off
+        :param backoff: factor applied to the delay after each further check
+        :param jitter: fraction of the delay added or removed at random
+        :return: the value returned by condition; falsy when timeout was reached first
+        '''
+        deadline = time() + timeout if timeout is not None else None
+        delay = initial_delay
+        attempt = 0
+        while True:
+            result = None
+            retry_after = None
+            try:
+                result = condition()
+            except Exception as exc:
+                retry_after = get_retry_after(exc)
+                if retry_after is None:
+                    raise
+            if result:
+                return result
+
+            attempt += 1
+            if retry_after is not None:
+                wait = retry_after
+            else:
+                wait = delay * random.uniform(1 - jitter, 1 + jitter)
+                if attempt >= fast_attempts:
+                    delay = min(delay * backoff, max_delay)
+            if deadline is not None:
+                remaining = deadline - time()
+                if remaining <= 0:
+                    return result
+                wait = min(wait, remaining)
+            self.log("Waiting for {0:.1f} sec".format(wait))
+            sleep(wait)
+
     def check_provisioning_state(self, azure_object, requested_state='present'):
         '''
         Check an Azure object's provisioning state. If something did not complete the provisioning
@@ -708,7 +1133,8 @@ class AzureRMModuleBase(object):
                   and self.azure_auth.credentials.get('secret')):
                 credential = client_secret.ClientSecretCredential(tenant_id=self.azure_auth.credentials.get('tenant'),
                                                                   client_id=self.azure_auth.credentials.get('client_id'),
-                                                                  client_secret=self.azure_auth.credentials.get('secret'))
+                                                                  client_secret=self.azure_auth.credentials.get('secret'),
+                                                                  cache_persistence_options=self.azure_auth._cache_persistence_options)
             else:
                 account_keys = self.storage_client.storage_accounts.list_keys(resource_group_name=resource_group_name, account_name=storage_account_name)
                 credential = account_keys.keys[0].value
@@ -717,7 +1143,7 @@ class AzureRMModuleBase(object):
 
         try:
             self.log("Create blob service client")
-            return BlobServiceClient(
+            return self.get_azure_sdk('BlobServiceClient')(
                 account_url=account.primary_endpoints.blob,
                 credential=credential,
             )
@@ -894,13 +1320,71 @@ class AzureRMModuleBase(object):
     #    return client
 
     def get_msgraph_client(self):
-        return GraphServiceClient(self.azure_auth.azure_credential_track2)
+        return self.get_azure_sdk('GraphServiceClient')(self.azure_auth.azure_credential_track2)
+
+    def get_client_argspec(self, client_type):
+        '''
+        Return the constructor signature of a client class, checking the installed package version the first time.
+
+        :param client_type: management client class
+        :return: inspect.Signature of client_type.__init__
+        '''
+        if client_type not in _CLIENT_ARGSPEC_CACHE:
+            self.check_client_version(client_type)
+            _CLIENT_ARGSPEC_CACHE[client_type] = inspect.signature(client_type.__init__)
+        return _CLIENT_ARGSPEC_CACHE[client_type]
+
+    def get_shared_transport(self, base_url):
+        '''
+        Return a transport sending requests through the session shared by all clients using the same
+        credential and base_url, so they reuse the same pooled connections.
+
+        Each client gets its own transport object that does not own the session: closing one client
+        leaves the session open for the others.
+
+        :param base_url: endpoint of the client
+        :return: RequestsTransport
+        '''
+        key = (id(self.azure_auth.azure_credential_track2), base_url)
+        session = _SHARED_SESSIONS.get(key)
+        if session is None:
+            session = create_http_session(pool_maxsize=self.module.params.get('http_pool_maxsize') or 10,
+                                          keep_alive=self.module.params.get('http_keep_alive') is not False)
+            _SHARED_SESSIONS[key] = session
+        return RequestsTransport(session=session, session_owner=False,
+                                 connection_verify=self.azure_auth._cert_validation_mode != 'ignore')
+
+    def get_rate_limit_policy(self):
+        '''
+        Return the pipeline policy pacing requests on the ARM rate limit headers, shared by all clients of the task.
+
+        :return: ARMRateLimitPolicy
+        '''
+        if not self._rate_limit_policy:
+            self._rate_limit_policy = ARMRateLimitPolicy(state_file=self.module.params.get('rate_limit_state_file'))
+        return self._rate_limit_policy
+
+    def get_custom_hook_policy(self):
+        '''
+        Return the policy to install in the custom hook slot of the client pipelines, if any.
+
+        :return: sans-I/O policy or None
+        '''
+        if not self._custom_hook_policy:
+            policies = []
+            if self.module.params.get('rate_limit_governor'):
+                policies.append(self.get_rate_limit_policy())
+            if self._perf_policy:
+                policies.append(self._perf_policy)
+            if len(policies) > 1:
+                self._custom_hook_policy = AzureRMHookPolicyChain(policies)
+            elif policies:
+                self._custom_hook_policy = policies[0]
+        return self._custom_hook_policy
 
     def get_mgmt_svc_client(self, client_type, base_url=None, api_version=None, suppress_subscription_id=False):
         self.log('Getting management service client {0}'.format(client_type.__name__))
-        self.check_client_version(client_type)
-
-        client_argspec = inspect.signature(client_type.__init__)
+        client_argspec = self.get_client_argspec(client_type)
 
         if not base_url:
             # most things are resource_manager, don't make everyone specify
@@ -943,6 +1427,21 @@ class AzureRMModuleBase(object):
                     # remove profile; only pass API version if specified
                     client_kwargs.pop('profile')
 
+        custom_hook_policy = self.get_custom_hook_policy()
+        cache_key = (client_type, id(client_kwargs['credential']), client_kwargs.get('subscription_id'), base_url,
+                     client_kwargs.get('api_version'), json.dumps(client_kwargs.get('profile'), sort_keys=True, default=str),
+                     id(custom_hook_policy))
+        if cache_key in _MGMT_CLIENT_CACHE:
+            return _MGMT_CLIENT_CACHE[cache_key]
+
+        # clients taking **kwargs hand them to their configuration and pipeline client, which accept a transport
+        # and a policy to run around each attempt of a request
+        if 'transport' in client_argspec.parameters or \
+                any(param.kind == param.VAR_KEYWORD for param in client_argspec.parameters.values()):
+            client_kwargs['transport'] = self.get_shared_transport(base_url)
+            if custom_hook_policy:
+                client_kwargs['custom_hook_policy'] = custom_hook_policy
+
         client = client_type(**client_kwargs)
 
         # FUTURE: remove this once everything exposes models directly (eg, containerinstance)
@@ -964,6 +1463,7 @@ class AzureRMModuleBase(object):
             else:
                 client.config.session_configuration_callback = self._validation_ignore_callback
 
+        _MGMT_CLIENT_CACHE[cache_key] = client
         return client
 
     def add_user_agent(self, config):
@@ -1020,33 +1520,33 @@ class AzureRMModuleBase(object):
     def storage_client(self):
         self.log('Getting storage client...')
         if not self._storage_client:
-            self._storage_client = self.get_mgmt_svc_client(StorageManagementClient,
+            self._storage_client = self.get_mgmt_svc_client(self.get_azure_sdk('StorageManagementClient'),
                                                             base_url=self._cloud_environment.endpoints.resource_manager,
                                                             api_version='2021-06-01')
         return self._storage_client
 
     @property
     def storage_models(self):
-        return StorageManagementClient.models("2021-06-01")
+        return self.get_azure_sdk('StorageManagementClient').models("2021-06-01")
 
     @property
     def authorization_client(self):
         self.log('Getting authorization client...')
         if not self._authorization_client:
-            self._authorization_client = self.get_mgmt_svc_client(AuthorizationManagementClient,
+            self._authorization_client = self.get_mgmt_svc_client(self.get_azure_sdk('AuthorizationManagementClient'),
                                                                   base_url=self._cloud_environment.endpoints.resource_manager,
                                                                   api_version='2020-04-01-preview')
         return self._authorization_client
 
     @property
     def authorization_models(self):
-        return AuthorizationManagementClient.models('2020-04-01-preview')
+        return self.get_azure_sdk('AuthorizationManagementClient').models('2020-04-01-preview')
 
     @property
     def subscription_client(self):
         self.log('Getting subscription client...')
         if not self._subscription_client:
-            self._subscription_client = self.get_mgmt_svc_client(SubscriptionClient,
+            self._subscription_client = self.get_mgmt_svc_client(self.get_azure_sdk('SubscriptionClient'),
                                                                  base_url=self._cloud_environment.endpoints.resource_manager,
                                                                  suppress_subscription_id=True,
                                                                  api_version='2019-11-01')
@@ -1054,13 +1554,13 @@ class AzureRMModuleBase(object):
 
     @property
     def subscription_models(self):
-        return SubscriptionClient.models("2019-11-01")
+        return self.get_azure_sdk('SubscriptionClient').models("2019-11-01")
 
     @property
     def management_groups_client(self):
         self.log('Getting Management Groups client...')
         if not self._management_group_client:
-            self._management_group_client = self.get_mgmt_svc_client(ManagementGroupsClient,
+            self._management_group_client = self.get_mgmt_svc_client(self.get_azure_sdk('ManagementGroupsClient'),
                                                                      base_url=self._cloud_environment.endpoints.resource_manager,
                                                                      suppress_subscription_id=True,
                                                                      api_version='2020-05-01')
@@ -1070,7 +1570,7 @@ class AzureRMModuleBase(object):
     def network_client(self):
         self.log('Getting network client')
         if not self._network_client:
-            self._network_client = self.get_mgmt_svc_client(NetworkManagementClient,
+            self._network_client = self.get_mgmt_svc_client(self.get_azure_sdk('NetworkManagementClient'),
                                                             base_url=self._cloud_environment.endpoints.resource_manager,
                                                             api_version='2021-03-01')
         return self._network_client
@@ -1078,13 +1578,13 @@ class AzureRMModuleBase(object):
     @property
     def network_models(self):
         self.log("Getting network models...")
-        return NetworkManagementClient.models("2021-03-01")
+        return self.get_azure_sdk('NetworkManagementClient').models("2021-03-01")
 
     @property
     def rm_client(self):
         self.log('Getting resource manager client')
         if not self._resource_client:
-            self._resource_client = self.get_mgmt_svc_client(ResourceManagementClient,
+            self._resource_client = self.get_mgmt_svc_client(self.get_azure_sdk('ResourceManagementClient'),
                                                              base_url=self._cloud_environment.endpoints.resource_manager,
                                                              api_version='2019-10-01')
         return self._resource_client
@@ -1092,13 +1592,13 @@ class AzureRMModuleBase(object):
     @property
     def rm_models(self):
         self.log("Getting resource manager models")
-        return ResourceManagementClient.models("2019-10-01")
+        return self.get_azure_sdk('ResourceManagementClient').models("2019-10-01")
 
     @property
     def image_client(self):
         self.log('Getting compute image client')
         if not self._image_client:
-            self._image_client = self.get_mgmt_svc_client(ComputeManagementClient,
+            self._image_client = self.get_mgmt_svc_client(self.get_azure_sdk('ComputeManagementClient'),
                                                           base_url=self._cloud_environment.endpoints.resource_manager,
                                                           api_version='2021-04-01')
         return self._image_client
@@ -1106,13 +1606,13 @@ class AzureRMModuleBase(object):
     @property
     def image_models(self):
         self.log("Getting compute image models")
-        return ComputeManagementClient.models("2021-04-01")
+        return self.get_azure_sdk('ComputeManagementClient').models("2021-04-01")
 
     @property
     def compute_client(self):
         self.log('Getting compute client')
         if not self._compute_client:
-            self._compute_client = self.get_mgmt_svc_client(ComputeManagementClient,
+            self._compute_client = self.get_mgmt_svc_client(self.get_azure_sdk('ComputeManagementClient'),
                                                             base_url=self._cloud_environment.endpoints.resource_manager,
                                                             api_version='2021-04-01')
         return self._compute_client
@@ -1120,14 +1620,14 @@ class AzureRMModuleBase(object):
     @property
     def compute_models(self):
         self.log("Getting compute models")
-        return ComputeManagementClient.models("2021-04-01")
+        return self.get_azure_sdk('ComputeManagementClient').models("2021-04-01")
 
     @property
     def diskencryptionset_client(self):
         self.log('Getting diskencryptionset client')
         base_url = self._cloud_environment.endpoints.resource_manager
         if not self._diskencryptionset_client:
-            self._diskencryptionset_client = self.get_mgmt_svc_client(ComputeManagementClient,
+            self._diskencryptionset_client = self.get_mgmt_svc_client(self.get_azure_sdk('ComputeManagementClient'),
                                                                       base_url=base_url,
                                                                       api_version='2023-01-02')
         return self._diskencryptionset_client
@@ -1135,13 +1635,13 @@ class AzureRMModuleBase(object):
     @property
     def diskencryptionset_models(self):
         self.log("Getting compute models")
-        return ComputeManagementClient.models("2023-01-02")
+        return self.get_azure_sdk('ComputeManagementClient').models("2023-01-02")
 
     @property
     def dns_client(self):
         self.log('Getting dns client')
         if not self._dns_client:
-            self._dns_client = self.get_mgmt_svc_client(DnsManagementClient,
+            self._dns_client = self.get_mgmt_svc_client(self.get_azure_sdk('DnsManagementClient'),
                                                         base_url=self._cloud_environment.endpoints.resource_manager,
                                                         api_version='2018-05-01')
         return self._dns_client
@@ -1149,27 +1649,27 @@ class AzureRMModuleBase(object):
     @property
     def dns_models(self):
         self.log("Getting dns models...")
-        return DnsManagementClient.models('2018-05-01')
+        return self.get_azure_sdk('DnsManagementClient').models('2018-05-01')
 
     @property
     def private_dns_client(self):
         self.log('Getting private dns client')
         if not self._private_dns_client:
             self._private_dns_client = self.get_mgmt_svc_client(
-                PrivateDnsManagementClient,
+                self.get_azure_sdk('PrivateDnsManagementClient'),
                 base_url=self._cloud_environment.endpoints.resource_manager)
         return self._private_dns_client
 
     @property
     def private_dns_models(self):
         self.log('Getting private dns models')
-        return PrivateDnsModels
+        return self.get_azure_sdk('PrivateDnsModels')
 
     @property
     def web_client(self):
         self.log('Getting web client')
         if not self._web_client:
-            self._web_client = self.get_mgmt_svc_client(WebSiteManagementClient,
+            self._web_client = self.get_mgmt_svc_client(self.get_azure_sdk('WebSiteManagementClient'),
                                                         base_url=self._cloud_environment.endpoints.resource_manager,
                                                         api_version='2021-03-01')
         return self._web_client
@@ -1178,7 +1678,7 @@ class AzureRMModuleBase(object):
     def containerservice_client(self):
         self.log('Getting container service client')
         if not self._containerservice_client:
-            self._containerservice_client = self.get_mgmt_svc_client(ContainerServiceClient,
+            self._containerservice_client = self.get_mgmt_svc_client(self.get_azure_sdk('ContainerServiceClient'),
                                                                      base_url=self._cloud_environment.endpoints.resource_manager,
                                                                      api_version='2019-04-01')
         return self._containerservice_client
@@ -1186,13 +1686,13 @@ class AzureRMModuleBase(object):
     @property
     def managedcluster_models(self):
         self.log("Getting container service models")
-        return ContainerServiceClient.models('2024-05-01')
+        return self.get_azure_sdk('ContainerServiceClient').models('2024-05-01')
 
     @property
     def managedcluster_client(self):
         self.log('Getting container service client')
         if not self._managedcluster_client:
-            self._managedcluster_client = self.get_mgmt_svc_client(ContainerServiceClient,
+            self._managedcluster_client = self.get_mgmt_svc_client(self.get_azure_sdk('ContainerServiceClient'),
                                                                    base_url=self._cloud_environment.endpoints.resource_manager,
                                                                    api_version='2024-05-01')
         return self._managedcluster_client
@@ -1201,7 +1701,7 @@ class AzureRMModuleBase(object):
     def sql_client(self):
         self.log('Getting SQL client')
         if not self._sql_client:
-            self._sql_client = self.get_mgmt_svc_client(SqlManagementClient,
+            self._sql_client = self.get_mgmt_svc_client(self.get_azure_sdk('SqlManagementClient'),
                                                         base_url=self._cloud_environment.endpoints.resource_manager)
         return self._sql_client
 
@@ -1209,7 +1709,7 @@ class AzureRMModuleBase(object):
     def postgresql_flexible_client(self):
         self.log('Getting PostgreSQL client')
         if not self._postgresql_flexible_client:
-            self._postgresql_flexible_client = self.get_mgmt_svc_client(PostgreSQLFlexibleManagementClient,
+            self._postgresql_flexible_client = self.get_mgmt_svc_client(self.get_azure_sdk('PostgreSQLFlexibleManagementClient'),
                                                                         base_url=self._cloud_environment.endpoints.resource_manager)
         return self._postgresql_flexible_client
 
@@ -1217,7 +1717,7 @@ class AzureRMModuleBase(object):
     def postgresql_client(self):
         self.log('Getting PostgreSQL client')
         if not self._postgresql_client:
-            self._postgresql_client = self.get_mgmt_svc_client(PostgreSQLManagementClient,
+            self._postgresql_client = self.get_mgmt_svc_client(self.get_azure_sdk('PostgreSQLManagementClient'),
                                                                base_url=self._cloud_environment.endpoints.resource_manager)
         return self._postgresql_client
 
@@ -1225,7 +1725,7 @@ class AzureRMModuleBase(object):
     def mysql_client(self):
         self.log('Getting MySQL client')
         if not self._mysql_client:
-            self._mysql_client = self.get_mgmt_svc_client(MySQLManagementClient,
+            self._mysql_client = self.get_mgmt_svc_client(self.get_azure_sdk('MySQLManagementClient'),
                                                           base_url=self._cloud_environment.endpoints.resource_manager)
         return self._mysql_client
 
@@ -1233,7 +1733,7 @@ class AzureRMModuleBase(object):
     def mariadb_client(self):
         self.log('Getting MariaDB client')
         if not self._mariadb_client:
-            self._mariadb_client = self.get_mgmt_svc_client(MariaDBManagementClient,
+            self._mariadb_client = self.get_mgmt_svc_client(self.get_azure_sdk('MariaDBManagementClient'),
                                                             base_url=self._cloud_environment.endpoints.resource_manager)
         return self._mariadb_client
 
@@ -1241,7 +1741,7 @@ class AzureRMModuleBase(object):
     def containerregistry_client(self):
         self.log('Getting container registry mgmt client')
         if not self._containerregistry_client:
-            self._containerregistry_client = self.get_mgmt_svc_client(ContainerRegistryManagementClient,
+            self._containerregistry_client = self.get_mgmt_svc_client(self.get_azure_sdk('ContainerRegistryManagementClient'),
                                                                       base_url=self._cloud_environment.endpoints.resource_manager,
                                                                       api_version='2021-09-01')
 
@@ -1251,7 +1751,7 @@ class AzureRMModuleBase(object):
     def containerinstance_client(self):
         self.log('Getting container instance mgmt client')
         if not self._containerinstance_client:
-            self._containerinstance_client = self.get_mgmt_svc_client(ContainerInstanceManagementClient,
+            self._containerinstance_client = self.get_mgmt_svc_client(self.get_azure_sdk('ContainerInstanceManagementClient'),
                                                                       base_url=self._cloud_environment.endpoints.resource_manager,
                                                                       api_version='2018-06-01')
 
@@ -1261,7 +1761,7 @@ class AzureRMModuleBase(object):
     def marketplace_client(self):
         self.log('Getting marketplace agreement client')
         if not self._marketplace_client:
-            self._marketplace_client = self.get_mgmt_svc_client(MarketplaceOrderingAgreements,
+            self._marketplace_client = self.get_mgmt_svc_client(self.get_azure_sdk('MarketplaceOrderingAgreements'),
                                                                 base_url=self._cloud_environment.endpoints.resource_manager)
         return self._marketplace_client
 
@@ -1269,7 +1769,7 @@ class AzureRMModuleBase(object):
     def traffic_manager_management_client(self):
         self.log('Getting traffic manager client')
         if not self._traffic_manager_management_client:
-            self._traffic_manager_management_client = self.get_mgmt_svc_client(TrafficManagerManagementClient,
+            self._traffic_manager_management_client = self.get_mgmt_svc_client(self.get_azure_sdk('TrafficManagerManagementClient'),
                                                                                base_url=self._cloud_environment.endpoints.resource_manager)
         return self._traffic_manager_management_client
 
@@ -1277,7 +1777,7 @@ class AzureRMModuleBase(object):
     def monitor_autoscale_settings_client(self):
         self.log('Getting monitor client for autoscale_settings')
         if not self._monitor_autoscale_settings_client:
-            self._monitor_autoscale_settings_client = self.get_mgmt_svc_client(MonitorManagementClient,
+            self._monitor_autoscale_settings_client = self.get_mgmt_svc_client(self.get_azure_sdk('MonitorManagementClient'),
                                                                                base_url=self._cloud_environment.endpoints.resource_manager,
                                                                                api_version="2015-04-01")
         return self._monitor_autoscale_settings_client
@@ -1286,7 +1786,7 @@ class AzureRMModuleBase(object):
     def monitor_log_profiles_client(self):
         self.log('Getting monitor client for log_profiles')
         if not self._monitor_log_profiles_client:
-            self._monitor_log_profiles_client = self.get_mgmt_svc_client(MonitorManagementClient,
+            self._monitor_log_profiles_client = self.get_mgmt_svc_client(self.get_azure_sdk('MonitorManagementClient'),
                                                                          base_url=self._cloud_environment.endpoints.resource_manager,
                                                                          api_version="2016-03-01")
         return self._monitor_log_profiles_client
@@ -1295,7 +1795,7 @@ class AzureRMModuleBase(object):
     def monitor_diagnostic_settings_client(self):
         self.log('Getting monitor client for diagnostic_settings')
         if not self._monitor_diagnostic_settings_client:
-            self._monitor_diagnostic_settings_client = self.get_mgmt_svc_client(MonitorManagementClient,
+            self._monitor_diagnostic_settings_client = self.get_mgmt_svc_client(self.get_azure_sdk('MonitorManagementClient'),
                                                                                 base_url=self._cloud_environment.endpoints.resource_manager,
                                                                                 api_version="2021-05-01-preview")
         return self._monitor_diagnostic_settings_client
@@ -1304,58 +1804,58 @@ class AzureRMModuleBase(object):
     def log_analytics_client(self):
         self.log('Getting log analytics client')
         if not self._log_analytics_client:
-            self._log_analytics_client = self.get_mgmt_svc_client(LogAnalyticsManagementClient,
+            self._log_analytics_client = self.get_mgmt_svc_client(self.get_azure_sdk('LogAnalyticsManagementClient'),
                                                                   base_url=self._cloud_environment.endpoints.resource_manager)
         return self._log_analytics_client
 
     @property
     def log_analytics_models(self):
         self.log('Getting log analytics models')
-        return LogAnalyticsModels
+        return self.get_azure_sdk('LogAnalyticsModels')
 
     @property
     def servicebus_client(self):
         self.log('Getting servicebus client')
         if not self._servicebus_client:
-            self._servicebus_client = self.get_mgmt_svc_client(ServiceBusManagementClient,
+            self._servicebus_client = self.get_mgmt_svc_client(self.get_azure_sdk('ServiceBusManagementClient'),
                                                                api_version="2021-06-01-preview",
                                                                base_url=self._cloud_environment.endpoints.resource_manager)
         return self._servicebus_client
 
     @property
     def servicebus_models(self):
-        return ServiceBusManagementClient.models("2021-06-01-preview")
+        return self.get_azure_sdk('ServiceBusManagementClient').models("2021-06-01-preview")
 
     @property
     def automation_client(self):
         self.log('Getting automation client')
         if not self._automation_client:
-            self._automation_client = self.get_mgmt_svc_client(AutomationClient,
+            self._automation_client = self.get_mgmt_svc_client(self.get_azure_sdk('AutomationClient'),
                                                                base_url=self._cloud_environment.endpoints.resource_manager)
         return self._automation_client
 
     @property
     def automation_models(self):
-        return AutomationModel
+        return self.get_azure_sdk('AutomationModel')
 
     @property
     def IoThub_client(self):
         self.log('Getting iothub client')
         if not self._IoThub_client:
-            self._IoThub_client = self.get_mgmt_svc_client(IotHubClient,
+            self._IoThub_client = self.get_mgmt_svc_client(self.get_azure_sdk('IotHubClient'),
                                                            api_version='2023-06-30-preview',
                                                            base_url=self._cloud_environment.endpoints.resource_manager)
         return self._IoThub_client
 
     @property
     def IoThub_models(self):
-        return IoTHubModels
+        return self.get_azure_sdk('IoTHubModels')
 
     @property
     def lock_client(self):
         self.log('Getting lock client')
         if not self._lock_client:
-            self._lock_client = self.get_mgmt_svc_client(ManagementLockClient,
+            self._lock_client = self.get_mgmt_svc_client(self.get_azure_sdk('ManagementLockClient'),
                                                          base_url=self._cloud_environment.endpoints.resource_manager,
                                                          api_version='2016-09-01')
         return self._lock_client
@@ -1363,25 +1863,25 @@ class AzureRMModuleBase(object):
     @property
     def lock_models(self):
         self.log("Getting lock models")
-        return ManagementLockClient.models('2016-09-01')
+        return self.get_azure_sdk('ManagementLockClient').models('2016-09-01')
 
     @property
     def recovery_services_backup_client(self):
         self.log('Getting recovery services backup client')
         if not self._recovery_services_backup_client:
-            self._recovery_services_backup_client = self.get_mgmt_svc_client(RecoveryServicesBackupClient,
+            self._recovery_services_backup_client = self.get_mgmt_svc_client(self.get_azure_sdk('RecoveryServicesBackupClient'),
                                                                              base_url=self._cloud_environment.endpoints.resource_manager)
         return self._recovery_services_backup_client
 
     @property
     def recovery_services_backup_models(self):
-        return RecoveryServicesBackupModels
+        return self.get_azure_sdk('RecoveryServicesBackupModels')
 
     @property
     def search_client(self):
         self.log('Getting search client...')
         if not self._search_client:
-            self._search_client = self.get_mgmt_svc_client(SearchManagementClient,
+            self._search_client = self.get_mgmt_svc_client(self.get_azure_sdk('SearchManagementClient'),
                                                            base_url=self._cloud_environment.endpoints.resource_manager,
                                                            api_version='2020-08-01')
         return self._search_client
@@ -1391,7 +1891,7 @@ class AzureRMModuleBase(object):
         self.log('Getting notification hub client')
         if not self._notification_hub_client:
             self._notification_hub_client = self.get_mgmt_svc_client(
-                NotificationHubsManagementClient,
+                self.get_azure_sdk('NotificationHubsManagementClient'),
                 base_url=self._cloud_environment.endpoints.resource_manager,
                 api_version='2016-03-01')
         return self._notification_hub_client
@@ -1401,7 +1901,7 @@ class AzureRMModuleBase(object):
         self.log('Getting event hub client')
         if not self._event_hub_client:
             self._event_hub_client = self.get_mgmt_svc_client(
-                EventHubManagementClient,
+                self.get_azure_sdk('EventHubManagementClient'),
                 base_url=self._cloud_environment.endpoints.resource_manager,
                 api_version='2021-11-01')
         return self._event_hub_client
@@ -1410,13 +1910,13 @@ class AzureRMModuleBase(object):
     def datafactory_client(self):
         self.log('Getting datafactory client...')
         if not self._datafactory_client:
-            self._datafactory_client = self.get_mgmt_svc_client(DataFactoryManagementClient,
+            self._datafactory_client = self.get_mgmt_svc_client(self.get_azure_sdk('DataFactoryManagementClient'),
                                                                 base_url=self._cloud_environment.endpoints.resource_manager)
         return self._datafactory_client
 
     @property
     def datafactory_model(self):
-        return DataFactoryModel
+        return self.get_azure_sdk('DataFactoryModel')
 
 
 class AzureRMAuthException(Exception):
@@ -1431,7 +1931,8 @@ class AzureRMAuth(object):
                  tenant=None, ad_user=None, password=None, cloud_environment='AzureCloud', cert_validation_mode='validate',
                  api_profile='latest', adfs_authority_url=None, fail_impl=None, is_ad_resource=False,
                  x509_certificate_path=None, thumbprint=None, track1_cred=False,
-                 disable_instance_discovery=False, **kwargs):
+                 disable_instance_discovery=False, use_persistent_token_cache=False,
+                 allow_unencrypted_token_cache=False, **kwargs):
 
         if fail_impl:
             self._fail_impl = fail_impl
@@ -1455,7 +1956,9 @@ class AzureRMAuth(object):
             adfs_authority_url=adfs_authority_url,
             x509_certificate_path=x509_certificate_path,
             thumbprint=thumbprint,
-            disable_instance_discovery=disable_instance_discovery)
+            disable_instance_discovery=disable_instance_discovery,
+            use_persistent_token_cache=use_persistent_token_cache,
+            allow_unencrypted_token_cache=allow_unencrypted_token_cache)
 
         if not self.credentials:
             if HAS_AZURE_CLI_CORE:
@@ -1480,6 +1983,19 @@ class AzureRMAuth(object):
             self._get_env('disable_instance_discovery') or \
             False
 
+        # Persistent token cache: module-arg, credential profile, env, "False"
+        self._cache_persistence_options = None
+        if boolean(use_persistent_token_cache or
+                   self.credentials.get('use_persistent_token_cache') or
+                   self._get_env('use_persistent_token_cache') or
+                   False):
+            allow_unencrypted = boolean(allow_unencrypted_token_cache or
+                                        self.credentials.get('allow_unencrypted_token_cache') or
+                                        self._get_env('allow_unencrypted_token_cache') or
+                                        False)
+            self._cache_persistence_options = TokenCachePersistenceOptions(name=AZURE_TOKEN_CACHE_NAME,
+                                                                           allow_unencrypted_storage=allow_unencrypted)
+
         # if cloud_environment specified, look up/build Cloud object
         raw_cloud_env = self.credentials.get('cloud_environment')
         if self.credentials.get('credentials') is not None and raw_cloud_env is not None:
@@ -1498,9 +2014,9 @@ class AzureRMAuth(object):
                 if not urlparse.urlparse(raw_cloud_env).scheme:
                     self.fail("cloud_environment must be an endpoint discovery URL or one of {0}".format([x.name for x in all_clouds]))
                 try:
-                    self._cloud_environment = azure_cloud.get_cloud_from_metadata_endpoint(raw_cloud_env)
+                    self._cloud_environment = get_cloud_from_metadata_endpoint(raw_cloud_env)
                 except Exception as e:
-                    self.fail("cloud_environment {0} could not be resolved: {1}".format(raw_cloud_env, e.message), exception=traceback.format_exc())
+                    self.fail("cloud_environment {0} could not be resolved: {1}".format(raw_cloud_env, str(e)), exception=traceback.format_exc())
 
         if self.credentials.get('subscription_id', None) is None and self.credentials.get('credentials') is None:
             self.fail("Credentials did not include a subscription_id value.")
@@ -1528,7 +2044,8 @@ class AzureRMAuth(object):
                                                                                 client_secret=self.credentials['secret'],
                                                                                 tenant_id=self.credentials['tenant'],
                                                                                 authority=self._adfs_authority_url,
-                                                                                disable_instance_discovery=self._disable_instance_discovery)
+                                                                                disable_instance_discovery=self._disable_instance_discovery,
+                                                                                cache_persistence_options=self._cache_persistence_options)
 
         elif self.credentials.get('client_id') is not None and \
                 self.credentials.get('tenant') is not None and \
@@ -1538,7 +2055,8 @@ class AzureRMAuth(object):
                                                                              client_id=self.credentials['client_id'],
                                                                              certificate_path=self.credentials['x509_certificate_path'],
                                                                              authority=self._adfs_authority_url,
-                                                                             disable_instance_discovery=self._disable_instance_discovery)
+                                                                             disable_instance_discovery=self._disable_instance_discovery,
+                                                                             cache_persistence_options=self._cache_persistence_options)
 
         elif self.credentials.get('ad_user') is not None and \
                 self.credentials.get('password') is not None and \
@@ -1549,7 +2067,8 @@ class AzureRMAuth(object):
                                                                                     tenant_id=self.credentials.get('tenant'),
                                                                                     client_id=self.credentials.get('client_id'),
                                                                                     authority=self._adfs_authority_url,
-                                                                                    disable_instance_discovery=self._disable_instance_discovery)
+                                                                                    disable_instance_discovery=self._disable_instance_discovery,
+                                                                                    cache_persistence_options=self._cache_persistence_options)
 
         elif self.credentials.get('ad_user') is not None and self.credentials.get('password') is not None:
             client_id = self.credentials.get('client_id')
@@ -1560,7 +2079,8 @@ class AzureRMAuth(object):
                                                                                     tenant_id=self.credentials.get('tenant', 'organizations'),
                                                                                     client_id=client_id,
                                                                                     authority=self._adfs_authority_url,
-                                                                                    disable_instance_discovery=self._disable_instance_discovery)
+                                                                                    disable_instance_discovery=self._disable_instance_discovery,
+                                                                                    cache_persistence_options=self._cache_persistence_options)
 
         else:
             self.fail("Failed to authenticate with provided credentials. Some attributes were missing. "
@@ -1615,7 +2135,7 @@ class AzureRMAuth(object):
                 if not urlparse.urlparse(_cloud_environment).scheme:
                     self.fail("cloud_environment must be an endpoint discovery URL or one of {0}".format([x.name for x in all_clouds]))
                 try:
-                    cloud_environment = azure_cloud.get_cloud_from_metadata_endpoint(_cloud_environment)
+                    cloud_environment = get_cloud_from_metadata_endpoint(_cloud_environment)
                 except Exception as exc:
                     self.fail("cloud_environment {0} could not be resolved: {1}".format(_cloud_environment, str(exc)), exception=traceback.format_exc())
 
@@ -1625,7 +2145,7 @@ class AzureRMAuth(object):
         if not subscription_id:
             try:
                 # use the first subscription of the MSI
-                subscription_client = SubscriptionClient(credential)
+                subscription_client = import_azure_sdk('SubscriptionClient')(credential)
                 subscription = next(subscription_client.subscriptions.list())
                 subscription_id = str(subscription.subscription_id)
             except Exception as exc:
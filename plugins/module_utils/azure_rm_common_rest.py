@@ -5,11 +5,22 @@
 from __future__ import absolute_import, division, print_function
 __metaclass__ = type
 
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
 try:
     from ansible.module_utils.ansible_release import __version__ as ANSIBLE_VERSION
 except Exception:
     ANSIBLE_VERSION = 'unknown'
+import ansible.module_utils.six.moves.urllib.parse as urlparse
 
 try:
     from azure.core._pipeline_client import PipelineClient
@@ -19,16 +30,18 @@ try:
     from azure.mgmt.core.polling.arm_polling import ARMPolling
     import uuid
     from azure.core.configuration import Configuration
+    from azure.core.pipeline.policies import SansIOHTTPPolicy
 except ImportError:
     # This is handled in azure_rm_common
     Configuration = object
+    SansIOHTTPPolicy = object
 
 ANSIBLE_USER_AGENT = 'Ansible/{0}'.format(ANSIBLE_VERSION)
 
 
 class GenericRestClientConfiguration(Configuration):
 
-    def __init__(self, credential, subscription_id, credential_scopes=None, base_url=None):
+    def __init__(self, credential, subscription_id, credential_scopes=None, base_url=None, custom_hook_policy=None):
 
         if credential is None:
             raise ValueError("Parameter 'credentials' must not be None.")
@@ -44,13 +57,16 @@ class GenericRestClientConfiguration(Configuration):
         self.credentials = credential
         self.subscription_id = subscription_id
         self.authentication_policy = BearerTokenCredentialPolicy(credential, credential_scopes)
+        self.custom_hook_policy = custom_hook_policy
 
 
 class GenericRestClient(object):
 
-    def __init__(self, credential, subscription_id, base_url=None, credential_scopes=None):
-        self.config = GenericRestClientConfiguration(credential, subscription_id, credential_scopes[0])
-        self._client = PipelineClient(base_url, config=self.config)
+    def __init__(self, credential, subscription_id, base_url=None, credential_scopes=None, **kwargs):
+        self.config = GenericRestClientConfiguration(credential, subscription_id, credential_scopes[0],
+                                                     custom_hook_policy=kwargs.pop('custom_hook_policy', None))
+        # kwargs such as transport are handed to the pipeline client
+        self._client = PipelineClient(base_url, config=self.config, **kwargs)
         self.models = None
 
     def query(self, url, method, query_parameters, header_parameters, body, expected_status_codes, polling_timeout, polling_interval):
@@ -82,7 +98,7 @@ class GenericRestClient(object):
         response = self._client.send_request(request, **operation_config)
 
         if response.status_code not in expected_status_codes:
-            exp = SendRequestException(response.text(), response.status_code)
+            exp = SendRequestException(response.text(), response.status_code, response.headers)
             raise exp
         elif response.status_code == 202 and polling_timeout > 0:
             def get_long_running_output(response):
@@ -104,6 +120,259 @@ class GenericRestClient(object):
 
 
 class SendRequestException(Exception):
-    def __init__(self, response, status_code):
+    def __init__(self, response, status_code, headers=None):
         self.response = response
         self.status_code = status_code
+        self.headers = headers
+
+
+class ARMRateLimitPolicy(SansIOHTTPPolicy):
+    '''
+    Pipeline policy that slows requests down before Azure Resource Manager starts throttling them.
+
+    ARM reports how many reads, writes and deletes a subscription has left in the
+    x-ms-ratelimit-remaining-subscription-* response headers. Once that number falls under THRESHOLD the
+    policy delays the following requests of the same kind, more as the budget gets closer to zero, and after
+    a 429 it holds every request of that kind until the Retry-After delay has passed.
+
+    The budget is kept per process, or in state_file to share it between all the processes of a controller.
+    The state file is locked with fcntl.flock, so it is POSIX only: where fcntl is missing, state_file is ignored
+    and the budget is kept per process.
+    Every request takes one unit from the last observed budget, so processes account for each other's
+    in-flight requests until the next response brings a fresh value.
+    '''
+
+    THRESHOLD = 100
+    MAX_DELAY = 10
+    STALE_AFTER = 60
+
+    _SUBSCRIPTION_PATTERN = re.compile(r'/subscriptions/([^/?]+)', re.IGNORECASE)
+    _process_state = dict()
+    _process_lock = threading.Lock()
+
+    def __init__(self, state_file=None):
+        super(ARMRateLimitPolicy, self).__init__()
+        self.state_file = state_file if fcntl is not None else None
+
+    @staticmethod
+    def _kind(method):
+        method = method.upper()
+        if method in ('GET', 'HEAD'):
+            return 'reads'
+        if method == 'DELETE':
+            return 'deletes'
+        return 'writes'
+
+    def _key(self, http_request):
+        match = self._SUBSCRIPTION_PATTERN.search(http_request.url)
+        return '{0}:{1}'.format(match.group(1).lower() if match else '', self._kind(http_request.method))
+
+    def _update(self, callback):
+        # run callback(state) under a lock held across processes when a state file is used
+        with self._process_lock:
+            if not self.state_file:
+                return callback(self._process_state)
+            fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, 'r+') as state_file:
+                fcntl.flock(state_file, fcntl.LOCK_EX)
+                try:
+                    state = json.loads(state_file.read() or '{}')
+                except ValueError:
+                    state = dict()
+                result = callback(state)
+                state_file.seek(0)
+                state_file.truncate()
+                state_file.write(json.dumps(state))
+                return result
+
+    def on_request(self, request):
+        key = self._key(request.http_request)
+
+        def _reserve(state):
+            now = time.time()
+            entry = state.get(key)
+            if not entry:
+                return 0
+            if entry.get('blocked_until', 0) > now:
+                return entry['blocked_until'] - now
+            if now - entry['observed'] > self.STALE_AFTER:
+                return 0
+            remaining = entry['remaining']
+            entry['remaining'] = remaining - 1
+            if remaining >= self.THRESHOLD:
+                return 0
+            return self.MAX_DELAY * (1 - float(max(remaining, 0)) / self.THRESHOLD) ** 2
+
+        delay = self._update(_reserve)
+        if delay > 0:
+            time.sleep(delay)
+
+    def on_response(self, request, response):
+        key = self._key(request.http_request)
+        kind = key.rsplit(':', 1)[1]
+        headers = response.http_response.headers
+        values = [headers.get('x-ms-ratelimit-remaining-{0}-{1}'.format(scope, kind)) for scope in ('subscription', 'tenant')]
+        values = [int(value) for value in values if value and value.isdigit()]
+        throttled = response.http_response.status_code == 429
+        if not values and not throttled:
+            return
+
+        def _record(state):
+            now = time.time()
+            entry = dict(remaining=min(values) if values else 0, observed=now)
+            if throttled:
+                retry_after = headers.get('Retry-After')
+                entry['remaining'] = 0
+                entry['blocked_until'] = now + (float(retry_after) if retry_after and retry_after.isdigit() else self.MAX_DELAY)
+            state[key] = entry
+
+        self._update(_record)
+
+
+class AzureRMHookPolicyChain(SansIOHTTPPolicy):
+    '''
+    Run several sans-I/O policies in the single custom hook slot of a client pipeline.
+
+    on_request is called in the order of the policies, on_response and on_exception in reverse order.
+    '''
+
+    def __init__(self, policies):
+        super(AzureRMHookPolicyChain, self).__init__()
+        self.policies = list(policies)
+
+    def on_request(self, request):
+        for policy in self.policies:
+            policy.on_request(request)
+
+    def on_response(self, request, response):
+        for policy in reversed(self.policies):
+            policy.on_response(request, response)
+
+    def on_exception(self, request):
+        for policy in reversed(self.policies):
+            policy.on_exception(request)
+
+
+def arm_url_template(url):
+    '''
+    Replace the resource names of an Azure Resource Manager URL with placeholders, so that requests on different
+    resources of the same type are counted together, eg.
+    /subscriptions/{subscriptions}/resourceGroups/{resourceGroups}/providers/Microsoft.Compute/virtualMachines/{virtualMachines}
+
+    :param url: request URL
+    :return: path of the URL with placeholders, without the query string
+    '''
+    path = urlparse.urlparse(url).path
+    segments = [segment for segment in path.split('/') if segment]
+    template = []
+    index = 0
+    while index < len(segments):
+        key = segments[index]
+        template.append(key)
+        if key.lower() == 'providers' and index + 1 < len(segments):
+            # the provider namespace is part of the template
+            template.append(segments[index + 1])
+        elif index + 1 < len(segments):
+            template.append('{' + key + '}')
+        index += 2
+    return '/' + '/'.join(template)
+
+
+class AzureRMPerfPolicy(SansIOHTTPPolicy):
+    '''
+    Pipeline policy recording the method, URL template, status, latency, retries and size of every request.
+
+    It runs after the retry policy, so each attempt of a request is recorded and attempts after the first one are
+    counted as retries. Requests sent from the thread of a long running operation poller are counted as polls.
+    '''
+
+    _LRO_THREAD_PREFIX = 'LROPoller('
+
+    def __init__(self):
+        super(AzureRMPerfPolicy, self).__init__()
+        self.started = time.time()
+        self.calls = dict()
+        self.pollers = set()
+        self._lock = threading.Lock()
+
+    def on_request(self, request):
+        request.context['azure_rm_perf_attempt'] = request.context.get('azure_rm_perf_attempt', 0) + 1
+        request.context['azure_rm_perf_start'] = time.time()
+
+    def on_response(self, request, response):
+        http_response = response.http_response
+        received = http_response.headers.get('Content-Length')
+        if received and received.isdigit():
+            received = int(received)
+        elif not request.context.options.get('stream'):
+            try:
+                received = len(http_response.body() or b'')
+            except Exception:
+                received = 0
+        else:
+            received = 0
+        self._record(request, str(http_response.status_code), received)
+
+    def on_exception(self, request):
+        self._record(request, 'error', 0)
+
+    def _record(self, request, status, received):
+        elapsed = time.time() - request.context.get('azure_rm_perf_start', time.time())
+        http_request = request.http_request
+        body = http_request.body
+        sent = len(body) if isinstance(body, (bytes, str)) else 0
+        thread_name = threading.current_thread().name
+        poll = thread_name.startswith(self._LRO_THREAD_PREFIX)
+        key = (http_request.method, arm_url_template(http_request.url))
+        with self._lock:
+            call = self.calls.setdefault(key, dict(method=key[0], url=key[1], count=0, statuses=dict(), retries=0,
+                                                   lro_polls=0, seconds=0.0, max_seconds=0.0,
+                                                   bytes_sent=0, bytes_received=0))
+            call['count'] += 1
+            call['statuses'][status] = call['statuses'].get(status, 0) + 1
+            if request.context['azure_rm_perf_attempt'] > 1:
+                call['retries'] += 1
+            if poll:
+                call['lro_polls'] += 1
+                self.pollers.add(thread_name)
+            call['seconds'] += elapsed
+            call['max_seconds'] = max(call['max_seconds'], elapsed)
+            call['bytes_sent'] += sent
+            call['bytes_received'] += received
+
+    def summary(self):
+        '''
+        Return the totals and the per-call statistics, slowest calls first.
+
+        :return: dict
+        '''
+        with self._lock:
+            calls = [dict(call, statuses=dict(call['statuses'])) for call in self.calls.values()]
+            lro_operations = len(self.pollers)
+        calls.sort(key=lambda call: call['seconds'], reverse=True)
+        for call in calls:
+            call['seconds'] = round(call['seconds'], 3)
+            call['max_seconds'] = round(call['max_seconds'], 3)
+        return dict(elapsed_seconds=round(time.time() - self.started, 3),
+                    requests=sum(call['count'] for call in calls),
+                    retries=sum(call['retries'] for call in calls),
+                    errors=sum(count for call in calls for status, count in call['statuses'].items()
+                               if status == 'error' or int(status) >= 400),
+                    lro_operations=lro_operations,
+                    lro_polls=sum(call['lro_polls'] for call in calls),
+                    request_seconds=round(sum(call['seconds'] for call in calls), 3),
+                    bytes_sent=sum(call['bytes_sent'] for call in calls),
+                    bytes_received=sum(call['bytes_received'] for call in calls),
+                    calls=calls)
+
+    def write(self, path, **kwargs):
+        '''
+        Append the summary as one JSON line to path, along with kwargs such as the module name.
+
+        :param path: JSONL file
+        '''
+        record = dict(kwargs, timestamp=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), **self.summary())
+        with open(path, 'a') as perf_file:
+            if fcntl is not None:
+                fcntl.flock(perf_file, fcntl.LOCK_EX)
+            perf_file.write(json.dumps(record, sort_keys=True) + '\n')
@@ -342,7 +342,6 @@ id:
            ry1283/images/myImage/versions/10.1.3"
 '''
 
-import time
 import json
 from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common_ext import AzureRMModuleBaseExt
 from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common_rest import GenericRestClient
@@ -855,12 +854,15 @@ class AzureRMGalleryImageVersions(AzureRMModuleBaseExt):
         else:
             self.fail("Create or Updating fail, no match message return, return info as {0}".format(response))
 
-        i = 0
-        while response['properties']['provisioningState'] == 'Creating':
-            time.sleep(60)
-            response = self.get_resource()
-            i = i + 1
-            if i == 10:
+        def _created():
+            current = self.get_resource()
+            if current and current['properties']['provisioningState'] != 'Creating':
+                return current
+            return None
+
+        if response['properties']['provisioningState'] == 'Creating':
+            response = self.wait_until(_created, timeout=600, initial_delay=5, max_delay=60)
+            if not response:
                 self.fail("Create or Updating encountered an exception, wait 10 minutes when the status is still 'creating'")
 
         return response
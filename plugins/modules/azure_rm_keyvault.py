@@ -214,7 +214,6 @@ id:
     sample: id
 '''
 
-import time
 from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import AzureRMModuleBase
 
 try:
@@ -498,8 +497,7 @@ class AzureRMVaults(AzureRMModuleBase):
             self.delete_keyvault()
             # make sure instance is actually deleted, for some Azure resources, instance is hanging around
             # for some time after deletion -- this should be really fixed in Azure
-            while self.get_keyvault():
-                time.sleep(20)
+            self.wait_until(lambda: not self.get_keyvault())
         else:
             self.log("Key Vault instance unchanged")
             self.results['changed'] = False
@@ -83,6 +83,28 @@ options:
         type: dict
         required: false
         default: {}
+    filter:
+        description:
+            - OData filter of the listed items, sent as the C($filter) query parameter.
+            - Only supported by some collections, refer to the REST API of the resource type.
+        type: str
+    top:
+        description:
+            - Sent as the C($top) query parameter, the number of items per page or in total depending on the collection.
+            - Only supported by some collections, refer to the REST API of the resource type.
+        type: int
+    max_items:
+        description:
+            - Maximum number of items to return.
+            - No more pages are requested once I(max_items) items matching I(tags) were returned.
+        type: int
+    projection:
+        description:
+            - Keys to keep in each item, with dots to select the keys of nested objects, eg. C(properties.provisioningState).
+            - Each page is filtered by I(tags) and projected as it is received, so only the kept keys of the matching items are held in memory.
+            - Every key is kept when not set.
+        type: list
+        elements: str
 
 extends_documentation_fragment:
     - azure.azcollection.azure
@@ -113,6 +135,17 @@ EXAMPLES = '''
     tags:
       enviroment: dev
       department: hr
+
+- name: Get the name and provisioning state of the first 100 virtual machines of a subscription
+  azure_rm_resource_info:
+    url: "/subscriptions/{{ subscription_id }}/resources"
+    api_version: "2021-04-01"
+    filter: "resourceType eq 'Microsoft.Compute/virtualMachines'"
+    max_items: 100
+    projection:
+      - id
+      - name
+      - properties.provisioningState
 '''
 
 RETURN = '''
@@ -313,8 +346,9 @@ response:
             sample: "Microsoft.Compute/virtualMachines"
 '''
 
-from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import AzureRMModuleBase
+from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import AzureRMModuleBase, project_dict
 from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common_rest import GenericRestClient
+from ansible.module_utils.six.moves.urllib.parse import quote
 
 try:
     from azure.mgmt.core.tools import resource_id
@@ -362,7 +396,11 @@ class AzureRMResourceInfo(AzureRMModuleBase):
             api_version=dict(
                 type='str'
             ),
-            tags=dict(type='dict', default={})
+            tags=dict(type='dict', default={}),
+            filter=dict(type='str'),
+            top=dict(type='int'),
+            max_items=dict(type='int'),
+            projection=dict(type='list', elements='str')
         )
         # store the results of the module operation
         self.results = dict(
@@ -376,6 +414,10 @@ class AzureRMResourceInfo(AzureRMModuleBase):
         self.resource_type = None
         self.resource_name = None
         self.subresource = []
+        self.filter = None
+        self.top = None
+        self.max_items = None
+        self.projection = None
         super(AzureRMResourceInfo, self).__init__(self.module_arg_spec, supports_check_mode=True, supports_tags=False)
 
     def exec_module(self, **kwargs):
@@ -444,33 +486,41 @@ class AzureRMResourceInfo(AzureRMModuleBase):
 
         query_parameters = {}
         query_parameters['api-version'] = self.api_version
+        if self.filter:
+            # the query parameters are sent as they are, OData filters hold spaces and quotes and may hold + or &
+            query_parameters['$filter'] = quote(self.filter, safe="'/")
+        if self.top:
+            query_parameters['$top'] = self.top
 
         header_parameters = {}
         header_parameters['Content-Type'] = 'application/json; charset=utf-8'
-        skiptoken = None
+        url = self.url
 
-        while True:
-            if skiptoken:
-                query_parameters['skiptoken'] = skiptoken
-            response = self.mgmt_client.query(self.url, self.method, query_parameters, header_parameters, None, [200, 404], 0, 0)
+        while url:
+            response = self.mgmt_client.query(url, self.method, query_parameters, header_parameters, None, [200, 404], 0, 0)
+            url = None
             try:
                 response = json.loads(response.body())
+                items = []
                 if isinstance(response, dict):
-                    if response.get('value'):
-                        self.results['response'] = self.results['response'] + response['value']
-                        skiptoken = response.get('nextLink')
+                    if response.get('value') or (isinstance(response.get('value'), list) and response.get('nextLink')):
+                        items = response['value']
+                        # the next link holds the query parameters of the next page, which take precedence over query_parameters
+                        url = response.get('nextLink')
                     else:
-                        self.results['response'] = self.results['response'] + [response]
+                        items = [response]
             except Exception as e:
                 self.fail('Failed to parse response: ' + str(e))
-            if not skiptoken:
+            # filter and project each page as it is received rather than the whole response
+            if kwargs['tags']:
+                items = [item for item in items
+                         if all((item.get('tags') or {}).get(tag_key) == tag_value for tag_key, tag_value in kwargs['tags'].items())]
+            if self.projection:
+                items = [project_dict(item, self.projection) for item in items]
+            self.results['response'].extend(items)
+            if self.max_items is not None and len(self.results['response']) >= self.max_items:
+                del self.results['response'][self.max_items:]
                 break
-        if kwargs['tags']:
-            filtered_response = []
-            for resource in self.results['response']:
-                if all(resource.get('tags', {}).get(tag_key) == tag_value for tag_key, tag_value in kwargs['tags'].items()):
-                    filtered_response.append(resource)
-            self.results['response'] = filtered_response
         return self.results
 
 
@@ -240,7 +240,6 @@ status:
     sample: Online
 '''
 
-import time
 from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import AzureRMModuleBase, format_resource_id
 
 try:
@@ -509,8 +508,7 @@ class AzureRMSqlDatabase(AzureRMModuleBase):
             self.delete_sqldatabase()
             # make sure instance is actually deleted, for some Azure resources, instance is hanging around
             # for some time after deletion -- this should be really fixed in Azure
-            while self.get_sqldatabase():
-                time.sleep(20)
+            self.wait_until(lambda: not self.get_sqldatabase())
         else:
             self.log("SQL Database instance unchanged")
             self.results['changed'] = False
@@ -52,6 +52,21 @@ options:
             - Show the Geo Replication Stats for each storage account.
             - Using this option on an account that does not support georeplication will cause a delay in getting results.
         type: bool
+    include:
+        description:
+            - Details to look up for each storage account, on top of the properties returned by the account list.
+            - C(connection_string), C(blob_cors) and C(georeplication_stats) are the same as setting I(show_connection_string),
+              I(show_blob_cors) and I(show_georeplication_stats) to C(true).
+            - C(static_website) reads the static website configuration from the blob service of each account that can host one.
+            - Defaults to C(static_website). Set to an empty list to only return the account properties, without any request per account.
+            - The accounts are looked up concurrently, on at most I(http_pool_maxsize) threads.
+        type: list
+        elements: str
+        choices:
+            - connection_string
+            - blob_cors
+            - georeplication_stats
+            - static_website
 
 extends_documentation_fragment:
     - azure.azcollection.azure
@@ -77,6 +92,11 @@ EXAMPLES = '''
     tags:
       - testing
       - foo:bar
+
+- name: Get the connection strings of all accounts, without their static website configuration
+  azure_rm_storageaccount_info:
+    include:
+      - connection_string
 '''
 
 RETURN = '''
@@ -543,6 +563,7 @@ storageaccounts:
         static_website:
             description:
                 - Static website configuration for the storage account.
+                - Not enabled when I(include) does not contain C(static_website).
             returned: always
             version_added: "1.13.0"
             type: complex
@@ -584,7 +605,8 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
             tags=dict(type='list', elements='str'),
             show_connection_string=dict(type='bool'),
             show_blob_cors=dict(type='bool'),
-            show_georeplication_stats=dict(type='bool')
+            show_georeplication_stats=dict(type='bool'),
+            include=dict(type='list', elements='str', choices=['connection_string', 'blob_cors', 'georeplication_stats', 'static_website'])
         )
 
         self.results = dict(
@@ -598,6 +620,8 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
         self.show_connection_string = None
         self.show_blob_cors = None
         self.show_georeplication_stats = None
+        self.include = None
+        self.show_static_website = None
 
         super(AzureRMStorageAccountInfo, self).__init__(self.module_arg_spec,
                                                         supports_check_mode=True,
@@ -615,6 +639,12 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
         if self.name and not self.resource_group:
             self.fail("Parameter error: resource group required when filtering by name.")
 
+        include = set(['static_website'] if self.include is None else self.include)
+        self.show_connection_string = self.show_connection_string or 'connection_string' in include
+        self.show_blob_cors = self.show_blob_cors or 'blob_cors' in include
+        self.show_georeplication_stats = self.show_georeplication_stats or 'georeplication_stats' in include
+        self.show_static_website = 'static_website' in include
+
         results = []
         if self.name:
             results = self.get_account()
@@ -625,12 +655,12 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
 
         filtered = self.filter_tag(results)
 
+        self.results['storageaccounts'] = self.format_to_dict(filtered)
         if is_old_facts:
             self.results['ansible_facts'] = {
                 'azure_storageaccounts': self.serialize(filtered),
-                'storageaccounts': self.format_to_dict(filtered),
+                'storageaccounts': self.results['storageaccounts'],
             }
-        self.results['storageaccounts'] = self.format_to_dict(filtered)
         return self.results
 
     def get_account(self):
@@ -680,7 +710,10 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
         return [self.serialize_obj(item, AZURE_OBJECT_CLASS) for item in raw]
 
     def format_to_dict(self, raw):
-        return [self.account_obj_to_dict(item) for item in raw]
+        if self.show_static_website:
+            # import the data plane SDK before the threads need it
+            self.get_azure_sdk('BlobServiceClient')
+        return self.run_concurrently(self.account_obj_to_dict, raw)
 
     def account_obj_to_dict(self, account_obj):
         account_dict = dict(
@@ -784,7 +817,7 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
                 exposed_headers=to_native(x.exposed_headers),
                 allowed_headers=to_native(x.allowed_headers)
             ) for x in blob_mgmt_props.cors.cors_rules]
-        blob_client_props = self.get_blob_client_props(account_dict['resource_group'], account_dict['name'], account_dict['kind'])
+        blob_client_props = self.get_blob_client_props(account_obj, account_key[0])
         if blob_client_props and blob_client_props['static_website']:
             static_website = blob_client_props['static_website']
             account_dict['static_website'] = dict(
@@ -837,18 +870,29 @@ class AzureRMStorageAccountInfo(AzureRMModuleBase):
             pass
         return None
 
-    def get_blob_client_props(self, resource_group, name, kind):
-        if kind == "FileStorage":
+    def get_blob_client_props(self, account_obj, key=None):
+        # only accounts with a web endpoint can host a static website, and the blob service only accepts the account key
+        # when shared key access is allowed: the account properties answer for the others without a data plane request
+        if not self.show_static_website or account_obj.kind == "FileStorage":
+            return None
+        if not account_obj.primary_endpoints or not account_obj.primary_endpoints.blob or not account_obj.primary_endpoints.web:
+            return None
+        if account_obj.allow_shared_key_access is False:
             return None
         try:
-            return self.get_blob_service_client(resource_group, name).get_service_properties()
+            if not key:
+                id_dict = self.parse_resource_to_dict(account_obj.id)
+                key = self.get_connectionstring(id_dict.get('resource_group'), account_obj.name, force=True)[0]
+            if not key:
+                return None
+            return self.get_azure_sdk('BlobServiceClient')(account_url=account_obj.primary_endpoints.blob, credential=key).get_service_properties()
         except Exception:
             pass
         return None
 
-    def get_connectionstring(self, resource_group, name):
+    def get_connectionstring(self, resource_group, name, force=False):
         keys = ['', '']
-        if not self.show_connection_string:
+        if not self.show_connection_string and not force:
             return keys
         try:
             cred = self.storage_client.storage_accounts.list_keys(resource_group, name)
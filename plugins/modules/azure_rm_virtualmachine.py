@@ -2674,7 +2674,6 @@ class AzureRMVirtualMachine(AzureRMModuleBase):
         except Exception as exc:
             self.fail("Error deleting virtual machine {0} - {1}".format(self.name, str(exc)))
 
-        # TODO: parallelize nic, vhd, and public ip deletions with begin_deleting
         # TODO: best-effort to keep deleting other linked resources if we encounter an error
         if self.remove_on_absent.intersection(set(['all', 'virtual_storage'])):
             self.log('Deleting VHDs')
@@ -2687,13 +2686,11 @@ class AzureRMVirtualMachine(AzureRMModuleBase):
 
         if self.remove_on_absent.intersection(set(['all', 'network_interfaces'])):
             self.log('Deleting network interfaces')
-            for nic_dict in nic_names:
-                self.delete_nic(nic_dict['resource_group'], nic_dict['name'])
+            self.delete_nics(nic_names)
 
         if self.remove_on_absent.intersection(set(['all', 'public_ips'])):
             self.log('Deleting public IPs')
-            for pip_dict in pip_names:
-                self.delete_pip(pip_dict['resource_group'], pip_dict['name'])
+            self.delete_pips(pip_names)
 
         if 'all' in self.remove_on_absent or 'all_autocreated' in self.remove_on_absent:
             self.remove_autocreated_resources(vm.tags)
@@ -2719,6 +2716,36 @@ class AzureRMVirtualMachine(AzureRMModuleBase):
         # Delete doesn't return anything. If we get this far, assume success
         return True
 
+    def delete_nics(self, nic_names):
+        # NICs are independent of each other, delete them concurrently
+        pollers = []
+        for nic_dict in nic_names:
+            self.log("Deleting network interface {0}".format(nic_dict['name']))
+            self.results['actions'].append("Deleted network interface {0}".format(nic_dict['name']))
+            try:
+                pollers.append(self.network_client.network_interfaces.begin_delete(nic_dict['resource_group'], nic_dict['name']))
+            except Exception as exc:
+                self.fail("Error deleting network interface {0} - {1}".format(nic_dict['name'], str(exc)))
+        try:
+            self.get_multiple_pollers_results(pollers)
+        except Exception as exc:
+            self.fail("Error deleting network interfaces - {0}".format(str(exc)))
+        return True
+
+    def delete_pips(self, pip_names):
+        pollers = []
+        for pip_dict in pip_names:
+            self.results['actions'].append("Deleted public IP {0}".format(pip_dict['name']))
+            try:
+                pollers.append(self.network_client.public_ip_addresses.begin_delete(pip_dict['resource_group'], pip_dict['name']))
+            except Exception as exc:
+                self.fail("Error deleting {0} - {1}".format(pip_dict['name'], str(exc)))
+        try:
+            self.get_multiple_pollers_results(pollers)
+        except Exception as exc:
+            self.fail("Error deleting public IPs - {0}".format(str(exc)))
+        return True
+
     def delete_pip(self, resource_group, name):
         self.results['actions'].append("Deleted public IP {0}".format(name))
         try:
@@ -2739,12 +2766,16 @@ class AzureRMVirtualMachine(AzureRMModuleBase):
         return True
 
     def delete_managed_disks(self, managed_disk_ids):
+        pollers = []
         for mdi in managed_disk_ids:
             try:
-                poller = self.rm_client.resources.begin_delete_by_id(mdi, '2017-03-30')
-                self.get_poller_result(poller)
+                pollers.append(self.rm_client.resources.begin_delete_by_id(mdi, '2017-03-30'))
             except Exception as exc:
                 self.fail("Error deleting managed disk {0} - {1}".format(mdi, str(exc)))
+        try:
+            self.get_multiple_pollers_results(pollers)
+        except Exception as exc:
+            self.fail("Error deleting managed disks - {0}".format(str(exc)))
         return True
 
     def delete_storage_account(self, resource_group, name):
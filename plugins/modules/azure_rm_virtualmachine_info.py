@@ -347,6 +347,12 @@ AZURE_OBJECT_CLASS = 'VirtualMachine'
 
 AZURE_ENUM_MODULES = ['azure.mgmt.compute.models']
 
+# fields of the VirtualMachine and VirtualMachineInstanceView models read by serialize_vm
+VM_FIELDS = ['id', 'hardware_profile.vm_size', 'proximity_placement_group', 'zones', 'additional_capabilities', 'capacity_reservation',
+             'os_profile.admin_username', 'storage_profile.image_reference', 'storage_profile.os_disk', 'storage_profile.data_disks',
+             'diagnostics_profile.boot_diagnostics', 'instance_view.boot_diagnostics', 'network_profile.network_interfaces']
+INSTANCE_VIEW_FIELDS = ['statuses', 'vm_agent.vm_agent_version']
+
 
 class AzureRMVirtualMachineInfo(AzureRMModuleBase):
 
@@ -406,28 +412,31 @@ class AzureRMVirtualMachineInfo(AzureRMModuleBase):
     def list_items_by_resourcegroup(self):
         self.log('List all items')
         try:
-            items = self.compute_client.virtual_machines.list(self.resource_group)
+            items = [item for item in self.compute_client.virtual_machines.list(self.resource_group) if self.has_tags(item.tags, self.tags)]
         except ResourceNotFoundError as exc:
             self.fail("Failed to list all items - {0}".format(str(exc)))
-
-        results = []
-        for item in items:
-            if self.has_tags(item.tags, self.tags):
-                results.append(self.get_vm(self.resource_group, item.name))
-        return results
+        return self.list_items(items)
 
     def list_all_items(self):
         self.log('List all items')
         try:
-            items = self.compute_client.virtual_machines.list_all()
+            items = [item for item in self.compute_client.virtual_machines.list_all() if self.has_tags(item.tags, self.tags)]
         except ResourceNotFoundError as exc:
             self.fail("Failed to list all items - {0}".format(str(exc)))
+        return self.list_items(items)
 
-        results = []
-        for item in items:
-            if self.has_tags(item.tags, self.tags):
-                results.append(self.get_vm(parse_resource_id(item.id).get('resource_group'), item.name))
-        return results
+    def list_items(self, items):
+        '''
+        Get the listed VMs with their instance view concurrently and serialize them. The VM lists only return the
+        instance view with a $filter, or with statusOnly=true its statuses without the VM agent serialize_vm reads.
+
+        :param items: list of VirtualMachine objects
+        :return: list of serialized VMs
+        '''
+        vms = self.run_concurrently(lambda item: self.compute_client.virtual_machines.get(parse_resource_id(item.id).get('resource_group'),
+                                                                                          item.name, expand='instanceview'),
+                                    items, error_msg="Error getting virtual machine {0.name} - {1}")
+        return [self.serialize_vm(vm) for vm in vms]
 
     def get_vm(self, resource_group, name):
         '''
@@ -449,15 +458,18 @@ class AzureRMVirtualMachineInfo(AzureRMModuleBase):
         :return: dict
         '''
 
-        result = self.serialize_obj(vm, AZURE_OBJECT_CLASS, enum_modules=AZURE_ENUM_MODULES)
+        result = self.serialize_obj(vm, AZURE_OBJECT_CLASS, enum_modules=AZURE_ENUM_MODULES, fields=VM_FIELDS)
         resource_group = parse_resource_id(result['id']).get('resource_group')
         instance = None
         power_state = None
         display_status = None
 
         try:
-            instance = self.compute_client.virtual_machines.instance_view(resource_group, vm.name)
-            instance = self.serialize_obj(instance, AZURE_OBJECT_CLASS, enum_modules=AZURE_ENUM_MODULES)
+            # expanded by the get or the list of the VM
+            instance = vm.instance_view
+            if instance is None:
+                instance = self.compute_client.virtual_machines.instance_view(resource_group, vm.name)
+            instance = self.serialize_obj(instance, AZURE_OBJECT_CLASS, enum_modules=AZURE_ENUM_MODULES, fields=INSTANCE_VIEW_FIELDS)
         except Exception as exc:
             self.fail("Error getting virtual machine {0} instance view - {1}".format(vm.name, str(exc)))
 
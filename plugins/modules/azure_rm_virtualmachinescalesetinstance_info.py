@@ -121,11 +121,18 @@ from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common
 
 try:
     from azure.mgmt.compute import ComputeManagementClient
-    from azure.core.exceptions import ResourceNotFoundError
+    from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
 except ImportError:
     # This is handled in azure_rm_common
     pass
 
+# fields read by format_response, from scale set VMs and from the VMs of flexible scale sets
+VMSS_VM_FIELDS = ['id', 'tags', 'instance_id', 'latest_model_applied', 'name', 'provisioning_state', 'vm_id',
+                  'storage_profile.image_reference', 'os_profile.computer_name']
+INSTANCE_VIEW_FIELDS = ['statuses.code']
+# first API version whose VM lists accept $expand=instanceView
+LIST_API_VERSION = '2023-03-01'
+
 
 class AzureRMVirtualMachineScaleSetVMInfo(AzureRMModuleBase):
     def __init__(self):
@@ -183,7 +190,8 @@ class AzureRMVirtualMachineScaleSetVMInfo(AzureRMModuleBase):
         try:
             response = self.mgmt_client.virtual_machine_scale_set_vms.get(resource_group_name=self.resource_group,
                                                                           vm_scale_set_name=self.vmss_name,
-                                                                          instance_id=self.instance_id)
+                                                                          instance_id=self.instance_id,
+                                                                          expand='instanceView')
             self.log("Response : {0}".format(response))
         except ResourceNotFoundError as e:
             self.log('Could not get facts for Virtual Machine Scale Set VM.')
@@ -194,29 +202,71 @@ class AzureRMVirtualMachineScaleSetVMInfo(AzureRMModuleBase):
         return results
 
     def list(self):
-        items = None
+        items = []
         try:
-            items = self.mgmt_client.virtual_machine_scale_set_vms.list(resource_group_name=self.resource_group,
-                                                                        virtual_machine_scale_set_name=self.vmss_name)
+            items = list(self.mgmt_client.virtual_machine_scale_set_vms.list(resource_group_name=self.resource_group,
+                                                                             virtual_machine_scale_set_name=self.vmss_name,
+                                                                             expand='instanceView'))
             self.log("Response : {0}".format(items))
         except ResourceNotFoundError as e:
             self.log('Could not get facts for Virtual Machine ScaleSet VM.')
+        items = [item for item in items if self.has_tags(item.tags, self.tags)]
 
-        results = []
-        for item in items:
-            if self.has_tags(item.tags, self.tags):
-                results.append(self.format_response(item))
-        return results
+        # the instances of uniform scale sets come with their instance view, those of flexible scale sets are VMs
+        # listed with only their names
+        missing = [item for item in items if item.provisioning_state is not None and item.instance_view is None]
+        instance_views = self.run_concurrently(lambda item: self.mgmt_client.virtual_machine_scale_set_vms.get_instance_view(
+            resource_group_name=self.resource_group, vm_scale_set_name=self.vmss_name, instance_id=item.instance_id), missing,
+            error_msg="Getting the instance view of Virtual Machine Scale Set VM {0.instance_id} failed - {1}")
+        for item, instance_view in zip(missing, instance_views):
+            item.instance_view = instance_view
+        vms = self.list_flexible_vms([item.instance_id for item in items if item.provisioning_state is None])
+
+        return [self.format_response(item, vms.get(item.instance_id)) for item in items]
+
+    def list_flexible_vms(self, names):
+        '''
+        Get the VMs of a flexible scale set with their instance view, from one VM list filtered by scale set rather
+        than a get of each VM, and get those the list does not return concurrently.
+
+        :param names: names of the VMs
+        :return: dict of the VMs by name
+        '''
+        if not names:
+            return dict()
+        vms = dict()
+        vmss_id = '/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Compute/virtualMachineScaleSets/{2}'.format(
+            self.subscription_id, self.resource_group, self.vmss_name)
+        try:
+            client = self.get_mgmt_svc_client(ComputeManagementClient,
+                                              base_url=self._cloud_environment.endpoints.resource_manager,
+                                              api_version=LIST_API_VERSION)
+            for vm in client.virtual_machines.list(self.resource_group, filter="'virtualMachineScaleSet/id' eq '{0}'".format(vmss_id),
+                                                   expand='instanceView'):
+                if vm.instance_view is not None:
+                    vms[vm.name.lower()] = vm
+        except HttpResponseError as exc:
+            # eg. Azure Stack, whose compute API versions are older
+            self.log('Listing the VMs of the scale set failed, getting each of them - {0}'.format(str(exc)))
+
+        missing = [name for name in names if name.lower() not in vms]
+        fetched = self.run_concurrently(lambda name: self.compute_client.virtual_machines.get(self.resource_group, name, expand='instanceView'),
+                                        missing, error_msg="Getting Flexible VMSS instance instance failed, name {0} instance view - {1}")
+        vms.update(zip([name.lower() for name in missing], fetched))
+        return dict((name, vms[name.lower()]) for name in names)
 
-    def format_response(self, item):
-        d = item.as_dict()
+    def format_response(self, item, vm=None):
+        d = self.serialize_obj(item, 'VirtualMachineScaleSetVM', fields=VMSS_VM_FIELDS)
 
         instance = None
         power_state = ''
         if d.get('provisioning_state') is not None:
-            iv = self.mgmt_client.virtual_machine_scale_set_vms.get_instance_view(resource_group_name=self.resource_group,
-                                                                                  vm_scale_set_name=self.vmss_name,
-                                                                                  instance_id=d.get('instance_id', None)).as_dict()
+            iv = item.instance_view
+            if iv is None:
+                iv = self.mgmt_client.virtual_machine_scale_set_vms.get_instance_view(resource_group_name=self.resource_group,
+                                                                                      vm_scale_set_name=self.vmss_name,
+                                                                                      instance_id=d.get('instance_id', None))
+            iv = self.serialize_obj(iv, 'VirtualMachineScaleSetVMInstanceView', fields=INSTANCE_VIEW_FIELDS)
             for index in range(len(iv['statuses'])):
                 code = iv['statuses'][index]['code'].split('/')
                 if code[0] == 'PowerState':
@@ -224,8 +274,10 @@ class AzureRMVirtualMachineScaleSetVMInfo(AzureRMModuleBase):
                     break
         else:
             try:
-                instance = self.compute_client.virtual_machines.instance_view(self.resource_group, d.get('instance_id', None)).as_dict()
-                vm_instance = self.compute_client.virtual_machines.get(self.resource_group, d.get('instance_id', None)).as_dict()
+                if vm is None:
+                    vm = self.compute_client.virtual_machines.get(self.resource_group, d.get('instance_id', None), expand='instanceView')
+                instance = self.serialize_obj(vm.instance_view, 'VirtualMachineInstanceView', fields=INSTANCE_VIEW_FIELDS)
+                vm_instance = self.serialize_obj(vm, 'VirtualMachine', fields=VMSS_VM_FIELDS)
             except Exception as exc:
                 self.fail("Getting Flexible VMSS instance instance failed, name {0} instance view - {1}".format(d.get('instance_id'), str(exc)))
 
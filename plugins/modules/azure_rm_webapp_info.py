@@ -38,6 +38,21 @@ options:
             - Limit results by providing a list of tags. Format tags as 'key' or 'key:value'.
         type: list
         elements: str
+    include:
+        description:
+            - Sub-resources to look up for each web app, on top of the web app properties.
+            - C(configuration) returns I(frameworks), I(always_on), I(http20_enabled), I(ftps_state) and I(min_tls_version).
+            - C(app_settings), C(ftp_publish_url) and C(site_auth_settings) return the value of the same name.
+            - Defaults to all of them. Set to an empty list to only return the web app properties, without any request per web app.
+            - The publishing credentials are only looked up when I(return_publish_profile=true).
+            - The sub-resources of all the web apps are looked up concurrently, on at most I(http_pool_maxsize) threads.
+        type: list
+        elements: str
+        choices:
+            - configuration
+            - app_settings
+            - ftp_publish_url
+            - site_auth_settings
 
 extends_documentation_fragment:
     - azure.azcollection.azure
@@ -61,6 +76,12 @@ EXAMPLES = '''
     tags:
       - testtag
       - foo:bar
+
+- name: Get the app settings of the web apps in resource group
+  azure_rm_webapp_info:
+    resource_group: myResourceGroup
+    include:
+      - app_settings
 '''
 
 RETURN = '''
@@ -268,6 +289,10 @@ except Exception:
 
 AZURE_OBJECT_CLASS = 'WebApp'
 
+# the sub-resources of a web app looked up by get_curated_webapps, as named in the error messages
+LOOKUP_DESCRIPTIONS = dict(configuration='configuration', app_settings='app settings', ftp_publish_url='publish profile',
+                           site_auth_settings='auth settings', publish_credentials='publishing credentials')
+
 
 class AzureRMWebAppInfo(AzureRMModuleBase):
 
@@ -278,6 +303,7 @@ class AzureRMWebAppInfo(AzureRMModuleBase):
             resource_group=dict(type='str'),
             tags=dict(type='list', elements='str'),
             return_publish_profile=dict(type='bool', default=False),
+            include=dict(type='list', elements='str', choices=['configuration', 'app_settings', 'ftp_publish_url', 'site_auth_settings']),
         )
 
         self.results = dict(
@@ -289,6 +315,7 @@ class AzureRMWebAppInfo(AzureRMModuleBase):
         self.resource_group = None
         self.tags = None
         self.return_publish_profile = False
+        self.include = None
 
         self.framework_names = ['net_framework', 'java', 'php', 'node', 'python', 'dotnetcore', 'ruby']
 
@@ -325,8 +352,7 @@ class AzureRMWebAppInfo(AzureRMModuleBase):
             pass
 
         if item and self.has_tags(item.tags, self.tags):
-            curated_result = self.get_curated_webapp(self.resource_group, self.name, item)
-            result = [curated_result]
+            result = self.get_curated_webapps([(self.resource_group, self.name, item)])
 
         return result
 
@@ -338,12 +364,7 @@ class AzureRMWebAppInfo(AzureRMModuleBase):
             request_id = exc.request_id if exc.request_id else ''
             self.fail("Error listing web apps in resource groups {0}, request id: {1} - {2}".format(self.resource_group, request_id, str(exc)))
 
-        results = []
-        for item in response:
-            if self.has_tags(item.tags, self.tags):
-                curated_output = self.get_curated_webapp(self.resource_group, item.name, item)
-                results.append(curated_output)
-        return results
+        return self.get_curated_webapps([(self.resource_group, item.name, item) for item in response if self.has_tags(item.tags, self.tags)])
 
     def list_all(self):
         self.log('List web apps in current subscription')
@@ -353,48 +374,27 @@ class AzureRMWebAppInfo(AzureRMModuleBase):
             request_id = exc.request_id if exc.request_id else ''
             self.fail("Error listing web apps, request id {0} - {1}".format(request_id, str(exc)))
 
-        results = []
-        for item in response:
-            if self.has_tags(item.tags, self.tags):
-                curated_output = self.get_curated_webapp(item.resource_group, item.name, item)
-                results.append(curated_output)
-        return results
+        return self.get_curated_webapps([(item.resource_group, item.name, item) for item in response if self.has_tags(item.tags, self.tags)])
 
     def list_webapp_configuration(self, resource_group, name):
         self.log('Get web app {0} configuration'.format(name))
 
-        response = []
-
-        try:
-            response = self.web_client.web_apps.get_configuration(resource_group_name=resource_group, name=name)
-        except Exception as ex:
-            request_id = ex.request_id if ex.request_id else ''
-            self.fail('Error getting web app {0} configuration, request id {1} - {2}'.format(name, request_id, str(ex)))
+        response = self.web_client.web_apps.get_configuration(resource_group_name=resource_group, name=name)
 
         return response.as_dict()
 
     def list_webapp_appsettings(self, resource_group, name):
         self.log('Get web app {0} app settings'.format(name))
 
-        response = []
-
-        try:
-            response = self.web_client.web_apps.list_application_settings(resource_group_name=resource_group, name=name)
-        except Exception as ex:
-            request_id = ex.request_id if ex.request_id else ''
-            self.fail('Error getting web app {0} app settings, request id {1} - {2}'.format(name, request_id, str(ex)))
+        response = self.web_client.web_apps.list_application_settings(resource_group_name=resource_group, name=name)
 
         return response.as_dict()
 
     def get_publish_credentials(self, resource_group, name):
         self.log('Get web app {0} publish credentials'.format(name))
-        try:
-            poller = self.web_client.web_apps.begin_list_publishing_credentials(resource_group_name=resource_group, name=name)
-            if isinstance(poller, LROPoller):
-                response = self.get_poller_result(poller)
-        except Exception as ex:
-            request_id = ex.request_id if ex.request_id else ''
-            self.fail('Error getting web app {0} publishing credentials - {1}'.format(request_id, str(ex)))
+        poller = self.web_client.web_apps.begin_list_publishing_credentials(resource_group_name=resource_group, name=name)
+        if isinstance(poller, LROPoller):
+            response = self.get_poller_result(poller)
         return response
 
     def get_auth_settings(self, resource_group, name):
@@ -410,51 +410,60 @@ class AzureRMWebAppInfo(AzureRMModuleBase):
         self.log('Get web app {0} app publish profile'.format(name))
 
         url = None
-        try:
-            publishing_profile_options = CsmPublishingProfileOptions(
-                format="Ftp"
-            )
-            content = self.web_client.web_apps.list_publishing_profile_xml_with_secrets(resource_group_name=resource_group,
-                                                                                        name=name,
-                                                                                        publishing_profile_options=publishing_profile_options)
-            if not content:
-                return url
-
-            full_xml = ''
-            for f in content:
-                full_xml += f.decode()
-            profiles = xmltodict.parse(full_xml, xml_attribs=True)['publishData']['publishProfile']
-
-            if not profiles:
-                return url
-
-            for profile in profiles:
-                if profile['@publishMethod'] == 'FTP':
-                    url = profile['@publishUrl']
-
-        except Exception as ex:
-            self.fail('Error getting web app {0} app settings - {1}'.format(name, str(ex)))
+        publishing_profile_options = CsmPublishingProfileOptions(
+            format="Ftp"
+        )
+        content = self.web_client.web_apps.list_publishing_profile_xml_with_secrets(resource_group_name=resource_group,
+                                                                                    name=name,
+                                                                                    publishing_profile_options=publishing_profile_options)
+        if not content:
+            return url
 
-        return url
+        full_xml = ''
+        for f in content:
+            full_xml += f.decode()
+        profiles = xmltodict.parse(full_xml, xml_attribs=True)['publishData']['publishProfile']
 
-    def get_curated_webapp(self, resource_group, name, webapp):
-        pip = self.serialize_obj(webapp, AZURE_OBJECT_CLASS)
+        if not profiles:
+            return url
 
-        try:
-            site_config = self.list_webapp_configuration(resource_group, name)
-            app_settings = self.list_webapp_appsettings(resource_group, name)
-            publish_cred = self.get_publish_credentials(resource_group, name)
-            ftp_publish_url = self.get_webapp_ftp_publish_url(resource_group, name)
-            site_auth_settings = self.get_auth_settings(resource_group, name)
-        except Exception:
-            pass
-        return self.construct_curated_webapp(webapp=pip,
-                                             configuration=site_config,
-                                             app_settings=app_settings,
-                                             deployment_slot=None,
-                                             ftp_publish_url=ftp_publish_url,
-                                             publish_credentials=publish_cred,
-                                             site_auth_settings=site_auth_settings)
+        for profile in profiles:
+            if profile['@publishMethod'] == 'FTP':
+                url = profile['@publishUrl']
+
+        return url
+
+    def get_curated_webapps(self, webapps):
+        '''
+        Look up the sub-resources of webapps, a list of (resource group, name, web app) tuples, on one pool of threads
+        so that the lookups of all the web apps, not only of one web app, run concurrently. The getters raise their
+        errors, the module fails with the first one from run_concurrently.
+        '''
+        getters = dict(configuration=self.list_webapp_configuration,
+                       app_settings=self.list_webapp_appsettings,
+                       ftp_publish_url=self.get_webapp_ftp_publish_url,
+                       site_auth_settings=self.get_auth_settings)
+        include = list(getters) if self.include is None else self.include
+        if self.return_publish_profile:
+            getters['publish_credentials'] = self.get_publish_credentials
+            include = include + ['publish_credentials']
+
+        # (web app index, sub-resource, web app name, sub-resource description for the error message)
+        lookups = [(index, key, webapps[index][1], LOOKUP_DESCRIPTIONS[key]) for index in range(len(webapps)) for key in include]
+        results = self.run_concurrently(lambda lookup: getters[lookup[1]](webapps[lookup[0]][0], webapps[lookup[0]][1]), lookups,
+                                        error_msg="Error getting web app {0[2]} {0[3]} - {1}")
+        sub_resources = [dict() for webapp in webapps]
+        for (index, key, name, description), result in zip(lookups, results):
+            sub_resources[index][key] = result
+
+        return [self.construct_curated_webapp(webapp=self.serialize_obj(webapp, AZURE_OBJECT_CLASS),
+                                              configuration=sub_resources[index].get('configuration'),
+                                              app_settings=sub_resources[index].get('app_settings'),
+                                              deployment_slot=None,
+                                              ftp_publish_url=sub_resources[index].get('ftp_publish_url'),
+                                              publish_credentials=sub_resources[index].get('publish_credentials'),
+                                              site_auth_settings=sub_resources[index].get('site_auth_settings'))
+                for index, (resource_group, name, webapp) in enumerate(webapps)]
 
     def construct_curated_webapp(self,
                                  webapp,
@@ -24,6 +24,17 @@ ansible-playbook playbooks/empty_inventory_config.yml "$@"
 ansible-playbook playbooks/create_inventory_config.yml "$@"  --extra-vars "template=filter.yml"
 ansible-playbook playbooks/test_inventory_filter.yml "$@"
 
+# same host filters evaluated precompiled or per host, pushed down to the VM lists or not, with a filter failing for a host
+for precompile in true false; do
+    for pushdown in true false; do
+        for raising in false true; do
+            ansible-playbook playbooks/empty_inventory_config.yml "$@"
+            ansible-playbook playbooks/create_inventory_config.yml "$@" --extra-vars "template=filter_paths.yml precompile=${precompile} pushdown=${pushdown} raising=${raising}"
+            ansible-playbook playbooks/test_inventory_filter_paths.yml "$@"
+        done
+    done
+done
+
 
 # teardown
 ansible-playbook playbooks/teardown.yml "$@"
@@ -0,0 +1,229 @@
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import copy
+
+import pytest
+
+from ansible.module_utils.six.moves.urllib.parse import parse_qs, urlencode
+from ansible_collections.azure.azcollection.plugins.inventory import azure_rm
+from ansible_collections.azure.azcollection.plugins.inventory.azure_rm import InventoryModule
+
+SUBSCRIPTION_ID = '00000000-0000-0000-0000-000000000000'
+VM_LIST = '/subscriptions/{0}/providers/Microsoft.Compute/virtualMachines'.format(SUBSCRIPTION_ID)
+RUNNING = dict(statuses=[dict(code='ProvisioningState/succeeded'), dict(code='PowerState/running')])
+
+
+def vm(name, resource_group='rg'):
+    return dict(id='/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Compute/virtualMachines/{2}'.format(SUBSCRIPTION_ID, resource_group, name),
+                name=name, location='eastus', type='Microsoft.Compute/virtualMachines', tags=dict(),
+                properties=dict(vmId=name, networkProfile=dict(networkInterfaces=[])))
+
+
+class FakeDisplay(object):
+    def __init__(self):
+        self.warnings = []
+
+    def warning(self, msg):
+        self.warnings.append(msg)
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class FakeRequest(object):
+    def __init__(self, url):
+        self.url = url
+
+
+class FakeClient(object):
+    def get(self, url, query_parameters, header_parameters, body=None):
+        return FakeRequest(url + ('&' if '?' in url else '?') + urlencode(query_parameters))
+
+
+class FakeARM(object):
+    '''
+    Answers the VM list and instance view requests of the inventory, like ARM, the VM lists reject $expand and
+    statusOnly=true can be rejected too.
+    '''
+
+    def __init__(self, vms, reject_status_only=False):
+        self.vms = vms
+        self.reject_status_only = reject_status_only
+        self.requests = []
+
+    def __call__(self, url):
+        path, dummy, query = url.partition('?')
+        query = parse_qs(query)
+        self.requests.append((path, sorted(key for key in query if key != 'api-version')))
+        if path.endswith('/instanceView'):
+            return 200, copy.deepcopy(RUNNING)
+        if query.get('$expand') or (query.get('statusOnly') and self.reject_status_only):
+            return 400, dict(error=dict(code='InvalidParameter', message='The value of parameter $expand is invalid.'))
+        vms = copy.deepcopy(self.vms)
+        if query.get('statusOnly'):
+            for model in vms:
+                model['properties']['instanceView'] = copy.deepcopy(RUNNING)
+        return 200, dict(value=vms)
+
+
+def inventory(arm, batch=False):
+    plugin = InventoryModule()
+    plugin.display = FakeDisplay()
+    plugin._legacy_hostnames = True
+    plugin._bulk_power_state = True
+    plugin._clientconfig = type('Config', (object,), dict(subscription_id=SUBSCRIPTION_ID))()
+    plugin._batch_fetch = batch
+    plugin.new_client = FakeClient()
+    plugin.send_request = lambda url, api_version: arm(FakeClient().get(url, {'api-version': api_version}, {}).url)[1]
+
+    def send_batch(batch_requests):
+        responses = []
+        for request in batch_requests:
+            status, content = arm(request['url'])
+            responses.append(dict(name=request['name'], httpStatusCode=status, content=content))
+        return dict(responses=responses)
+    plugin._send_batch = send_batch
+    return plugin
+
+
+def power_states(plugin):
+    return dict((host.default_inventory_hostname, host._powerstate) for host in plugin._hosts)
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_bulk_power_state_lists_the_subscription_vms_with_status_only(batch):
+    arm = FakeARM([vm('vm0'), vm('vm1')])
+    plugin = inventory(arm, batch)
+
+    plugin._enqueue_vm_list()
+    plugin._process_queue()
+
+    assert power_states(plugin) == dict(vm0='running', vm1='running')
+    assert arm.requests == [(VM_LIST, ['statusOnly'])]
+    assert plugin.display.warnings == []
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_bulk_power_state_fetches_the_instance_views_of_resource_group_vms(batch):
+    arm = FakeARM([vm('vm0'), vm('vm1')])
+    plugin = inventory(arm, batch)
+
+    plugin._enqueue_vm_list('rg')
+    plugin._process_queue()
+
+    assert power_states(plugin) == dict(vm0='running', vm1='running')
+    assert arm.requests[0] == ('/subscriptions/{0}/resourceGroups/rg/providers/Microsoft.Compute/virtualMachines'.format(SUBSCRIPTION_ID), [])
+    assert len(arm.requests) == 3
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_rejected_vm_list_falls_back_to_one_instance_view_request_per_vm(batch):
+    arm = FakeARM([vm('vm0'), vm('vm1')], reject_status_only=True)
+    plugin = inventory(arm, batch)
+
+    plugin._enqueue_vm_list()
+    plugin._process_queue()
+
+    assert power_states(plugin) == dict(vm0='running', vm1='running')
+    assert arm.requests[:2] == [(VM_LIST, ['statusOnly']), (VM_LIST, [])]
+    assert len(arm.requests) == 4
+    assert len(plugin.display.warnings) == 1
+    assert 'listing them without it' in plugin.display.warnings[0]
+
+
+@pytest.mark.parametrize('batch', [False, True])
+def test_failed_vm_list_is_reported(batch):
+    arm = FakeARM([vm('vm0')])
+    plugin = inventory(arm, batch)
+    plugin._bulk_power_state = False
+
+    # a list request with parameters ARM rejects and nothing to fall back to
+    plugin._enqueue_get(url=VM_LIST + '?$expand=instanceView', api_version=plugin._compute_api_version, handler=plugin._on_vm_page_response)
+    plugin._process_queue()
+
+    assert plugin._hosts == []
+    assert plugin.display.warnings == ['Failed to list the VMs: The value of parameter $expand is invalid.']
+
+
+class FakeBatchARM(object):
+    '''
+    /batch endpoint answering with a 429 the sub-requests whose url is in throttle, the first time they are sent.
+    '''
+
+    def __init__(self, throttle=(), retry_after='7'):
+        self.throttle = set(throttle)
+        self.retry_after = retry_after
+        self.batches = []
+
+    def __call__(self, batch_requests):
+        self.batches.append([request['url'] for request in batch_requests])
+        responses = []
+        for request in batch_requests:
+            if request['url'] in self.throttle:
+                self.throttle.discard(request['url'])
+                responses.append(dict(name=request['name'], httpStatusCode=429, headers={'Retry-After': self.retry_after},
+                                      content=dict(error=dict(code='TooManyRequests'))))
+            else:
+                responses.append(dict(name=request['name'], httpStatusCode=200, content=dict(url=request['url'])))
+        return dict(responses=responses)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(azure_rm.time, 'sleep', sleeps.append)
+    return sleeps
+
+
+def batch_inventory(arm, batch_size):
+    plugin = inventory(None, batch=True)
+    plugin._send_batch = arm
+    plugin._batch_size = plugin._current_batch_size = batch_size
+    plugin._batch_backoff_factor = 0.5
+    return plugin
+
+
+def test_retry_batch_only_resends_the_failed_requests_after_retry_after(sleeps):
+    arm = FakeBatchARM(throttle=['/b'])
+    plugin = batch_inventory(arm, 10)
+
+    responses, errors, throttled = plugin.retry_batch([dict(httpMethod='GET', url=url, name=url) for url in ('/a', '/b', '/c')])
+
+    assert arm.batches == [['/a', '/b', '/c'], ['/b']]
+    # Retry-After is longer than the backoff
+    assert sleeps == [7]
+    assert sorted(responses) == ['/a', '/b', '/c']
+    assert errors == dict()
+    assert throttled
+
+
+def test_retry_batch_backs_off_without_retry_after(sleeps):
+    arm = FakeBatchARM(throttle=['/a'], retry_after='')
+    plugin = batch_inventory(arm, 10)
+
+    responses, errors, throttled = plugin.retry_batch([dict(httpMethod='GET', url='/a', name='/a')])
+
+    assert sleeps == [1.0]
+    assert sorted(responses) == ['/a']
+
+
+def test_batch_size_shrinks_when_throttled_and_recovers(sleeps):
+    urls = ['/vm{0}'.format(index) for index in range(40)]
+    sent_url = FakeClient().get(urls[0], {'api-version': '2024-03-01'}, {}).url
+    arm = FakeBatchARM(throttle=[sent_url])
+    plugin = batch_inventory(arm, 8)
+    handled = []
+    for url in urls:
+        plugin._enqueue_get(url=url, api_version='2024-03-01', handler=lambda response: handled.append(response['url']))
+
+    plugin._process_queue()
+
+    # halved after the throttled batch, then grown by a tenth of batch_size (at least one) per batch
+    assert [len(batch) for batch in arm.batches] == [8, 1, 4, 5, 6, 7, 8, 2]
+    assert arm.batches[1] == [sent_url]
+    assert plugin._current_batch_size == 8
+    # every response is handled once, in the order the requests were queued
+    assert [url.partition('?')[0] for url in handled] == urls
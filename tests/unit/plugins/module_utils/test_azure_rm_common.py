@@ -0,0 +1,295 @@
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import threading
+
+import pytest
+
+from ansible_collections.azure.azcollection.plugins.module_utils import azure_rm_common
+from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common import (AzureRMModuleBase, AzureRMPollerGroup,
+                                                                                         AzureRMPollerTimeout)
+
+
+class FakePoller(object):
+    '''
+    Long running operation poller finishing once its event is set, with result or error.
+    '''
+
+    def __init__(self, result=None, error=None, done=None):
+        self._result = result
+        self._error = error
+        self.done = done or threading.Event()
+
+    def wait(self, timeout=None):
+        self.done.wait(timeout)
+
+    def result(self):
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def finished(result=None, error=None):
+    poller = FakePoller(result, error)
+    poller.done.set()
+    return poller
+
+
+def test_poller_group_returns_results_in_the_order_of_the_pollers():
+    slow = FakePoller('slow')
+    fast = FakePoller('fast')
+    group = AzureRMPollerGroup([slow, fast])
+
+    completed = group.as_completed()
+    fast.done.set()
+    assert next(completed) == (1, 'fast')
+    slow.done.set()
+    assert next(completed) == (0, 'slow')
+
+    assert AzureRMPollerGroup([finished('a'), finished('b'), finished('c')]).results() == ['a', 'b', 'c']
+
+
+def test_poller_group_waits_on_the_pollers_concurrently():
+    # the first operation only finishes after the second one, which a sequential wait would never see
+    second_done = threading.Event()
+    first = FakePoller('first', done=second_done)
+    second = finished('second')
+    second.wait = lambda timeout=None: second_done.set()
+
+    assert AzureRMPollerGroup([first, second], timeout=5).results() == ['first', 'second']
+
+
+def test_poller_group_raises_the_first_error_after_all_operations_finished():
+    error = ValueError('operation failed')
+    ok = FakePoller('ok')
+    group = AzureRMPollerGroup([finished(error=error), ok])
+
+    completed = group.as_completed()
+    ok.done.set()
+    assert next(completed) == (1, 'ok')
+    with pytest.raises(ValueError) as excinfo:
+        next(completed)
+    assert excinfo.value is error
+
+
+def test_poller_group_fail_fast_raises_without_waiting_for_the_others():
+    error = ValueError('operation failed')
+    pending = FakePoller('pending')
+
+    with pytest.raises(ValueError):
+        AzureRMPollerGroup([pending, finished(error=error)], fail_fast=True).results()
+    pending.done.set()
+
+
+def test_poller_group_times_out():
+    pending = FakePoller('pending')
+
+    with pytest.raises(AzureRMPollerTimeout):
+        AzureRMPollerGroup([finished('done'), pending], timeout=0.1).results()
+    pending.done.set()
+
+
+class FakeModule(object):
+    '''
+    Stand-in for AzureRMModuleBase providing what the shared helpers use.
+    '''
+
+    def __init__(self):
+        self.logged = []
+
+    def log(self, msg, pretty_print=False):
+        self.logged.append(msg)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class ThrottledError(Exception):
+    def __init__(self, headers):
+        super(ThrottledError, self).__init__('throttled')
+        self.response = type('Response', (object,), {'headers': headers})()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(azure_rm_common, 'time', clock.time)
+    monkeypatch.setattr(azure_rm_common, 'sleep', clock.sleep)
+    return clock
+
+
+def wait_until(condition, **kwargs):
+    return AzureRMModuleBase.wait_until(FakeModule(), condition, **kwargs)
+
+
+def answers(*values):
+    values = list(values)
+
+    def condition():
+        value = values.pop(0)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    return condition
+
+
+def test_wait_until_returns_as_soon_as_the_condition_holds(clock):
+    assert wait_until(answers('ready')) == 'ready'
+    assert clock.sleeps == []
+
+
+def test_wait_until_backs_off_after_the_fast_attempts(clock):
+    condition = answers(*([False] * 7 + ['ready']))
+
+    assert wait_until(condition, initial_delay=1, max_delay=5, fast_attempts=3, backoff=2, jitter=0) == 'ready'
+    assert clock.sleeps == [1, 1, 1, 2, 4, 5, 5]
+
+
+def test_wait_until_randomizes_the_delay(clock, monkeypatch):
+    bounds = []
+
+    def uniform(low, high):
+        bounds.append((low, high))
+        return high
+    monkeypatch.setattr(azure_rm_common.random, 'uniform', uniform)
+
+    wait_until(answers(False, 'ready'), initial_delay=10, jitter=0.2)
+    assert bounds == [(0.8, 1.2)]
+    assert clock.sleeps == [pytest.approx(12)]
+
+
+def test_wait_until_gives_up_at_the_timeout(clock):
+    assert not wait_until(lambda: None, timeout=10, initial_delay=4, fast_attempts=10, jitter=0)
+    # the last wait is clipped to the deadline
+    assert clock.sleeps == [4, 4, 2]
+    assert clock.now == 1010
+
+
+def test_wait_until_honors_retry_after_of_a_throttled_check(clock):
+    condition = answers(ThrottledError({'Retry-After': '7'}), ThrottledError({'retry-after-ms': '1500'}), 'ready')
+
+    assert wait_until(condition, initial_delay=1, jitter=0) == 'ready'
+    assert clock.sleeps == [7, 1.5]
+
+
+def test_wait_until_raises_other_errors(clock):
+    with pytest.raises(ValueError):
+        wait_until(answers(False, ValueError('boom')), jitter=0)
+    assert clock.sleeps == [1]
+
+
+def select(data, fields):
+    # as_dict() output restricted to fields, the reference project_model must match
+    if isinstance(data, list):
+        return [select(item, fields) for item in data]
+    children = dict()
+    for field in fields:
+        name, dummy, rest = field.partition('.')
+        if name in data and children.get(name, True) is not None:
+            children[name] = children.get(name, []) + [rest] if rest else None
+    return dict((name, data[name] if rest is None else select(data[name], rest)) for name, rest in children.items())
+
+
+def virtual_machine():
+    models = pytest.importorskip('azure.mgmt.compute.v2023_03_01.models')
+    vm = models.VirtualMachine(
+        location='eastus',
+        tags={'env': 'test'},
+        hardware_profile=models.HardwareProfile(vm_size='Standard_B1s'),
+        storage_profile=models.StorageProfile(
+            os_disk=models.OSDisk(create_option='FromImage', os_type='Linux', disk_size_gb=30,
+                                  managed_disk=models.ManagedDiskParameters(storage_account_type='Premium_LRS')),
+            data_disks=[models.DataDisk(lun=0, create_option='Empty', disk_size_gb=10),
+                        models.DataDisk(lun=1, create_option='Attach', name='data1')]),
+        network_profile=models.NetworkProfile(network_interfaces=[models.NetworkInterfaceReference(id='/nic0', primary=True)]),
+    )
+    # read-only attributes only come from the service
+    vm.instance_view = models.VirtualMachineInstanceView(statuses=[models.InstanceViewStatus(code='PowerState/running')])
+    vm.id = '/subscriptions/sub/resourceGroups/rg/providers/Microsoft.Compute/virtualMachines/vm'
+    vm.name = 'vm'
+    vm.provisioning_state = 'Succeeded'
+    return vm
+
+
+def storage_account():
+    models = pytest.importorskip('azure.mgmt.storage.v2021_06_01.models')
+    account = models.StorageAccount(location='eastus', sku=models.Sku(name='Standard_LRS'), kind='StorageV2',
+                                    enable_https_traffic_only=True, minimum_tls_version='TLS1_2')
+    account.name = 'account'
+    account.primary_endpoints = models.Endpoints(blob='https://account.blob.core.windows.net/')
+    return account
+
+
+@pytest.mark.parametrize('fields', [
+    ['name', 'location', 'tags', 'provisioning_state'],
+    ['hardware_profile.vm_size', 'id'],
+    ['storage_profile.os_disk.managed_disk', 'storage_profile.data_disks.lun', 'storage_profile.data_disks.name'],
+    ['storage_profile', 'storage_profile.os_disk.os_type'],
+    ['instance_view.statuses', 'network_profile.network_interfaces.primary'],
+    ['plan', 'zones', 'hardware_profile.unknown'],
+])
+def test_project_model_matches_as_dict(fields):
+    vm = virtual_machine()
+
+    assert azure_rm_common.project_model(vm, fields) == select(vm.as_dict(), fields)
+
+
+@pytest.mark.parametrize('fields', [
+    ['name', 'kind', 'sku.name'],
+    ['primary_endpoints.blob', 'enable_https_traffic_only', 'minimum_tls_version'],
+])
+def test_project_model_matches_as_dict_for_msrest_models(fields):
+    account = storage_account()
+
+    assert azure_rm_common.project_model(account, fields) == select(account.as_dict(), fields)
+
+
+class ModuleFailed(Exception):
+    pass
+
+
+class FakeInfoModule(FakeModule):
+    def __init__(self, http_pool_maxsize=4):
+        super(FakeInfoModule, self).__init__()
+        self.module = type('AnsibleModule', (object,), dict(params=dict(http_pool_maxsize=http_pool_maxsize)))()
+        self.failures = []
+
+    def fail(self, msg, **kwargs):
+        self.failures.append((msg, threading.current_thread()))
+        raise ModuleFailed(msg)
+
+
+def lookup(item):
+    if item % 3 == 2:
+        raise ValueError('no item {0}'.format(item))
+    return item * 10
+
+
+@pytest.mark.parametrize('http_pool_maxsize', [1, 4])
+def test_run_concurrently_returns_the_results_in_the_order_of_the_items(http_pool_maxsize):
+    module = FakeInfoModule(http_pool_maxsize)
+
+    assert AzureRMModuleBase.run_concurrently(module, lambda item: item * 10, range(20)) == [item * 10 for item in range(20)]
+    assert AzureRMModuleBase.run_concurrently(module, lookup, []) == []
+
+
+@pytest.mark.parametrize('http_pool_maxsize', [1, 4])
+def test_run_concurrently_fails_once_from_the_main_thread_with_the_first_failed_item(http_pool_maxsize):
+    module = FakeInfoModule(http_pool_maxsize)
+
+    with pytest.raises(ModuleFailed):
+        AzureRMModuleBase.run_concurrently(module, lookup, [0, 1, 5, 8], error_msg="Error getting item {0} - {1}")
+
+    assert module.failures == [('Error getting item 5 - no item 5', threading.current_thread())]
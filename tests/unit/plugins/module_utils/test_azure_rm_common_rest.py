@@ -0,0 +1,156 @@
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.azure.azcollection.plugins.module_utils import azure_rm_common_rest
+from ansible_collections.azure.azcollection.plugins.module_utils.azure_rm_common_rest import ARMRateLimitPolicy
+
+SUBSCRIPTION_URL = 'https://management.azure.com/subscriptions/00000000-0000-0000-0000-000000000001/resourceGroups/rg?api-version=2021-04-01'
+
+
+class FakeHttpRequest(object):
+    def __init__(self, method='GET', url=SUBSCRIPTION_URL):
+        self.method = method
+        self.url = url
+
+
+class FakeHttpResponse(object):
+    def __init__(self, status_code=200, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakePipelineRequest(object):
+    def __init__(self, method='GET', url=SUBSCRIPTION_URL):
+        self.http_request = FakeHttpRequest(method, url)
+
+
+class FakePipelineResponse(object):
+    def __init__(self, status_code=200, headers=None):
+        self.http_response = FakeHttpResponse(status_code, headers)
+
+
+class FakeClock(object):
+    '''
+    Stands in for the time module of azure_rm_common_rest: sleep advances the clock and records the delays.
+    '''
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(azure_rm_common_rest, 'time', fake)
+    monkeypatch.setattr(ARMRateLimitPolicy, '_process_state', dict())
+    return fake
+
+
+def respond(policy, method='GET', status_code=200, headers=None, url=SUBSCRIPTION_URL):
+    policy.on_response(FakePipelineRequest(method, url), FakePipelineResponse(status_code, headers))
+
+
+def request(policy, method='GET', url=SUBSCRIPTION_URL):
+    policy.on_request(FakePipelineRequest(method, url))
+
+
+def test_remaining_headers_lowest_value_is_recorded_per_subscription_and_kind(clock):
+    policy = ARMRateLimitPolicy()
+    respond(policy, headers={'x-ms-ratelimit-remaining-subscription-reads': '250',
+                             'x-ms-ratelimit-remaining-tenant-reads': '40',
+                             'x-ms-ratelimit-remaining-subscription-writes': '5'})
+    respond(policy, method='DELETE', headers={'x-ms-ratelimit-remaining-subscription-deletes': 'not-a-number'})
+
+    assert policy._process_state == {'00000000-0000-0000-0000-000000000001:reads': dict(remaining=40, observed=clock.now)}
+
+
+def test_requests_of_other_kinds_and_subscriptions_are_not_delayed(clock):
+    policy = ARMRateLimitPolicy()
+    respond(policy, headers={'x-ms-ratelimit-remaining-subscription-reads': '0'})
+
+    request(policy, method='PUT')
+    request(policy, url='https://management.azure.com/subscriptions/00000000-0000-0000-0000-000000000002/resourceGroups')
+
+    assert clock.sleeps == []
+
+
+@pytest.mark.parametrize('remaining, delay', [
+    (ARMRateLimitPolicy.THRESHOLD + 50, 0),
+    (ARMRateLimitPolicy.THRESHOLD, 0),
+    (ARMRateLimitPolicy.THRESHOLD // 2, ARMRateLimitPolicy.MAX_DELAY / 4.0),
+    (0, ARMRateLimitPolicy.MAX_DELAY),
+])
+def test_delay_grows_quadratically_under_the_threshold(clock, remaining, delay):
+    policy = ARMRateLimitPolicy()
+    respond(policy, headers={'x-ms-ratelimit-remaining-subscription-reads': str(remaining)})
+
+    request(policy)
+
+    assert sum(clock.sleeps) == pytest.approx(delay)
+
+
+def test_each_request_takes_one_unit_from_the_budget(clock):
+    policy = ARMRateLimitPolicy()
+    respond(policy, headers={'x-ms-ratelimit-remaining-subscription-reads': str(ARMRateLimitPolicy.THRESHOLD)})
+
+    request(policy)
+    request(policy)
+
+    assert clock.sleeps == [pytest.approx(ARMRateLimitPolicy.MAX_DELAY * (1 - (ARMRateLimitPolicy.THRESHOLD - 1.0) / ARMRateLimitPolicy.THRESHOLD) ** 2)]
+    assert policy._process_state['00000000-0000-0000-0000-000000000001:reads']['remaining'] == ARMRateLimitPolicy.THRESHOLD - 2
+
+
+def test_stale_budget_is_ignored(clock):
+    policy = ARMRateLimitPolicy()
+    respond(policy, headers={'x-ms-ratelimit-remaining-subscription-reads': '0'})
+    clock.now += ARMRateLimitPolicy.STALE_AFTER + 1
+
+    request(policy)
+
+    assert clock.sleeps == []
+
+
+def test_throttled_requests_are_held_until_retry_after(clock):
+    policy = ARMRateLimitPolicy()
+    respond(policy, status_code=429, headers={'Retry-After': '7'})
+
+    clock.now += 2
+    request(policy)
+    assert clock.sleeps == [pytest.approx(5)]
+
+    request(policy, method='PUT')
+    assert clock.sleeps == [pytest.approx(5)]
+
+
+def test_throttled_requests_without_retry_after_are_held_for_the_maximum_delay(clock):
+    policy = ARMRateLimitPolicy()
+    respond(policy, status_code=429, headers={'Retry-After': 'Wed, 21 Oct 2015 07:28:00 GMT'})
+
+    request(policy)
+
+    assert clock.sleeps == [pytest.approx(ARMRateLimitPolicy.MAX_DELAY)]
+
+
+@pytest.mark.skipif(azure_rm_common_rest.fcntl is None, reason='the state file is locked with fcntl, which is POSIX only')
+def test_state_file_shares_the_budget_between_policies(clock, tmp_path):
+    state_file = str(tmp_path / 'rate_limit.json')
+    first = ARMRateLimitPolicy(state_file=state_file)
+    second = ARMRateLimitPolicy(state_file=state_file)
+    respond(first, status_code=429, headers={'Retry-After': '3'})
+
+    request(second)
+
+    assert clock.sleeps == [pytest.approx(3)]
+    assert ARMRateLimitPolicy._process_state == {}
@@ -0,0 +1,81 @@
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import absolute_import, division, print_function
+__metaclass__ = type
+
+import pytest
+
+from ansible_collections.azure.azcollection.plugins.modules.azure_rm_virtualmachine_info import AzureRMVirtualMachineInfo
+
+models = pytest.importorskip('azure.mgmt.compute.v2023_03_01.models')
+
+RESOURCE_GROUP = 'rg'
+
+
+def vm(name, instance_view=None):
+    model = models.VirtualMachine(
+        location='eastus',
+        tags={'env': 'test'},
+        hardware_profile=models.HardwareProfile(vm_size='Standard_B1s'),
+        storage_profile=models.StorageProfile(os_disk=models.OSDisk(create_option='FromImage', os_type='Linux', caching='ReadWrite'),
+                                              data_disks=[]),
+        network_profile=models.NetworkProfile(network_interfaces=[models.NetworkInterfaceReference(id='/nics/' + name + '-nic')]),
+    )
+    # read-only attributes only come from the service
+    model.id = '/subscriptions/sub/resourceGroups/{0}/providers/Microsoft.Compute/virtualMachines/{1}'.format(RESOURCE_GROUP, name)
+    model.name = name
+    model.provisioning_state = 'Succeeded'
+    model.instance_view = instance_view
+    return model
+
+
+def statuses():
+    return [models.InstanceViewStatus(code='ProvisioningState/succeeded', display_status='Provisioning succeeded'),
+            models.InstanceViewStatus(code='PowerState/running', display_status='VM running')]
+
+
+class FakeVirtualMachines(object):
+    '''
+    VM operations whose list_all answers like statusOnly=true, with the statuses only, and whose get with
+    expand=instanceview returns the whole instance view.
+    '''
+
+    def __init__(self, names):
+        self.names = names
+        self.gets = []
+
+    def list_all(self, **kwargs):
+        return [vm(name, models.VirtualMachineInstanceView(statuses=statuses())) for name in self.names]
+
+    def list(self, resource_group, **kwargs):
+        return self.list_all()
+
+    def get(self, resource_group, name, expand=None):
+        self.gets.append((resource_group, name, expand))
+        return vm(name, models.VirtualMachineInstanceView(statuses=statuses(),
+                                                          vm_agent=models.VirtualMachineAgentInstanceView(vm_agent_version='2.9.1.1')))
+
+
+class FakeModule(object):
+    params = dict(http_pool_maxsize=4)
+
+
+@pytest.fixture
+def vm_info():
+    module = AzureRMVirtualMachineInfo.__new__(AzureRMVirtualMachineInfo)
+    module.module = FakeModule()
+    module._compute_client = type('ComputeClient', (object,), dict(virtual_machines=FakeVirtualMachines(['vm0', 'vm1', 'vm2'])))()
+    module.tags = None
+    module.resource_group = RESOURCE_GROUP
+    module.log = lambda msg, pretty_print=False: None
+    return module
+
+
+@pytest.mark.parametrize('list_vms', ['list_all_items', 'list_items_by_resourcegroup'])
+def test_listed_vms_report_the_vm_agent_version(vm_info, list_vms):
+    vms = getattr(vm_info, list_vms)()
+
+    assert [item['name'] for item in vms] == ['vm0', 'vm1', 'vm2']
+    assert [item['vm_agent_version'] for item in vms] == ['2.9.1.1'] * 3
+    assert [item['power_state'] for item in vms] == ['running'] * 3
+    assert sorted(vm_info.compute_client.virtual_machines.gets) == [(RESOURCE_GROUP, name, 'instanceview') for name in ('vm0', 'vm1', 'vm2')]
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""Measure the cold import time of a collection module.
+
+Each run starts a fresh interpreter, the same way Ansible starts one per task, and imports the
+module from a temporary ``ansible_collections/azure/azcollection`` tree pointing at a checkout.
+Pass ``--collection-root`` more than once to compare checkouts, eg. before and after a change::
+
+    git worktree add /tmp/azcollection-base HEAD~1
+    python tests/utils/benchmark/import_time.py --collection-root /tmp/azcollection-base --collection-root .
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import ansible_collections.azure.azcollection.plugins.modules.{module}
+elapsed = time.perf_counter() - start
+print(json.dumps(dict(seconds=elapsed, azure_modules=len([m for m in sys.modules if m.startswith(('azure', 'msgraph'))]))))
+'''
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def measure(collection_root, module, runs):
+    workdir = tempfile.mkdtemp(prefix='azcollection-import-')
+    try:
+        namespace_dir = os.path.join(workdir, 'ansible_collections', 'azure')
+        os.makedirs(namespace_dir)
+        os.symlink(os.path.abspath(collection_root), os.path.join(namespace_dir, 'azcollection'))
+
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([workdir] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+        env['PYTHONDONTWRITEBYTECODE'] = '1'
+
+        samples = []
+        for dummy in range(runs):
+            output = subprocess.check_output([sys.executable, '-c', PROBE.format(module=module)], env=env)
+            samples.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+        return samples
+    finally:
+        shutil.rmtree(workdir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--collection-root', action='append', dest='roots',
+                        help='checkout of the collection to measure, may be repeated (default: this checkout)')
+    parser.add_argument('--module', default='azure_rm_storageaccount_info', help='module to import')
+    parser.add_argument('--runs', type=int, default=10, help='number of fresh interpreters per checkout')
+    args = parser.parse_args()
+
+    roots = args.roots or [os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..')]
+    for root in roots:
+        samples = measure(root, args.module, args.runs)
+        seconds = [s['seconds'] for s in samples]
+        print('{0}: {1} median {2:.3f}s min {3:.3f}s max {4:.3f}s, {5} azure modules loaded'.format(
+            os.path.realpath(root), args.module, median(seconds), min(seconds), max(seconds), samples[-1]['azure_modules']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,722 @@
+#!/usr/bin/env python
+"""Serve a synthetic Azure fleet over a local HTTPS stand-in for Azure Resource Manager.
+
+The server answers the requests the inventory plugin and the modules benchmarked by run_benchmarks.py send:
+cloud metadata discovery, service principal tokens, ``/batch``, and the compute, network, storage and resources
+providers (and the Arc, container instance and AKS ones of a fleet with compute_targets), including paging,
+``$expand=instanceView`` and ``statusOnly=true`` (answered with a 400 where ARM rejects them), the blob service
+properties of storage accounts and the configuration of web apps.
+Resource Graph queries are answered for the ``type =~`` and ``resourceGroup in~`` conditions and the ``project``
+clause they contain, the rest of the query is ignored. ``resourcechanges`` queries return the changes recorded with
+``Fleet.change`` after their ``datetime()``.
+Resources are generated from the fleet size, so the same size always returns the same resources.
+
+Point a task or an inventory at it with the variables printed on start::
+
+    python tests/utils/benchmark/mock_arm.py --fleet-size 500 --latency 0.03
+    export REQUESTS_CA_BUNDLE=... AZURE_CLOUD_ENVIRONMENT=https://127.0.0.1:8443/ AZURE_CLIENT_ID=... AZURE_SECRET=...
+    ansible localhost -m azure.azcollection.azure_rm_virtualmachine_info
+
+Every request is counted per route, see ``MockARMServer.stats``.
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import re
+import ssl
+import tempfile
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+SUBSCRIPTION_ID = '00000000-0000-0000-0000-00000000b0b0'
+TENANT_ID = '00000000-0000-0000-0000-00000000beef'
+MANAGEMENT_GROUP = 'mg-bench'
+VMS_PER_RESOURCE_GROUP = 50
+LOCATIONS = ['eastus', 'westeurope', 'southeastasia']
+
+PROVIDERS = {
+    'microsoft.compute': ('Microsoft.Compute', ['virtualMachines', 'virtualMachineScaleSets', 'disks']),
+    'microsoft.network': ('Microsoft.Network', ['networkInterfaces', 'publicIPAddresses']),
+    'microsoft.storage': ('Microsoft.Storage', ['storageAccounts']),
+    'microsoft.web': ('Microsoft.Web', ['sites']),
+    'microsoft.hybridcompute': ('Microsoft.HybridCompute', ['machines']),
+    'microsoft.containerinstance': ('Microsoft.ContainerInstance', ['containerGroups']),
+    'microsoft.containerservice': ('Microsoft.ContainerService', ['managedClusters']),
+}
+AKS_NODES_PER_CLUSTER = 3
+FLEXIBLE_SCALE_SET = 'vmss-flex'
+FLEXIBLE_SCALE_SET_SIZE = 20
+
+# general purpose v2 accounts host a static website
+BLOB_SERVICE_PROPERTIES = ('<?xml version="1.0" encoding="utf-8"?><StorageServiceProperties><Cors /><StaticWebsite>{0}</StaticWebsite>'
+                           '</StorageServiceProperties>')
+STATIC_WEBSITE = '<Enabled>true</Enabled><IndexDocument>index.html</IndexDocument><ErrorDocument404Path>404.html</ErrorDocument404Path>'
+NO_STATIC_WEBSITE = '<Enabled>false</Enabled>'
+PUBLISH_PROFILES = ('<publishData><publishProfile profileName="{0} - Web Deploy" publishMethod="MSDeploy" publishUrl="{0}.scm.azurewebsites.net:443" />'
+                    '<publishProfile profileName="{0} - FTP" publishMethod="FTP"'
+                    ' publishUrl="ftps://waws-prod-bench.ftp.azurewebsites.windows.net/site/wwwroot" />'
+                    '</publishData>')
+
+
+class Fleet(object):
+    '''
+    Synthetic resources: size virtual machines, each with a NIC, a public IP and a managed OS disk, spread over
+    resource groups of VMS_PER_RESOURCE_GROUP machines, and one storage account and one web app per ten machines.
+    The first FLEXIBLE_SCALE_SET_SIZE machines are the instances of the FLEXIBLE_SCALE_SET scale set, with flexible orchestration.
+    The resource groups are spread over subscriptions subscriptions, all in the MANAGEMENT_GROUP management group,
+    subscription_id being the first one.
+    With compute_targets, every resource group also has an Azure Arc machine, a container group and an AKS cluster
+    whose node resource group has a node pool VMSS of AKS_NODES_PER_CLUSTER instances.
+    '''
+
+    def __init__(self, size, subscription_id=SUBSCRIPTION_ID, subscriptions=1, compute_targets=False):
+        self.subscription_id = subscription_id
+        self.subscription_ids = [subscription_id] + ['00000000-0000-0000-0001-{0:012d}'.format(index) for index in range(1, subscriptions)]
+        self.resources = collections.OrderedDict()
+        # resource group name -> subscription id
+        self.resource_groups = collections.OrderedDict()
+        self.instance_views = dict()
+        # names of the storage accounts hosting a static website
+        self.static_websites = set()
+        self.changes = []
+        for index in range(size):
+            self._add_vm(index)
+        self._add_flexible_scale_set(min(size, FLEXIBLE_SCALE_SET_SIZE))
+        for index in range(max(1, size // 10)):
+            self._add_storage_account(index)
+            self._add_web_app(index)
+        if compute_targets:
+            for index, resource_group in enumerate(list(self.resource_groups)):
+                self._add_arc_machine(index, resource_group)
+                self._add_container_group(index, resource_group)
+                self._add_aks_cluster(index, resource_group)
+
+    def resource_id(self, resource_group, provider, resource_type, name):
+        return '/subscriptions/{0}/resourceGroups/{1}/providers/{2}/{3}/{4}'.format(
+            self.resource_groups[resource_group], resource_group, provider, resource_type, name)
+
+    def _resource_group(self, index):
+        group = index // VMS_PER_RESOURCE_GROUP
+        name = 'rg-bench-{0:03d}'.format(group)
+        if name not in self.resource_groups:
+            self.resource_groups[name] = self.subscription_ids[group % len(self.subscription_ids)]
+        return name
+
+    def _add(self, resource):
+        self.resources[resource['id'].lower()] = resource
+        return resource
+
+    def _add_vm(self, index):
+        resource_group = self._resource_group(index)
+        location = LOCATIONS[index % len(LOCATIONS)]
+        name = 'vm-{0:05d}'.format(index)
+        vm_id = self.resource_id(resource_group, 'Microsoft.Compute', 'virtualMachines', name)
+        nic_id = self.resource_id(resource_group, 'Microsoft.Network', 'networkInterfaces', name + '-nic')
+        pip_id = self.resource_id(resource_group, 'Microsoft.Network', 'publicIPAddresses', name + '-pip')
+        disk_id = self.resource_id(resource_group, 'Microsoft.Compute', 'disks', name + '-osdisk')
+        subnet_id = '/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Network/virtualNetworks/vnet/subnets/default'.format(
+            self.resource_groups[resource_group], resource_group)
+        linux = index % 4 != 3
+
+        self._add(dict(id=pip_id, name=name + '-pip', type='Microsoft.Network/publicIPAddresses', location=location, tags={},
+                       properties=dict(provisioningState='Succeeded', publicIPAllocationMethod='Static', publicIPAddressVersion='IPv4',
+                                       ipAddress='20.{0}.{1}.{2}'.format(index // 65536 % 256, index // 256 % 256, index % 256),
+                                       dnsSettings=dict(fqdn='{0}.{1}.cloudapp.azure.com'.format(name, location)))))
+        self._add(dict(id=nic_id, name=name + '-nic', type='Microsoft.Network/networkInterfaces', location=location, tags={},
+                       properties=dict(provisioningState='Succeeded', primary=True, macAddress='00-0D-3A-{0:02X}-{1:02X}-{2:02X}'.format(
+                           index // 65536 % 256, index // 256 % 256, index % 256),
+                           virtualMachine=dict(id=vm_id),
+                           ipConfigurations=[dict(id=nic_id + '/ipConfigurations/ipconfig1', name='ipconfig1', properties=dict(
+                               provisioningState='Succeeded', primary=True, privateIPAllocationMethod='Dynamic',
+                               privateIPAddress='10.{0}.{1}.{2}'.format(index // 65536 % 256, index // 256 % 256, index % 256),
+                               subnet=dict(id=subnet_id), publicIPAddress=dict(id=pip_id)))])))
+        self._add(dict(id=disk_id, name=name + '-osdisk', type='Microsoft.Compute/disks', location=location, tags={},
+                       sku=dict(name='Premium_LRS'),
+                       properties=dict(provisioningState='Succeeded', diskSizeGB=30, diskState='Attached', osType='Linux' if linux else 'Windows')))
+        os_profile = dict(computerName=name, adminUsername='azureuser')
+        if linux:
+            os_profile['linuxConfiguration'] = dict(disablePasswordAuthentication=True)
+        else:
+            os_profile['windowsConfiguration'] = dict(provisionVMAgent=True)
+        self._add(dict(id=vm_id, name=name, type='Microsoft.Compute/virtualMachines', location=location,
+                       tags=dict(env='bench', tier='web' if index % 2 else 'db'),
+                       properties=dict(
+                           vmId='{0:08x}-0000-4000-8000-{1:012x}'.format(index, index), provisioningState='Succeeded',
+                           timeCreated='2024-01-01T00:00:00+00:00',
+                           hardwareProfile=dict(vmSize='Standard_B2s'), osProfile=os_profile,
+                           storageProfile=dict(
+                               imageReference=dict(publisher='Canonical', offer='0001-com-ubuntu-server-jammy', sku='22_04-lts', version='latest'),
+                               osDisk=dict(osType='Linux' if linux else 'Windows', name=name + '-osdisk', createOption='FromImage',
+                                           caching='ReadWrite', diskSizeGB=30,
+                                           managedDisk=dict(id=disk_id, storageAccountType='Premium_LRS')),
+                               dataDisks=[]),
+                           networkProfile=dict(networkInterfaces=[dict(id=nic_id, properties=dict(primary=True))]),
+                           diagnosticsProfile=dict(bootDiagnostics=dict(enabled=False)))))
+        self.instance_views[vm_id.lower()] = dict(
+            computerName=name, osName='ubuntu' if linux else 'Windows Server 2022', osVersion='22.04',
+            vmAgent=dict(vmAgentVersion='2.9.1.1', statuses=[]),
+            disks=[dict(name=name + '-osdisk', statuses=[dict(code='ProvisioningState/succeeded', level='Info', displayStatus='Provisioning succeeded')])],
+            statuses=[dict(code='ProvisioningState/succeeded', level='Info', displayStatus='Provisioning succeeded'),
+                      dict(code='PowerState/running' if index % 5 else 'PowerState/deallocated', level='Info',
+                           displayStatus='VM running' if index % 5 else 'VM deallocated')])
+
+    def _add_flexible_scale_set(self, size):
+        resource_group = self._resource_group(0)
+        vmss_id = self.resource_id(resource_group, 'Microsoft.Compute', 'virtualMachineScaleSets', FLEXIBLE_SCALE_SET)
+        self._add(dict(id=vmss_id, name=FLEXIBLE_SCALE_SET, type='Microsoft.Compute/virtualMachineScaleSets', location=LOCATIONS[0],
+                       tags=dict(env='bench'), properties=dict(provisioningState='Succeeded', orchestrationMode='Flexible',
+                                                               platformFaultDomainCount=1)))
+        for index in range(size):
+            vm_id = self.resource_id(resource_group, 'Microsoft.Compute', 'virtualMachines', 'vm-{0:05d}'.format(index))
+            self.resources[vm_id.lower()]['properties']['virtualMachineScaleSet'] = dict(id=vmss_id)
+
+    def _add_storage_account(self, index):
+        resource_group = list(self.resource_groups)[index % len(self.resource_groups)]
+        name = 'stbench{0:05d}'.format(index)
+        # every fourth account is a general purpose v1 account, which has no web endpoint
+        kind = 'Storage' if index % 4 == 3 else 'StorageV2'
+        endpoints = dict(blob='{base_url}blob/' + name + '/')
+        if kind == 'StorageV2':
+            endpoints['web'] = 'https://{0}.z1.web.core.windows.net/'.format(name)
+            self.static_websites.add(name)
+        self._add(dict(id=self.resource_id(resource_group, 'Microsoft.Storage', 'storageAccounts', name), name=name,
+                       type='Microsoft.Storage/storageAccounts', location=LOCATIONS[index % len(LOCATIONS)], kind=kind,
+                       sku=dict(name='Standard_LRS', tier='Standard'), tags=dict(env='bench'),
+                       properties=dict(provisioningState='Succeeded', accessTier='Hot', creationTime='2024-01-01T00:00:00Z',
+                                       primaryLocation=LOCATIONS[index % len(LOCATIONS)], statusOfPrimary='available',
+                                       supportsHttpsTrafficOnly=True, minimumTlsVersion='TLS1_2', allowBlobPublicAccess=False,
+                                       networkAcls=dict(bypass='AzureServices', defaultAction='Allow', ipRules=[], virtualNetworkRules=[]),
+                                       encryption=dict(keySource='Microsoft.Storage', services=dict(blob=dict(enabled=True),
+                                                                                                    file=dict(enabled=True))),
+                                       primaryEndpoints=endpoints)))
+
+    def _add_web_app(self, index):
+        resource_group = list(self.resource_groups)[index % len(self.resource_groups)]
+        name = 'app-bench-{0:05d}'.format(index)
+        self._add(dict(id=self.resource_id(resource_group, 'Microsoft.Web', 'sites', name), name=name, type='Microsoft.Web/sites',
+                       location=LOCATIONS[index % len(LOCATIONS)], kind='app,linux', tags=dict(env='bench'),
+                       properties=dict(state='Running', availabilityState='Normal', enabled=True, resourceGroup=resource_group,
+                                       defaultHostName=name + '.azurewebsites.net', hostNames=[name + '.azurewebsites.net'],
+                                       enabledHostNames=[name + '.azurewebsites.net', name + '.scm.azurewebsites.net'],
+                                       hostNameSslStates=[dict(name=name + '.azurewebsites.net', sslState='Disabled', hostType='Standard')],
+                                       outboundIpAddresses='20.0.0.1,20.0.0.2',
+                                       serverFarmId=self.resource_id(resource_group, 'Microsoft.Web', 'serverfarms', 'plan-bench'))))
+
+    def _add_arc_machine(self, index, resource_group):
+        name = 'arc-{0:03d}'.format(index)
+        self._add(dict(id=self.resource_id(resource_group, 'Microsoft.HybridCompute', 'machines', name), name=name,
+                       type='Microsoft.HybridCompute/machines', location=LOCATIONS[index % len(LOCATIONS)], tags=dict(env='bench'),
+                       properties=dict(provisioningState='Succeeded', status='Connected' if index % 4 else 'Disconnected', osType='linux',
+                                       osName='ubuntu', osVersion='22.04', vmId='{0:08x}-0000-4000-8000-00000000a4c0'.format(index),
+                                       osProfile=dict(computerName=name),
+                                       networkProfile=dict(networkInterfaces=[dict(ipAddresses=[dict(
+                                           address='192.168.{0}.{1}'.format(index // 256 % 256, index % 256), ipAddressVersion='IPv4',
+                                           subnet=dict(addressPrefix='192.168.0.0/16'))])]))))
+
+    def _add_container_group(self, index, resource_group):
+        name = 'aci-{0:03d}'.format(index)
+        location = LOCATIONS[index % len(LOCATIONS)]
+        container_group_id = self.resource_id(resource_group, 'Microsoft.ContainerInstance', 'containerGroups', name)
+        self._add(dict(id=container_group_id, name=name, type='Microsoft.ContainerInstance/containerGroups', location=location,
+                       tags=dict(env='bench'),
+                       properties=dict(provisioningState='Succeeded', osType='Linux', restartPolicy='Always',
+                                       containers=[dict(name='web', properties=dict(
+                                           image='nginx:latest', ports=[dict(port=80)], resources=dict(requests=dict(cpu=1, memoryInGB=1.5))))],
+                                       ipAddress=dict(type='Public', ip='52.0.{0}.{1}'.format(index // 256 % 256, index % 256),
+                                                      fqdn='{0}.{1}.azurecontainer.io'.format(name, location), ports=[dict(port=80)]))))
+        # the instance view is only returned by a GET of the container group
+        self.instance_views[container_group_id.lower()] = dict(state='Running' if index % 3 else 'Stopped', events=[])
+
+    def _add_aks_cluster(self, index, resource_group):
+        name = 'aks-{0:03d}'.format(index)
+        location = LOCATIONS[index % len(LOCATIONS)]
+        node_resource_group = 'MC_{0}_{1}_{2}'.format(resource_group, name, location)
+        self.resource_groups[node_resource_group] = self.resource_groups[resource_group]
+        self._add(dict(id=self.resource_id(resource_group, 'Microsoft.ContainerService', 'managedClusters', name), name=name,
+                       type='Microsoft.ContainerService/managedClusters', location=location, tags=dict(env='bench'),
+                       properties=dict(provisioningState='Succeeded', kubernetesVersion='1.28.5', nodeResourceGroup=node_resource_group,
+                                       agentPoolProfiles=[dict(name='nodepool1', count=AKS_NODES_PER_CLUSTER, vmSize='Standard_D2s_v3')])))
+        vmss_name = 'aks-nodepool1-{0:08d}-vmss'.format(index)
+        vmss_id = self.resource_id(node_resource_group, 'Microsoft.Compute', 'virtualMachineScaleSets', vmss_name)
+        self._add(dict(id=vmss_id, name=vmss_name, type='Microsoft.Compute/virtualMachineScaleSets', location=location,
+                       tags={'aks-managed-poolName': 'nodepool1', 'aks-managed-orchestrator': 'Kubernetes:1.28.5'},
+                       sku=dict(name='Standard_D2s_v3', capacity=AKS_NODES_PER_CLUSTER),
+                       properties=dict(provisioningState='Succeeded', upgradePolicy=dict(mode='Manual'))))
+        subnet_id = '/subscriptions/{0}/resourceGroups/{1}/providers/Microsoft.Network/virtualNetworks/aks-vnet/subnets/aks-subnet'.format(
+            self.resource_groups[node_resource_group], node_resource_group)
+        for instance in range(AKS_NODES_PER_CLUSTER):
+            vm_id = '{0}/virtualMachines/{1}'.format(vmss_id, instance)
+            nic_id = '{0}/networkInterfaces/{1}'.format(vm_id, vmss_name)
+            computer_name = '{0}{1:06d}'.format(vmss_name[:-5], instance)
+            self._add(dict(id=nic_id, name=vmss_name, type='Microsoft.Compute/virtualMachineScaleSets/virtualMachines/networkInterfaces',
+                           location=location, properties=dict(provisioningState='Succeeded', primary=True, macAddress='00-0D-3A-AA-{0:02X}-{1:02X}'.format(
+                               index % 256, instance), virtualMachine=dict(id=vm_id),
+                               ipConfigurations=[dict(id=nic_id + '/ipConfigurations/ipconfig1', name='ipconfig1', properties=dict(
+                                   provisioningState='Succeeded', primary=True, privateIPAllocationMethod='Dynamic',
+                                   privateIPAddress='10.224.{0}.{1}'.format(index % 256, instance + 4), subnet=dict(id=subnet_id)))])))
+            self._add(dict(id=vm_id, name='{0}_{1}'.format(vmss_name, instance), instanceId=str(instance),
+                           type='Microsoft.Compute/virtualMachineScaleSets/virtualMachines', location=location,
+                           tags={'aks-managed-poolName': 'nodepool1'}, sku=dict(name='Standard_D2s_v3', tier='Standard'),
+                           properties=dict(
+                               vmId='{0:08x}-0000-4000-8000-{1:012x}'.format(index, 0xa0 + instance), provisioningState='Succeeded',
+                               latestModelApplied=True, timeCreated='2024-01-01T00:00:00+00:00',
+                               hardwareProfile=dict(vmSize='Standard_D2s_v3'),
+                               osProfile=dict(computerName=computer_name, adminUsername='azureuser',
+                                              linuxConfiguration=dict(disablePasswordAuthentication=True)),
+                               storageProfile=dict(
+                                   imageReference=dict(id='/subscriptions/{0}/resourceGroups/AKS-Ubuntu/providers/Microsoft.Compute/galleries/'
+                                                       'AKSUbuntu/images/2204gen2containerd/versions/202401.09.0'.format(SUBSCRIPTION_ID)),
+                                   osDisk=dict(osType='Linux', name='{0}_OsDisk_{1}'.format(vmss_name, instance), createOption='FromImage',
+                                               caching='ReadOnly', diskSizeGB=128),
+                                   dataDisks=[]),
+                               networkProfile=dict(networkInterfaces=[dict(id=nic_id)]))))
+            self.instance_views[vm_id.lower()] = dict(
+                computerName=computer_name, osName='ubuntu', osVersion='22.04',
+                statuses=[dict(code='ProvisioningState/succeeded', level='Info', displayStatus='Provisioning succeeded'),
+                          dict(code='PowerState/running', level='Info', displayStatus='VM running')])
+
+    def change(self, resource_id, change_type='Update'):
+        '''
+        Record a change of a resource, to be returned by resourcechanges queries.
+        '''
+        resource_type = '/'.join(resource_id.split('/')[6:8])
+        self.changes.append(dict(targetResourceId=resource_id, targetResourceType=resource_type, changeType=change_type,
+                                 changeAttributes=dict(timestamp=datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%fZ'))))
+
+    def list(self, scope, resource_type=None):
+        '''
+        Resources under scope (a subscription or resource group id), of resource_type such as Microsoft.Compute/virtualMachines.
+        '''
+        prefix = scope.lower().rstrip('/') + '/'
+        return [resource for key, resource in self.resources.items()
+                if key.startswith(prefix) and (resource_type is None or resource['type'].lower() == resource_type.lower())]
+
+
+class MockARMHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    _SCALE_SET_VMS = re.compile(r'^(?P<vmss>/subscriptions/[^/]+/resourcegroups/[^/]+/providers/Microsoft.Compute/virtualMachineScaleSets/[^/]+)'
+                                r'/virtualMachines$', re.IGNORECASE)
+    _RESOURCE_TYPE_FILTER = re.compile(r"resourceType\s+eq\s+'(?P<type>[^']+)'", re.IGNORECASE)
+    _SCALE_SET_FILTER = re.compile(r"virtualMachineScaleSet/id'?\s+eq\s+'(?P<id>[^']+)'", re.IGNORECASE)
+    _COLLECTION = re.compile(r'^(?P<scope>/subscriptions/[^/]+(?:/resourcegroups/[^/]+)?)/providers/(?P<namespace>[^/]+)/(?P<type>[^/]+)$',
+                             re.IGNORECASE)
+    _RESOURCES = re.compile(r'^(?P<scope>/subscriptions/[^/]+(?:/resourcegroups/[^/]+)?)/resources$', re.IGNORECASE)
+    _PROVIDER = re.compile(r'^/subscriptions/[^/]+/providers/(?P<namespace>[^/]+)$', re.IGNORECASE)
+    _RESOURCE_GROUPS = re.compile(r'^/subscriptions/(?P<subscription>[^/]+)/resourcegroups$', re.IGNORECASE)
+    _DESCENDANTS = re.compile(r'^/providers/Microsoft.Management/managementGroups/(?P<name>[^/]+)/descendants$', re.IGNORECASE)
+    _BLOB_SERVICE = re.compile(r'^/blob/(?P<account>[^/]+)/?$', re.IGNORECASE)
+    _SITE_CONFIG = re.compile(r'^(?P<site>/subscriptions/[^/]+/resourcegroups/[^/]+/providers/Microsoft.Web/sites/[^/]+)'
+                              r'/(?P<config>config/web|config/appsettings/list|config/publishingcredentials/list|config/authsettings/list|publishxml)$',
+                              re.IGNORECASE)
+    _GRAPH_TYPE = re.compile(r"type\s*=~\s*'(?P<type>[^']+)'", re.IGNORECASE)
+    _GRAPH_RESOURCE_GROUPS = re.compile(r"resourceGroup\s+in~\s*\((?P<names>[^)]*)\)", re.IGNORECASE)
+    _GRAPH_SINCE = re.compile(r"\bdatetime\((?P<since>[^)]+)\)", re.IGNORECASE)
+    _GRAPH_TARGET_TYPES = re.compile(r"targetResourceType\)?\s+in~\s*\((?P<types>[^)]*)\)", re.IGNORECASE)
+    _GRAPH_PROJECT = re.compile(r"\|\s*project\s+(?P<columns>[^|]+)$", re.IGNORECASE)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def do_PUT(self):
+        self._handle()
+
+    def do_PATCH(self):
+        self._handle()
+
+    def do_DELETE(self):
+        self._handle()
+
+    def _handle(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        parsed = urlparse(self.path)
+        if parsed.path.rstrip('/').lower() == '/batch' and self.command == 'POST':
+            self.server.count('POST', 'batch')
+            status, payload, content_type = 200, self._batch(json.loads(body.decode('utf-8'))), 'application/json'
+        else:
+            status, payload, content_type = self.dispatch(self.command, parsed.path, parse_qs(parsed.query), body)
+        data = payload.encode('utf-8') if content_type.endswith('xml') else json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('x-ms-ratelimit-remaining-subscription-reads', '11999')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _batch(self, batch):
+        responses = []
+        for request in batch.get('requests', []):
+            if self.server.throttle():
+                self.server.count(request.get('httpMethod', 'GET'), 'throttled', batched=True)
+                responses.append(dict(name=request.get('name'), httpStatusCode=429, headers={},
+                                      content=dict(error=dict(code='TooManyRequests', message='Too many requests.'))))
+                continue
+            parsed = urlparse(request['url'])
+            status, content, dummy = self.dispatch(request.get('httpMethod', 'GET'), parsed.path, parse_qs(parsed.query), b'', batched=True)
+            responses.append(dict(name=request.get('name'), httpStatusCode=status, headers={}, content=content,
+                                  contentLength=len(json.dumps(content))))
+        return dict(responses=responses)
+
+    def dispatch(self, method, path, query, body, batched=False):
+        '''
+        Return (status, payload, content type) for a request and count it under its route.
+        '''
+        fleet = self.server.fleet
+        lowered = path.rstrip('/').lower()
+        route, result = 'not_found', None
+
+        if lowered == '/metadata/endpoints':
+            route, result = 'metadata', self.server.cloud_metadata()
+        elif lowered.endswith('/v2.0/.well-known/openid-configuration'):
+            authority = self.server.base_url + path.strip('/').split('/')[0]
+            route, result = 'openid_configuration', dict(issuer=authority + '/v2.0', token_endpoint=authority + '/oauth2/v2.0/token',
+                                                         authorization_endpoint=authority + '/oauth2/v2.0/authorize',
+                                                         device_authorization_endpoint=authority + '/oauth2/v2.0/devicecode')
+        elif lowered.endswith('/oauth2/v2.0/token'):
+            route, result = 'token', dict(access_token='mock-token', token_type='Bearer', expires_in=3600, ext_expires_in=3600)
+        elif lowered == '/providers/microsoft.resourcegraph/resources' and method == 'POST':
+            route, result = 'resourceGraph/query', self._graph_query(json.loads(body.decode('utf-8')))
+        elif self._BLOB_SERVICE.match(path):
+            self.server.count(method, 'blob_service_properties', batched)
+            static_website = self._BLOB_SERVICE.match(path).group('account').lower() in fleet.static_websites
+            return 200, BLOB_SERVICE_PROPERTIES.format(STATIC_WEBSITE if static_website else NO_STATIC_WEBSITE), 'application/xml'
+        elif self._SITE_CONFIG.match(path) and self._SITE_CONFIG.match(path).group('site').lower() in fleet.resources:
+            site = fleet.resources[self._SITE_CONFIG.match(path).group('site').lower()]
+            config = self._SITE_CONFIG.match(path).group('config').lower()
+            self.server.count(method, 'sites/' + config, batched)
+            if config == 'publishxml':
+                return 200, PUBLISH_PROFILES.format(site['name']), 'application/xml'
+            properties = {
+                'config/web': dict(linuxFxVersion='PYTHON|3.11', alwaysOn=True, http20Enabled=True, ftpsState='FtpsOnly', minTlsVersion='1.2'),
+                'config/appsettings/list': dict(WEBSITE_RUN_FROM_PACKAGE='1', SCM_DO_BUILD_DURING_DEPLOYMENT='true'),
+                'config/publishingcredentials/list': dict(publishingUserName='$' + site['name'], publishingPassword='mock'),
+                'config/authsettings/list': dict(enabled=False, unauthenticatedClientAction='RedirectToLoginPage'),
+            }[config]
+            return 200, dict(id=path, name=config.split('/')[1], properties=properties), 'application/json'
+        elif lowered in fleet.resources and method == 'GET':
+            route = '{0}/get'.format(fleet.resources[lowered]['type'].split('/')[1])
+            result = self._expand(fleet.resources[lowered], query)
+            if result['type'] == 'Microsoft.ContainerInstance/containerGroups':
+                result['properties']['instanceView'] = fleet.instance_views[lowered]
+        elif lowered.endswith('/instanceview') and lowered[:-len('/instanceview')] in fleet.instance_views:
+            route, result = 'virtualMachines/instanceView', fleet.instance_views[lowered[:-len('/instanceview')]]
+        elif lowered.endswith('/listkeys') and method == 'POST' and lowered[:-len('/listkeys')] in fleet.resources:
+            route, result = 'storageAccounts/listKeys', dict(keys=[dict(keyName='key1', value='bW9jaw==', permissions='FULL'),
+                                                                   dict(keyName='key2', value='bW9jaw==', permissions='FULL')])
+        elif lowered.endswith('/blobservices/default') and lowered[:-len('/blobservices/default')] in fleet.resources:
+            route, result = 'storageAccounts/blobServices', dict(id=path, name='default', properties=dict(cors=dict(corsRules=[])))
+        elif lowered == '/subscriptions':
+            route, result = 'subscriptions/list', self._page(path, query, [
+                dict(id='/subscriptions/' + subscription_id, subscriptionId=subscription_id, tenantId=TENANT_ID,
+                     displayName='bench-{0}'.format(index), state='Enabled') for index, subscription_id in enumerate(fleet.subscription_ids)])
+        elif self._DESCENDANTS.match(path):
+            if self._DESCENDANTS.match(path).group('name').lower() == MANAGEMENT_GROUP:
+                route, result = 'managementGroups/descendants', self._page(path, query, [
+                    dict(id='/providers/Microsoft.Management/managementGroups/{0}/subscriptions/{1}'.format(MANAGEMENT_GROUP, subscription_id),
+                         type='Microsoft.Management/managementGroups/subscriptions', name=subscription_id,
+                         properties=dict(displayName='bench-{0}'.format(index))) for index, subscription_id in enumerate(fleet.subscription_ids)])
+        elif self._RESOURCE_GROUPS.match(path):
+            subscription_id = self._RESOURCE_GROUPS.match(path).group('subscription')
+            route, result = 'resourceGroups/list', self._page(path, query, [
+                dict(id='/subscriptions/{0}/resourceGroups/{1}'.format(subscription_id, name), name=name, location=LOCATIONS[0],
+                     properties=dict(provisioningState='Succeeded')) for name, owner in fleet.resource_groups.items() if owner == subscription_id])
+        elif self._RESOURCES.match(path):
+            resources = fleet.list(self._RESOURCES.match(path).group('scope'))
+            type_filter = self._RESOURCE_TYPE_FILTER.search(','.join(query.get('$filter', [])))
+            if type_filter:
+                resources = [r for r in resources if r['type'].lower() == type_filter.group('type').lower()]
+            route, result = 'resources/list', self._page(path, query, [self._generic(r) for r in resources])
+        elif self._PROVIDER.match(path):
+            namespace = PROVIDERS.get(self._PROVIDER.match(path).group('namespace').lower())
+            if namespace:
+                route, result = 'providers/get', dict(namespace=namespace[0], registrationState='Registered', resourceTypes=[
+                    dict(resourceType=resource_type, apiVersions=['2023-03-01', '2022-11-01']) for resource_type in namespace[1]])
+        elif self._SCALE_SET_VMS.match(path) and method == 'GET':
+            route = 'virtualMachineScaleSets/virtualMachines/list'
+            vmss = fleet.resources.get(self._SCALE_SET_VMS.match(path).group('vmss').lower())
+            if vmss and vmss['properties'].get('orchestrationMode') == 'Flexible':
+                # the instances of a flexible scale set are VMs, only listed with their names
+                result = self._page(path, query, [dict(id=r['id'], name=r['name'], instanceId=r['name'], type=r['type'], properties=dict())
+                                                  for r in self._scale_set_vms(vmss['id'])])
+            else:
+                instances = fleet.list(self._SCALE_SET_VMS.match(path).group('vmss'), 'Microsoft.Compute/virtualMachineScaleSets/virtualMachines')
+                result = self._page(path, query, [self._expand(r, query) for r in instances])
+        elif self._COLLECTION.match(path) and method == 'GET':
+            match = self._COLLECTION.match(path)
+            resource_type = '{0}/{1}'.format(match.group('namespace'), match.group('type'))
+            route = '{0}/list'.format(match.group('type'))
+            resources = fleet.list(match.group('scope'), resource_type)
+            vmss_filter = self._SCALE_SET_FILTER.search(','.join(query.get('$filter', [])))
+            if vmss_filter:
+                resources = [r for r in resources if r in self._scale_set_vms(vmss_filter.group('id'))]
+            status_only = resource_type == 'Microsoft.Compute/virtualMachines' and query.get('statusOnly') == ['true']
+            if resource_type == 'Microsoft.Compute/virtualMachines' and (
+                    (query.get('$expand') and not vmss_filter) or (status_only and '/resourcegroups/' in match.group('scope').lower())):
+                # like ARM: $expand needs a $filter, statusOnly is only accepted by the subscription wide list
+                self.server.count(method, route, batched)
+                return 400, dict(error=dict(code='InvalidParameter', target='$expand' if query.get('$expand') else 'statusOnly',
+                                            message='The value of parameter $expand or statusOnly is invalid.')), 'application/json'
+            result = self._page(path, query, [self._expand(r, query, status_only) for r in resources])
+
+        self.server.count(method, route, batched)
+        if result is None:
+            return 404, dict(error=dict(code='ResourceNotFound', message='The resource {0} was not found.'.format(path))), 'application/json'
+        return 200, result, 'application/json'
+
+    def _scale_set_vms(self, vmss_id):
+        return [r for r in self.server.fleet.resources.values() if r['type'] == 'Microsoft.Compute/virtualMachines'
+                and r['properties'].get('virtualMachineScaleSet', {}).get('id', '').lower() == vmss_id.lower()]
+
+    def _expand(self, resource, query, status_only=False):
+        resource = json.loads(json.dumps(resource).replace('{base_url}', self.server.base_url))
+        instance_view = self.server.fleet.instance_views.get(resource['id'].lower())
+        if instance_view is None:
+            return resource
+        if status_only:
+            # statusOnly=true only returns the run time status, without the VM agent, boot diagnostics...
+            resource['properties']['instanceView'] = dict(statuses=instance_view['statuses'])
+        elif 'instanceview' in ','.join(query.get('$expand', [])).lower():
+            resource['properties']['instanceView'] = instance_view
+        return resource
+
+    def _graph_resources(self, subscriptions, query):
+        fleet = self.server.fleet
+        resource_type = self._GRAPH_TYPE.search(query)
+        resource_groups = self._GRAPH_RESOURCE_GROUPS.search(query)
+        if resource_groups:
+            resource_groups = [name.strip().strip("'").lower() for name in resource_groups.group('names').split(',')]
+        rows = []
+        for subscription_id in subscriptions:
+            for resource in fleet.list('/subscriptions/' + subscription_id, resource_type.group('type') if resource_type else None):
+                resource_group = resource['id'].split('/')[4]
+                if resource_groups and resource_group.lower() not in resource_groups:
+                    continue
+                row = json.loads(json.dumps(resource))
+                row.update(resourceGroup=resource_group, subscriptionId=subscription_id, zones=None)
+                instance_view = fleet.instance_views.get(resource['id'].lower())
+                if instance_view:
+                    power_state = next(status for status in instance_view['statuses'] if status['code'].startswith('PowerState/'))
+                    row['properties']['extended'] = dict(instanceView=dict(powerState=dict(code=power_state['code'],
+                                                                                           displayStatus=power_state['displayStatus'])))
+                rows.append(row)
+        return rows
+
+    def _graph_query(self, request):
+        fleet = self.server.fleet
+        query = request.get('query', '')
+        subscriptions = request.get('subscriptions', [fleet.subscription_id])
+        if query.lstrip().lower().startswith('resourcechanges'):
+            since = self._GRAPH_SINCE.search(query).group('since').rstrip('Z')
+            types = [t.strip().strip("'").lower() for t in self._GRAPH_TARGET_TYPES.search(query).group('types').split(',')]
+            rows = [dict(id=change['targetResourceId'] + '/providers/Microsoft.Resources/changes/' + str(index), properties=change)
+                    for index, change in enumerate(fleet.changes)
+                    if change['changeAttributes']['timestamp'].rstrip('Z') > since and change['targetResourceType'].lower() in types
+                    and change['targetResourceId'].split('/')[2] in subscriptions]
+        else:
+            rows = self._graph_resources(subscriptions, query)
+        project = self._GRAPH_PROJECT.search(query.strip())
+        if project:
+            rows = [self._project(row, project.group('columns')) for row in rows]
+        options = request.get('options', {})
+        start = int(options.get('$skipToken') or 0)
+        end = start + min(int(options.get('$top') or 1000), 1000)
+        result = dict(totalRecords=len(rows), count=len(rows[start:end]), data=rows[start:end], resultTruncated='false')
+        if end < len(rows):
+            result['$skipToken'] = str(end)
+        return result
+
+    @staticmethod
+    def _project(row, columns):
+        '''
+        Evaluate a project clause made of column names and of name = path or name = tostring(path) columns.
+        '''
+        projected = dict()
+        for column in columns.split(','):
+            name, dummy, expression = column.partition('=')
+            expression = re.sub(r'^tostring\((.*)\)$', r'\1', (expression or name).strip())
+            value = row
+            for key in expression.split('.'):
+                value = value.get(key) if isinstance(value, dict) else None
+            projected[name.strip()] = value
+        return projected
+
+    @staticmethod
+    def _generic(resource):
+        return dict((key, resource[key]) for key in ('id', 'name', 'type', 'location', 'kind', 'sku', 'tags') if key in resource)
+
+    def _page(self, path, query, items):
+        token = (query.get('$skiptoken') or query.get('skiptoken') or ['0'])[0]
+        if '://' in token:
+            # azure_rm_resource_info before 2.7.0 passed the whole nextLink as skiptoken
+            token = parse_qs(urlparse(token).query).get('$skiptoken', ['0'])[0]
+        start = int(token) if token.isdigit() else 0
+        # $top is the page size
+        end = start + int((query.get('$top') or [self.server.page_size])[0])
+        page = dict(value=items[start:end])
+        if end < len(items):
+            next_query = dict((key, values[0]) for key, values in query.items() if key not in ('$skiptoken', 'skiptoken'))
+            next_query['$skiptoken'] = str(end)
+            page['nextLink'] = '{0}{1}?{2}'.format(self.server.base_url.rstrip('/'), path, urlencode(next_query))
+        return page
+
+
+class MockARMServer(ThreadingHTTPServer):
+    '''
+    HTTPS server for a Fleet, listening on host and port (0 picks a free port).
+
+    :param latency: seconds added to every HTTP request, to emulate the round trip to Azure
+    :param page_size: number of items per page of list operations
+    :param throttle_every: answer every throttle_every-th request of /batch requests with a 429, 0 never does
+    '''
+
+    daemon_threads = True
+
+    def __init__(self, fleet, host='127.0.0.1', port=0, latency=0.0, page_size=50, verbose=False, throttle_every=0):
+        ThreadingHTTPServer.__init__(self, (host, port), MockARMHandler)
+        self.fleet = fleet
+        self.latency = latency
+        self.page_size = page_size
+        self.verbose = verbose
+        self.throttle_every = throttle_every
+        self._batched = 0
+        self.base_url = 'https://{0}:{1}/'.format(host, self.server_address[1])
+        self.certificate = create_certificate(host)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(self.certificate)
+        self.socket = context.wrap_socket(self.socket, server_side=True)
+        self._stats_lock = threading.Lock()
+        self.reset()
+
+    def cloud_metadata(self):
+        return [dict(name='AzureBenchmark', resourceManager=self.base_url, portal=self.base_url, gallery=self.base_url,
+                     graph=self.base_url, graphAudience=self.base_url, microsoftGraphResourceId=self.base_url,
+                     authentication=dict(loginEndpoint=self.base_url, audiences=[self.base_url], tenant=TENANT_ID,
+                                         identityProvider='AAD'),
+                     suffixes=dict(storage='core.windows.net', keyVaultDns='vault.azure.net', acrLoginServer='azurecr.io',
+                                   sqlServerHostname='database.windows.net'))]
+
+    def count(self, method, route, batched=False):
+        with self._stats_lock:
+            if not batched:
+                self.http_requests += 1
+            self.operations['{0} {1}'.format(method, route)] += 1
+
+    def throttle(self):
+        '''
+        Return whether to throttle the next request of a /batch request.
+        '''
+        with self._stats_lock:
+            self._batched += 1
+            return bool(self.throttle_every) and self._batched % self.throttle_every == 0
+
+    def reset(self):
+        with self._stats_lock:
+            self.http_requests = 0
+            self.operations = collections.Counter()
+
+    def stats(self):
+        '''
+        Return the number of HTTP requests and the number of ARM operations per route, requests inside a
+        /batch request included.
+        '''
+        with self._stats_lock:
+            return dict(http_requests=self.http_requests, operations=sum(self.operations.values()), routes=dict(self.operations))
+
+    def environment(self):
+        '''
+        Environment variables pointing a task or an inventory at this server with service principal credentials.
+        '''
+        return dict(REQUESTS_CA_BUNDLE=self.certificate, SSL_CERT_FILE=self.certificate, AZURE_CLOUD_ENVIRONMENT=self.base_url,
+                    ANSIBLE_AZURE_AUTH_SOURCE='env', AZURE_DISABLE_INSTANCE_DISCOVERY='true', AZURE_TENANT=TENANT_ID,
+                    AZURE_CLIENT_ID='00000000-0000-0000-0000-00000000c0de', AZURE_SECRET='benchmark',
+                    AZURE_SUBSCRIPTION_ID=self.fleet.subscription_id)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name='MockARMServer')
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+def create_certificate(host):
+    '''
+    Write a self-signed certificate and its key for host to a temporary PEM file and return its path.
+    The file doubles as the CA bundle clients use to trust the server.
+    '''
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+    import ipaddress
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, u'azcollection benchmark')])
+    now = datetime.datetime.utcnow()
+    alt_names = [x509.DNSName(u'localhost')]
+    try:
+        alt_names.append(x509.IPAddress(ipaddress.ip_address(host)))
+    except ValueError:
+        alt_names.append(x509.DNSName(host))
+    certificate = (x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(days=1)).not_valid_after(now + datetime.timedelta(days=7))
+                   .add_extension(x509.SubjectAlternativeName(alt_names), critical=False)
+                   .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+                   .add_extension(x509.KeyUsage(digital_signature=True, key_cert_sign=True, content_commitment=False, key_encipherment=False,
+                                                data_encipherment=False, key_agreement=False, crl_sign=False, encipher_only=False,
+                                                decipher_only=False), critical=True)
+                   .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+                   .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(key.public_key()), critical=False)
+                   .sign(key, hashes.SHA256()))
+    fd, path = tempfile.mkstemp(prefix='azcollection-mock-arm-', suffix='.pem')
+    with os.fdopen(fd, 'wb') as pem:
+        pem.write(certificate.public_bytes(serialization.Encoding.PEM))
+        pem.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--fleet-size', type=int, default=100, help='number of virtual machines')
+    parser.add_argument('--subscriptions', type=int, default=1, help='number of subscriptions the resource groups are spread over')
+    parser.add_argument('--compute-targets', action='store_true', help='add Arc machines, container groups and AKS clusters')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every request')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--throttle-every', type=int, default=0, help='answer every nth request of /batch requests with a 429')
+    parser.add_argument('--verbose', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    fleet = Fleet(args.fleet_size, subscriptions=args.subscriptions, compute_targets=args.compute_targets)
+    server = MockARMServer(fleet, host=args.host, port=args.port, latency=args.latency, page_size=args.page_size, verbose=args.verbose,
+                           throttle_every=args.throttle_every)
+    for name, value in sorted(server.environment().items()):
+        print('export {0}={1}'.format(name, value))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(json.dumps(server.stats(), indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+"""Benchmark the inventory plugin and hot modules against the local mock ARM server.
+
+Each target runs in a fresh process against a mock_arm.MockARMServer serving a synthetic fleet, and is reported
+with its median wall time, the number of HTTP requests and ARM operations it sent (requests inside a /batch
+request included) and its peak memory. Request counts do not depend on the machine, so they can gate CI::
+
+    python tests/utils/benchmark/run_benchmarks.py --fleet-size 10 --fleet-size 200 --json results.json
+    python tests/utils/benchmark/run_benchmarks.py --fleet-size 10 --fleet-size 200 --baseline results.json
+
+With --baseline the run fails when a target sends more requests or operations than recorded in the baseline.
+"""
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_arm import FLEXIBLE_SCALE_SET, MANAGEMENT_GROUP, Fleet, MockARMServer  # noqa: E402
+
+MODULE_TARGETS = {
+    'virtualmachine_info': ('azure_rm_virtualmachine_info', lambda fleet: dict(), lambda result: len(result['vms'])),
+    'resource_info': ('azure_rm_resource_info',
+                      lambda fleet: dict(url='/subscriptions/{0}/resources'.format(fleet.subscription_id), api_version='2021-04-01'),
+                      lambda result: len(result['response'])),
+    # the VMs of the fleet, each reduced to its id and its tier tag
+    'resource_info_projection': ('azure_rm_resource_info',
+                                 lambda fleet: dict(url='/subscriptions/{0}/resources'.format(fleet.subscription_id), api_version='2021-04-01',
+                                                    filter="resourceType eq 'Microsoft.Compute/virtualMachines'", projection=['id', 'tags.tier']),
+                                 lambda result: len(result['response'])),
+    'storageaccount_info': ('azure_rm_storageaccount_info', lambda fleet: dict(), lambda result: len(result['storageaccounts'])),
+    'webapp_info': ('azure_rm_webapp_info', lambda fleet: dict(), lambda result: len(result['webapps'])),
+    'virtualmachinescalesetinstance_info': ('azure_rm_virtualmachinescalesetinstance_info',
+                                            lambda fleet: dict(resource_group=list(fleet.resource_groups)[0], vmss_name=FLEXIBLE_SCALE_SET),
+                                            lambda result: len(result['instances'])),
+}
+# inventory configurations, added to INVENTORY_CONFIG
+INVENTORY_TARGETS = {
+    'inventory': '',
+    'inventory_resource_graph': 'fetch_backend: resource_graph\n',
+    'inventory_management_group': 'management_groups: [{0}]\n'.format(MANAGEMENT_GROUP),
+    'inventory_network_prefetch': 'network_prefetch: true\n',
+    'inventory_bulk': 'network_prefetch: true\nbulk_power_state: true\n',
+    # excludes half of the VMs when they are listed
+    'inventory_filter_pushdown': "filter_pushdown: true\nexclude_host_filters: [\"tags.tier == 'db'\"]\n",
+    # only finds the fleet VMs without --compute-targets
+    'inventory_compute_targets': "include_arc_resource_groups: ['*']\ninclude_containergroup_resource_groups: ['*']\n"
+                                 "include_aks_resource_groups: ['*']\n",
+}
+TARGETS = sorted(INVENTORY_TARGETS) + sorted(MODULE_TARGETS)
+
+INVENTORY_CONFIG = '''plugin: azure.azcollection.azure_rm
+auth_source: env
+cloud_environment: {base_url}
+# keep every VM, so that the number of hosts is the fleet size
+default_host_filters: []
+'''
+
+
+def median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def run(command, env, workdir):
+    '''
+    Run command and return its exit code, its stdout, its stderr, its wall time and its peak memory in MiB.
+    '''
+    stdout_path = os.path.join(workdir, 'stdout')
+    stderr_path = os.path.join(workdir, 'stderr')
+    with open(stdout_path, 'wb') as stdout, open(stderr_path, 'wb') as stderr:
+        start = time.time()
+        process = subprocess.Popen(command, env=env, stdout=stdout, stderr=stderr, cwd=workdir)
+        dummy, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.time() - start
+    process.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status >> 8
+    with open(stdout_path) as stdout, open(stderr_path) as stderr:
+        return process.returncode, stdout.read(), stderr.read(), elapsed, usage.ru_maxrss / 1024.0
+
+
+def run_target(target, server, workdir, env):
+    '''
+    Run target once and return (wall seconds, peak MiB, number of items returned).
+    '''
+    fleet = server.fleet
+    if target in INVENTORY_TARGETS:
+        config = os.path.join(workdir, 'benchmark.azure_rm.yml')
+        with open(config, 'w') as config_file:
+            config_file.write(INVENTORY_CONFIG.format(base_url=server.base_url) + INVENTORY_TARGETS[target])
+        command = ['ansible-inventory', '-i', config, '--list']
+
+        def count(output):
+            return len(json.loads(output).get('_meta', {}).get('hostvars', {}))
+    else:
+        module, module_args, count_items = MODULE_TARGETS[target]
+        args = dict(module_args(fleet), auth_source='env', cloud_environment=server.base_url)
+        args_path = os.path.join(workdir, 'args.json')
+        with open(args_path, 'w') as args_file:
+            json.dump(dict(ANSIBLE_MODULE_ARGS=args), args_file)
+        command = [sys.executable, '-m', 'ansible_collections.azure.azcollection.plugins.modules.' + module, args_path]
+
+        def count(output):
+            return count_items(json.loads(output))
+
+    returncode, stdout, stderr, elapsed, memory = run(command, env, workdir)
+    if returncode != 0:
+        raise RuntimeError('{0} failed with exit code {1}:\n{2}\n{3}'.format(target, returncode, stdout[-4000:], stderr[-4000:]))
+    return elapsed, memory, count(stdout)
+
+
+def benchmark(collection_root, targets, fleet_sizes, runs, latency, page_size, subscriptions=1, compute_targets=False):
+    workdir = tempfile.mkdtemp(prefix='azcollection-benchmark-')
+    results = []
+    try:
+        namespace_dir = os.path.join(workdir, 'ansible_collections', 'azure')
+        os.makedirs(namespace_dir)
+        os.symlink(os.path.abspath(collection_root), os.path.join(namespace_dir, 'azcollection'))
+
+        for fleet_size in fleet_sizes:
+            fleet = Fleet(fleet_size, subscriptions=subscriptions, compute_targets=compute_targets)
+            server = MockARMServer(fleet, latency=latency, page_size=page_size).start()
+            try:
+                env = dict(os.environ)
+                env.update(server.environment())
+                env['PYTHONPATH'] = os.pathsep.join([workdir] + ([env['PYTHONPATH']] if env.get('PYTHONPATH') else []))
+                env['ANSIBLE_COLLECTIONS_PATH'] = workdir
+                env['ANSIBLE_INVENTORY_ENABLED'] = 'azure.azcollection.azure_rm'
+                env['ANSIBLE_INVENTORY_UNPARSED_FAILED'] = 'true'
+                env['ANSIBLE_LOCAL_TEMP'] = os.path.join(workdir, 'tmp')
+                for target in targets:
+                    seconds, memory = [], []
+                    for dummy in range(runs):
+                        server.reset()
+                        elapsed, peak, items = run_target(target, server, workdir, env)
+                        seconds.append(elapsed)
+                        memory.append(peak)
+                    stats = server.stats()
+                    results.append(dict(target=target, fleet_size=fleet_size, items=items, seconds=round(median(seconds), 3),
+                                        memory_mib=round(max(memory), 1), http_requests=stats['http_requests'],
+                                        operations=stats['operations'], routes=stats['routes']))
+            finally:
+                server.shutdown()
+                server.server_close()
+                os.remove(server.certificate)
+    finally:
+        shutil.rmtree(workdir)
+    return results
+
+
+def check_baseline(results, baseline_path):
+    '''
+    Return the messages describing the targets that send more requests than in the baseline results.
+    '''
+    with open(baseline_path) as baseline_file:
+        baseline = dict(((r['target'], r['fleet_size']), r) for r in json.load(baseline_file))
+    regressions = []
+    for result in results:
+        expected = baseline.get((result['target'], result['fleet_size']))
+        if not expected:
+            continue
+        for key in ('http_requests', 'operations'):
+            if result[key] > expected[key]:
+                regressions.append('{0} with {1} VMs: {2} went from {3} to {4}'.format(
+                    result['target'], result['fleet_size'], key, expected[key], result[key]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--collection-root', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'),
+                        help='checkout of the collection to benchmark (default: this checkout)')
+    parser.add_argument('--target', action='append', dest='targets', choices=TARGETS, help='target to run, may be repeated (default: all)')
+    parser.add_argument('--fleet-size', action='append', dest='fleet_sizes', type=int, help='number of VMs, may be repeated (default: 10 and 100)')
+    parser.add_argument('--runs', type=int, default=3, help='number of runs per target and fleet size')
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the mock server adds to every request')
+    parser.add_argument('--page-size', type=int, default=50, help='items per page of list operations')
+    parser.add_argument('--subscriptions', type=int, default=1,
+                        help='number of subscriptions the fleet is spread over, only inventory_management_group sees them all')
+    parser.add_argument('--compute-targets', action='store_true',
+                        help='add Arc machines, container groups and AKS clusters to the fleet, for inventory_compute_targets')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='fail when a target sends more requests than in these results')
+    args = parser.parse_args()
+
+    results = benchmark(args.collection_root, args.targets or TARGETS, args.fleet_sizes or [10, 100], args.runs, args.latency, args.page_size,
+                        args.subscriptions, args.compute_targets)
+
+    print('{0:<36} {1:>6} {2:>6} {3:>9} {4:>9} {5:>10} {6:>9}'.format('target', 'vms', 'items', 'seconds', 'requests', 'operations', 'MiB'))
+    for result in results:
+        print('{target:<36} {fleet_size:>6} {items:>6} {seconds:>9.3f} {http_requests:>9} {operations:>10} {memory_mib:>9.1f}'.format(**result))
+
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(results, json_file, indent=2, sort_keys=True)
+
+    if args.baseline:
+        regressions = check_baseline(results, args.baseline)
+        for regression in regressions:
+            print('REGRESSION: ' + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()